@@ -21,4 +21,24 @@ app.conf.beat_schedule = {
         'task': 'inventory.tasks.check_low_stock',  # Task to execute
         'schedule': crontab(hour=0, minute=0),  # Run daily at midnight
     },
+    'snapshot-stock-hourly': {
+        'task': 'inventory.tasks.snapshot_stock',  # Task to execute
+        'schedule': crontab(minute=15),  # Run every hour at :15
+    },
+    'rollup-analytics': {
+        'task': 'inventory.tasks.rollup_analytics',  # Task to execute
+        'schedule': crontab(minute='*/10'),  # Run every 10 minutes
+    },
+    'forecast-reorder-levels': {
+        'task': 'inventory.tasks.forecast_reorder_levels',  # Task to execute
+        'schedule': crontab(hour=23, minute=30),  # Run daily before the low stock check
+    },
+    'release-expired-reservations': {
+        'task': 'inventory.tasks.release_expired_reservations',  # Task to execute
+        'schedule': crontab(),  # Run every minute
+    },
+    'drain-fulfillment-queue': {
+        'task': 'inventory.tasks.drain_fulfillment_queue',  # Task to execute
+        'schedule': crontab(),  # Run every minute - PATCHes queue a drain of their own
+    },
 }
@@ -1,4 +1,5 @@
 # Django settings for the inventory management system
+import os
 from pathlib import Path
 
 # Build paths inside the project (e.g., BASE_DIR / 'subdir')
@@ -22,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',  # Session framework
     'django.contrib.messages',  # Messaging framework
     'django.contrib.staticfiles',  # Static file management
+    'django.contrib.postgres',  # Full-text and trigram search lookups
     # Third-party apps
     'rest_framework',  # Django REST Framework for API
     'rest_framework_simplejwt',  # JWT authentication
@@ -32,6 +34,8 @@ INSTALLED_APPS = [
 
 # Middleware - processes requests/responses in order
 MIDDLEWARE = [
+    'inventory.instrumentation.PerformanceMiddleware',  # SQL / serialization / total timings - first, so it measures the rest
+    'inventory.routers.ReplicaRoutingMiddleware',  # Safe requests read from replicas (DATABASE_REPLICAS)
     'django.middleware.security.SecurityMiddleware',  # Security enhancements
     'django.contrib.sessions.middleware.SessionMiddleware',  # Session management
     'corsheaders.middleware.CorsMiddleware',  # CORS handling (must be before CommonMiddleware)
@@ -72,11 +76,73 @@ DATABASES = {
         'NAME': 'inventory_db',  # Database name
         'USER': 'postgres',  # Database user
         'PASSWORD': 'postgres',  # Database password
-        'HOST': 'db',  # Database host (Docker service name)
-        'PORT': '5432',  # PostgreSQL default port
+        'HOST': os.environ.get('DB_HOST', 'db'),  # Database host (Docker service name, or pgbouncer for pooling)
+        'PORT': os.environ.get('DB_PORT', '5432'),  # PostgreSQL default port
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),  # Seconds a connection is reused across requests / tasks (0 = per request)
+        'CONN_HEALTH_CHECKS': True,  # Check a reused connection before the request uses it
+        # PgBouncer in transaction mode can't keep a cursor open across transactions
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_POOL_MODE') == 'transaction',
     }
 }
 
+# Read replicas - DB_REPLICA_HOSTS=host1[:port],host2 adds aliases replica_1, replica_2 with the primary's credentials
+# Reads during GET / HEAD / OPTIONS requests go to them (see inventory/routers.py); set DATABASE_REPLICAS to any
+# list of aliases, e.g. extra SQLite files, to route to those instead
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host, 'PORT': port or DATABASES['default']['PORT'], 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['inventory.routers.PrimaryReplicaRouter']
+
+# Cache - Redis from docker-compose, local memory when CACHE_URL=locmem:// (settings_test sets its own)
+CACHE_URL = os.environ.get('CACHE_URL', 'redis://redis:6379/1')  # DB 1 - Celery uses DB 0
+if CACHE_URL == 'locmem://':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+RESPONSE_CACHE_TIMEOUT = 300  # Seconds a cached API response lives (writes invalidate it sooner)
+AVAILABILITY_CACHE_SIZE = int(os.environ.get('AVAILABILITY_CACHE_SIZE', '100000'))  # SKUs each process keeps for POST /api/stock/availability/ - least recently used go first
+AVAILABILITY_CACHE_TTL = float(os.environ.get('AVAILABILITY_CACHE_TTL', '30'))  # Seconds an entry lives - changes made through the app invalidate it sooner
+
+# Stock reservations - a pending sales order holds its stock this long, then release_expired_reservations frees it
+RESERVATION_TTL = int(os.environ.get('RESERVATION_TTL', '1800'))  # Seconds
+
+# Asynchronous fulfillment - drain_fulfillment_queue fulfills this many queued orders per transaction
+FULFILLMENT_BATCH_SIZE = int(os.environ.get('FULFILLMENT_BATCH_SIZE', '500'))
+
+# Demand forecasting - forecast_reorder_levels sets each SKU's reorder level from this much sales history
+FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', '730'))
+FORECAST_SERVICE_LEVEL = float(os.environ.get('FORECAST_SERVICE_LEVEL', '0.95'))  # Chance a lead time's demand is covered - sets the safety stock
+FORECAST_DEFAULT_LEAD_DAYS = float(os.environ.get('FORECAST_DEFAULT_LEAD_DAYS', '7'))  # Used until any purchase order has been received
+FORECAST_MIN_HISTORY_DAYS = int(os.environ.get('FORECAST_MIN_HISTORY_DAYS', '28'))  # Younger SKUs keep their reorder level
+PRINCIPAL_CACHE_TIMEOUT = 300  # Seconds a caller's user / groups / permissions stay cached - bounds staleness of edits made outside the API
+
+# Serve opted-in list endpoints from .values() rows rendered with orjson (same bytes as the serializers) - set to 'false' to compare
+FAST_LIST_RESPONSES = os.environ.get('FAST_LIST_RESPONSES', 'true').lower() != 'false'
+
+# Async read endpoints (/api/async/...) - requests one process works on at once, and seconds the rest wait before a 503
+ASYNC_MAX_CONCURRENCY = int(os.environ.get('ASYNC_MAX_CONCURRENCY', '50'))
+ASYNC_QUEUE_TIMEOUT = float(os.environ.get('ASYNC_QUEUE_TIMEOUT', '2'))
+
+# Performance instrumentation - Server-Timing header on every response and Prometheus histograms at /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() != 'false'
+METRICS_FLUSH_INTERVAL = 10  # Seconds between writes of a process's metrics to the cache
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Scrapers send "Authorization: Bearer <token>" - unset, /metrics is admin only unless DEBUG
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '200'))  # Queries at least this slow are logged (inventory.slow_query)
+
+# Logging - inventory.* loggers (slow queries) go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'inventory': {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO')},
+    },
+}
+
 # Password validation rules
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},  # Password can't be similar to user info
@@ -94,6 +160,9 @@ USE_TZ = True  # Enable timezone support
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 
+# Uploaded files (catalogue import feeds) - shared with the Celery worker through the ./backend volume
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -103,16 +172,21 @@ CORS_ALLOW_ALL_ORIGINS = True  # Allow all origins - restrict in production
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',  # Use JWT tokens for auth
+        'inventory.principal.CachedJWTAuthentication',  # JWT tokens, user / groups / permissions cached per user
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Require authentication by default
     ],
+    'DEFAULT_PAGINATION_CLASS': 'inventory.pagination.CreatedAtCursorPagination',  # Cursor pagination on (created_at, id)
+    'DEFAULT_FILTER_BACKENDS': [
+        'inventory.filters.QueryParamFilterBackend',  # Per-view ?field=value filters (see filter_params)
+    ],
 }
 
 # Celery configuration for async task processing
-CELERY_BROKER_URL = 'redis://redis:6379/0'  # Redis as message broker
-CELERY_RESULT_BACKEND = 'redis://redis:6379/0'  # Redis for storing task results
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://redis:6379/0')  # Redis as message broker - 'memory://' for a local stand-in
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')  # Redis for storing task results - 'cache+memory://' locally
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'false').lower() == 'true'  # Run tasks in the calling process, no worker needed
 CELERY_ACCEPT_CONTENT = ['json']  # Accept only JSON content
 CELERY_TASK_SERIALIZER = 'json'  # Serialize tasks as JSON
 CELERY_RESULT_SERIALIZER = 'json'  # Serialize results as JSON
@@ -0,0 +1,20 @@
+# Settings for the ASGI service serving the async read endpoints (/api/async/...) under gunicorn + uvicorn workers:
+# DJANGO_SETTINGS_MODULE=backend.settings_asgi gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'backend.urls_asgi'  # Only the async endpoints and /metrics
+
+# Under ASGI, Django 4.2 runs every sync middleware hook on a thread - two hops per middleware per request
+# The async endpoints authenticate by JWT and answer JSON, so sessions, CSRF, messages and the admin's user
+# middleware have nothing to do; keep only the async-native ones
+MIDDLEWARE = [
+    'inventory.instrumentation.PerformanceMiddleware',
+    'inventory.routers.ReplicaRoutingMiddleware',
+    'corsheaders.middleware.CorsMiddleware',  # Storefronts call cross-origin
+]
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']  # The admin isn't routed here
+
+# Each request runs its queries on a thread of its own, so a kept-open connection is never reused - close them
+# after every request and keep them cheap by connecting through PgBouncer (DB_HOST=pgbouncer)
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = 0
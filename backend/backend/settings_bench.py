@@ -0,0 +1,18 @@
+# Settings for python manage.py bench - a throwaway in-memory SQLite database and no external services,
+# so runs are reproducible anywhere: python manage.py bench --settings=backend.settings_bench
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB', ':memory:'),  # A file path keeps the dataset for inspection
+    }
+}
+DATABASE_REPLICAS = []  # Reads and writes share the one database
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}  # Every request does its full work
+CELERY_TASK_ALWAYS_EAGER = True  # Tasks queued by the API run inline
+CELERY_TASK_EAGER_PROPAGATES = True
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']  # Fast user creation
+DEBUG = False
+LOGGING['loggers']['inventory']['level'] = 'ERROR'  # No slow-query lines in the JSON output
@@ -0,0 +1,26 @@
+# Settings for python manage.py test --settings=backend.settings_test - SQLite and no external services,
+# so the suite runs anywhere
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',  # The test runner uses an in-memory database instead
+    },
+    # A second alias on the same test database, for the read-replica routing tests - they enable it
+    # with override_settings(DATABASE_REPLICAS=['replica']), other tests read and write through default
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = []
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+CELERY_BROKER_URL = 'memory://'  # In-process stand-in for Redis, for tests that start a worker thread
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_TASK_ALWAYS_EAGER = True  # Tasks queued by the API run inline
+CELERY_TASK_EAGER_PROPAGATES = True
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']  # Fast user creation
+LOGGING['loggers']['inventory']['level'] = 'ERROR'  # No slow-query lines in the test output
@@ -2,6 +2,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from inventory.views import prometheus_metrics
 
 # URL patterns - maps URLs to views
 urlpatterns = [
@@ -10,6 +11,8 @@ urlpatterns = [
     # JWT authentication endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # Get access & refresh tokens
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),  # Refresh access token
+    # Prometheus scrape endpoint
+    path('metrics', prometheus_metrics, name='metrics'),
     # Include inventory app URLs
     path('api/', include('inventory.urls')),  # All inventory endpoints under /api/
 ]
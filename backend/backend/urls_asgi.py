@@ -0,0 +1,10 @@
+# URL routing for the ASGI service (settings_asgi) - the async read endpoints and the Prometheus scrape endpoint
+# Everything else (admin, tokens, the rest of the API) is served by the WSGI service
+from django.urls import path, include
+from inventory.urls import async_urlpatterns
+from inventory.views import prometheus_metrics
+
+urlpatterns = [
+    path('metrics', prometheus_metrics, name='metrics'),
+    path('api/', include(async_urlpatterns)),  # /api/async/...
+]
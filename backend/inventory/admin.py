@@ -1,6 +1,6 @@
 # Django admin configuration for inventory models
 from django.contrib import admin
-from .models import Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem
+from .models import Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem, StockMovement, StockSnapshot, StockReservation, FulfillmentJob
 
 # Register models with Django admin interface
 # This makes them manageable through the admin panel at /admin/
@@ -11,3 +11,7 @@ admin.site.register(PurchaseOrder)  # Manage purchase orders
 admin.site.register(PurchaseOrderItem)  # Manage purchase order line items
 admin.site.register(SalesOrder)  # Manage sales orders
 admin.site.register(SalesOrderItem)  # Manage sales order line items
+admin.site.register(StockMovement)  # Browse the stock ledger
+admin.site.register(StockSnapshot)  # Browse periodic stock snapshots
+admin.site.register(StockReservation)  # Browse stock held by pending orders
+admin.site.register(FulfillmentJob)  # Browse queued and finished asynchronous fulfillments
@@ -0,0 +1,141 @@
+# Sales and purchasing analytics served from the daily rollup tables
+# refresh_rollups() rebuilds only the days whose orders changed or were deleted since the previous run
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailyRollup, DailySkuRollup, PurchaseOrder, PurchaseOrderItem, RollupDirtyDay, SalesOrder, SalesOrderItem
+
+ROLLUP_METRICS = ['revenue', 'units_sold', 'purchase_spend', 'units_purchased']  # Columns shared by both rollup tables
+ROLLUP_OVERLAP = timedelta(minutes=5)  # Rescanned before the watermark - orders saved before a run but committed after it
+
+
+# Rebuild the rollups for every day touched since the last run (or every day when full=True)
+# Returns the number of days rebuilt
+def refresh_rollups(full=False):
+    started_at = timezone.now()
+    watermark = None if full else DailyRollup.objects.aggregate(last=Max('refreshed_at'))['last']
+
+    # Days whose orders were created or changed status since the watermark. updated_at is stamped before the
+    # order's transaction commits, so a change can land after a run that started later - the overlap catches it
+    sales = SalesOrder.objects.all()
+    purchases = PurchaseOrder.objects.all()
+    if watermark:
+        sales = sales.filter(updated_at__gt=watermark - ROLLUP_OVERLAP)
+        purchases = purchases.filter(updated_at__gt=watermark - ROLLUP_OVERLAP)
+    days = set(sales.dates('created_at', 'day')) | set(purchases.dates('created_at', 'day'))
+    # Days a deleted order left behind - no row is left to move a timestamp, so mark_deleted_order recorded them
+    dirty = list(RollupDirtyDay.objects.values_list('pk', 'day'))
+    days |= {day for _, day in dirty}
+
+    for first, last in _day_ranges(sorted(days)):
+        _rebuild_range(first, last, started_at)
+    # Drain only the marks read above - a day marked during the rebuild is rebuilt again by the next run
+    RollupDirtyDay.objects.filter(pk__in=[pk for pk, _ in dirty]).delete()
+    return len(days)
+
+
+# Mark the creation day of a deleted order for the next refresh - only fulfilled sales and received purchases
+# are rolled up, so deleting an order in any other status changes no totals
+def mark_deleted_order(order):
+    if order.status in ('Fulfilled', 'Received'):
+        RollupDirtyDay.objects.create(day=timezone.localdate(order.created_at))
+
+
+# Collapse sorted days into contiguous (first, last) ranges so each range is one set of aggregate queries
+def _day_ranges(days):
+    ranges = []
+    for day in days:
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+def _rebuild_range(first, last, refreshed_at):
+    start = timezone.make_aware(datetime.combine(first, time.min))
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min))
+    line_value = lambda quantity, price: ExpressionWrapper(
+        F(quantity) * F(price), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+
+    # Per (day, SKU) totals - fulfilled sales and received purchases, bucketed by order creation day
+    sku_rows = {}
+    sold = (
+        SalesOrderItem.objects.filter(
+            sales_order__status='Fulfilled', sales_order__created_at__gte=start, sales_order__created_at__lt=end,
+        )
+        .annotate(day=TruncDate('sales_order__created_at'))
+        .values('day', 'product_variation_id')
+        .annotate(units=Sum('quantity_sold'), value=Sum(line_value('quantity_sold', 'sale_price_per_unit')))
+    )
+    for row in sold:
+        rollup = sku_rows.setdefault((row['day'], row['product_variation_id']), _empty_sku_rollup(row))
+        rollup.units_sold, rollup.revenue = row['units'], row['value']
+    purchased = (
+        PurchaseOrderItem.objects.filter(
+            purchase_order__status='Received', purchase_order__created_at__gte=start, purchase_order__created_at__lt=end,
+        )
+        .annotate(day=TruncDate('purchase_order__created_at'))
+        .values('day', 'product_variation_id')
+        .annotate(units=Sum('quantity_ordered'), value=Sum(line_value('quantity_ordered', 'cost_per_unit')))
+    )
+    for row in purchased:
+        rollup = sku_rows.setdefault((row['day'], row['product_variation_id']), _empty_sku_rollup(row))
+        rollup.units_purchased, rollup.purchase_spend = row['units'], row['value']
+
+    # Per day totals - summed from the SKU rows, plus order counts
+    day_rows = {}
+    for (day, _), sku_rollup in sku_rows.items():
+        rollup = day_rows.setdefault(day, DailyRollup(day=day, refreshed_at=refreshed_at))
+        for metric in ROLLUP_METRICS:
+            setattr(rollup, metric, getattr(rollup, metric) + getattr(sku_rollup, metric))
+    for field, orders in (
+        ('sales_orders', SalesOrder.objects.filter(status='Fulfilled', created_at__gte=start, created_at__lt=end)),
+        ('purchase_orders', PurchaseOrder.objects.filter(status='Received', created_at__gte=start, created_at__lt=end)),
+    ):
+        for row in orders.annotate(day=TruncDate('created_at')).values('day').annotate(count=Count('id')):
+            rollup = day_rows.setdefault(row['day'], DailyRollup(day=row['day'], refreshed_at=refreshed_at))
+            setattr(rollup, field, row['count'])
+
+    # Replace the range - days with no activity left keep a zero row so the watermark survives
+    for day in _days_between(first, last):
+        day_rows.setdefault(day, DailyRollup(day=day, refreshed_at=refreshed_at))
+    with transaction.atomic():
+        DailySkuRollup.objects.filter(day__gte=first, day__lte=last).delete()
+        DailyRollup.objects.filter(day__gte=first, day__lte=last).delete()
+        DailySkuRollup.objects.bulk_create(sku_rows.values(), batch_size=1000)
+        DailyRollup.objects.bulk_create(day_rows.values(), batch_size=1000)
+
+
+def _empty_sku_rollup(row):
+    return DailySkuRollup(
+        day=row['day'], product_variation_id=row['product_variation_id'],
+        revenue=Decimal('0'), units_sold=0, purchase_spend=Decimal('0'), units_purchased=0,
+    )
+
+
+def _days_between(first, last):
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+# Per-day totals between two dates (inclusive)
+def daily_totals(first, last):
+    return DailyRollup.objects.filter(day__gte=first, day__lte=last).order_by('day').values(
+        'day', *ROLLUP_METRICS, 'sales_orders', 'purchase_orders'
+    )
+
+
+# Totals between two dates grouped by related fields - group_fields maps output names to field paths,
+# e.g. {'category': 'product_variation__product__category'}
+def grouped_totals(first, last, group_fields, order_by='-revenue', limit=None):
+    rows = (
+        DailySkuRollup.objects.filter(day__gte=first, day__lte=last)
+        .values(**{name: F(path) for name, path in group_fields.items()})
+        .annotate(**{metric: Sum(metric) for metric in ROLLUP_METRICS})
+        .order_by(order_by, *group_fields)
+    )
+    return rows[:limit] if limit else rows
@@ -6,3 +6,9 @@ class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     # App name - must match the app directory name
     name = 'inventory'
+
+    # Connect signal handlers and performance instrumentation once the app registry is ready
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .instrumentation import instrument
+        instrument()
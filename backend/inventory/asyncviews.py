@@ -0,0 +1,154 @@
+# Async read endpoints for high-concurrency lookups - plain Django async views on the async ORM, served under ASGI
+# Responses are the same JSON the DRF endpoints return (RowPlan + orjson), kept in the catalogue response cache;
+# callers authenticate with the same JWTs through the principal cache. Each process lets ASYNC_MAX_CONCURRENCY requests work at once - the rest wait up to
+# ASYNC_QUEUE_TIMEOUT seconds and are then answered 503, so a burst can't open more database connections than that
+import asyncio
+import weakref
+from functools import cache, wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from .cache import CATALOGUE, cached_data, store_data
+from .fastpath import BuildState, FastJSONRenderer, RowPlan, group_by_parent
+from .instrumentation import serializing
+from .models import Product, ProductVariation
+from .principal import CachedJWTAuthentication
+from .routers import primary_reads
+from .serializers import ProductSerializer, ProductVariationSerializer
+
+_semaphores = weakref.WeakKeyDictionary()  # Event loop -> its concurrency limit
+
+
+# No concurrency slot came free within ASYNC_QUEUE_TIMEOUT
+class Busy(Exception):
+    pass
+
+
+# Plans compiled once per process, on first use
+@cache
+def _variation_plan():
+    return RowPlan(ProductVariationSerializer(), ProductVariation)
+
+
+@cache
+def _product_plan():
+    return RowPlan(ProductSerializer(), Product)
+
+
+# Wait for one of the process's ASYNC_MAX_CONCURRENCY slots - raises Busy after ASYNC_QUEUE_TIMEOUT seconds
+class _Slot:
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        self.semaphore = _semaphores.get(loop)
+        if self.semaphore is None:
+            self.semaphore = _semaphores[loop] = asyncio.Semaphore(settings.ASYNC_MAX_CONCURRENCY)
+        try:
+            async with asyncio.timeout(settings.ASYNC_QUEUE_TIMEOUT):
+                await self.semaphore.acquire()
+        except TimeoutError:
+            raise Busy
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+# Decorator for async GET endpoints - concurrency limit, JWT authentication, and DRF-shaped errors
+def async_read_view(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            response = _error(405, f'Method "{request.method}" not allowed.')
+            response['Allow'] = 'GET'
+            return response
+        try:
+            async with _Slot():
+                authenticated = await CachedJWTAuthentication().aauthenticate(request)
+                if authenticated is None:
+                    response = _error(401, 'Authentication credentials were not provided.')
+                    response['WWW-Authenticate'] = 'Bearer realm="api"'
+                    return response
+                request.user = authenticated[0]
+                return await view(request, *args, **kwargs)
+        except Busy:
+            response = _error(503, 'Too many concurrent requests, retry shortly.')
+            response['Retry-After'] = '1'
+            return response
+        except APIException as exc:  # Invalid or expired token, unknown or inactive user
+            return _response(exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}, exc.status_code)
+    return wrapper
+
+
+# Error responses rendered like DRF's
+def _error(status, detail):
+    return _response({'detail': detail}, status)
+
+
+def _response(data, status):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+# Rows of a values() queryset built by a plan - the async form of RowPlan.build_page, without prefetches
+async def _build(plan, queryset, state):
+    return await _build_rows(plan, [row async for row in queryset.values(*plan.columns)], state)
+
+
+async def _build_rows(plan, rows, state):
+    children = {}
+    for name, child, fk_name, child_queryset in plan.child_queries(rows, {}):
+        child_rows = [row async for row in child_queryset]
+        children[name] = group_by_parent(child_rows, await _build_rows(child, child_rows, state), fk_name)
+    with serializing():
+        return [plan.build(row, state, children) for row in rows]
+
+
+def _json(data, state):
+    renderer = FastJSONRenderer() if state.json_safe else JSONRenderer()
+    return renderer.render(data)
+
+
+# Response for the request from the catalogue cache - on a miss, build() returns the body (None for a 404) to cache
+# The cache lookup, version included, is one thread hop
+async def _cached(request, build):
+    key, body = await sync_to_async(cached_data)(CATALOGUE, request.get_full_path())
+    if body is None:
+        with primary_reads():  # As CachedResponseMixin - a lagging replica must not be cached
+            body = await build()
+        await sync_to_async(store_data)(CATALOGUE, key, body)
+    if body is None:
+        return _error(404, 'Not found.')
+    return HttpResponse(body, content_type='application/json')
+
+
+async def _detail(request, plan, queryset):
+    async def build():
+        state = BuildState()
+        rows = await _build(plan, queryset, state)
+        return _json(rows[0], state) if rows else None
+    return await _cached(request, build)
+
+
+# GET /api/async/variations/{id}/ - same body as /api/variations/{id}/
+@async_read_view
+async def variation_detail(request, pk):
+    return await _detail(request, _variation_plan(), ProductVariation.objects.filter(pk=pk))
+
+
+# GET /api/async/products/{id}/ - same body as /api/products/{id}/, variations included
+@async_read_view
+async def product_detail(request, pk):
+    return await _detail(request, _product_plan(), Product.objects.filter(pk=pk))
+
+
+# GET /api/async/stock/{sku_code}/ - stock of one SKU: level, reorder level, in_stock and low_stock flags
+@async_read_view
+async def stock_by_sku(request, sku_code):
+    async def build():
+        row = await ProductVariation.objects.filter(sku_code=sku_code).values('id', 'sku_code', 'stock_level', 'reorder_level').afirst()
+        if row is None:
+            return None
+        row['in_stock'] = row['stock_level'] > 0
+        row['low_stock'] = row['stock_level'] <= row['reorder_level']
+        return _json(row, BuildState())
+    return await _cached(request, build)
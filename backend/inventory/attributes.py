@@ -0,0 +1,94 @@
+# Attribute search over ProductVariation.attributes
+# PostgreSQL answers lookups with jsonb containment (@>) served by a GIN index; other backends use the
+# VariationAttribute key/value table, kept in step with the JSON by index_attributes()
+import json
+from functools import reduce
+from operator import or_
+from django.db import connection
+from django.db.models import Q
+from .models import VariationAttribute
+
+MAX_INDEXED_VALUE_LENGTH = 255  # Longer values are left out of the key/value index
+INDEX_BATCH_SIZE = 1000
+
+
+# True where attributes are searched through VariationAttribute rather than jsonb containment
+def uses_attribute_table():
+    return connection.vendor != 'postgresql'
+
+
+# Flatten an attributes object into (key, value) pairs - lists give one pair per element,
+# nested objects give dotted keys, e.g. {"dims": {"w": 10}, "color": ["red", "blue"]}
+# -> ("dims.w", "10"), ("color", "red"), ("color", "blue")
+def flatten_attributes(attributes, prefix=''):
+    pairs = set()
+    if not isinstance(attributes, dict):
+        return pairs
+    for key, value in attributes.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            pairs |= flatten_attributes(value, f'{path}.')
+            continue
+        for element in value if isinstance(value, list) else [value]:
+            if isinstance(element, (dict, list)):
+                continue  # Only scalars are searchable
+            text = attribute_text(element)
+            if len(path) <= 100 and len(text) <= MAX_INDEXED_VALUE_LENGTH:
+                pairs.add((path, text))
+    return pairs
+
+
+# Text form of a scalar attribute value - what query-string values are compared against
+def attribute_text(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+# Rebuild the key/value index rows of the given variations (no-op on PostgreSQL)
+def index_attributes(variations):
+    if not uses_attribute_table() or not variations:
+        return
+    VariationAttribute.objects.filter(product_variation__in=[variation.pk for variation in variations]).delete()
+    VariationAttribute.objects.bulk_create(
+        [
+            VariationAttribute(product_variation_id=variation.pk, key=key, value=value)
+            for variation in variations
+            for key, value in flatten_attributes(variation.attributes)
+        ],
+        batch_size=INDEX_BATCH_SIZE,
+    )
+
+
+# Narrow a variation queryset to SKUs matching every {path: [values]} criterion - any of the values per path,
+# where a list-valued attribute matches when it contains the value
+def filter_by_attributes(queryset, criteria):
+    for path, values in criteria.items():
+        if uses_attribute_table():
+            queryset = queryset.filter(id__in=VariationAttribute.objects.filter(
+                key=path, value__in=values,
+            ).values('product_variation_id'))
+        else:
+            queryset = queryset.filter(reduce(or_, (
+                Q(attributes__contains=_nested(path, candidate))
+                for value in values
+                for candidate in _json_candidates(value)
+            )))
+    return queryset
+
+
+# JSON values a query-string value can stand for - "42" matches both "42" and 42, "true" both "true" and true
+def _json_candidates(value):
+    candidates = [value]
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = value
+    if not isinstance(parsed, (str, dict, list)):
+        candidates.append(parsed)
+    # A scalar or a list holding it - jsonb only matches array elements through an array on the right
+    return [shape for candidate in candidates for shape in (candidate, [candidate])]
+
+
+def _nested(path, value):
+    for key in reversed(path.split('.')):
+        value = {key: value}
+    return value
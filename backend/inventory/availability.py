@@ -0,0 +1,116 @@
+# Stock availability for many SKUs at once - stock level, reorder level and available-to-promise (stock not held
+# by reservations of pending sales orders), resolved with one query and kept in a bounded LRU/TTL cache in each process
+# Entries are checked against shared version counters, one per bucket of variation ids, read with a single cache
+# round trip per lookup. A change to a SKU's stock or reservations bumps its bucket once the transaction
+# commits, so every process drops the entries of that bucket while the other buckets stay cached
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from .models import ProductVariation, StockReservation
+
+VERSION_BUCKETS = 64  # Shared version counters - a change invalidates about 1/64 of the cached SKUs
+
+
+def _version_key(bucket):
+    return f'inventory:availability:{bucket}'
+
+
+# Bounded LRU of sku_code -> (expires at, bucket, bucket version, availability), shared by a process's threads
+class AvailabilityCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries, self.ttl = max_entries, ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    # Cached availability of each code still valid under versions - {sku_code: availability}
+    def get_many(self, sku_codes, versions):
+        found, now = {}, time.monotonic()
+        with self.lock:
+            for sku_code in sku_codes:
+                entry = self.entries.get(sku_code)
+                if entry is None:
+                    continue
+                expires_at, bucket, version, availability = entry
+                if expires_at <= now or versions.get(bucket) != version:
+                    del self.entries[sku_code]
+                    continue
+                self.entries.move_to_end(sku_code)
+                found[sku_code] = availability
+        return found
+
+    # Cache availability rows read while versions were current - versions must be read before the query
+    def set_many(self, rows, versions):
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            for availability in rows:
+                bucket = availability['id'] % VERSION_BUCKETS
+                self.entries[availability['sku_code']] = (expires_at, bucket, versions.get(bucket), availability)
+                self.entries.move_to_end(availability['sku_code'])
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+_cache = AvailabilityCache(settings.AVAILABILITY_CACHE_SIZE, settings.AVAILABILITY_CACHE_TTL)
+
+
+# Availability of each known code - (rows in request order, unknown codes)
+# Row: {id, sku_code, stock_level, reorder_level, available_to_promise}
+def availability(sku_codes):
+    sku_codes = list(dict.fromkeys(sku_codes))  # Drop repeats, keep order
+    versions = _versions()
+    found = _cache.get_many(sku_codes, versions)
+    missing = [sku_code for sku_code in sku_codes if sku_code not in found]
+    if missing:
+        rows = _query(missing)
+        _cache.set_many(rows, versions)
+        found.update((row['sku_code'], row) for row in rows)
+    return [found[sku_code] for sku_code in sku_codes if sku_code in found], [sku_code for sku_code in sku_codes if sku_code not in found]
+
+
+# Current version of every bucket in one round trip - buckets never bumped (or evicted) read as None
+def _versions():
+    keys = {_version_key(bucket): bucket for bucket in range(VERSION_BUCKETS)}
+    return {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+
+
+# Stock, reorder level and reserved quantity of the codes - one query, by the sku_code index
+def _query(sku_codes):
+    held = (
+        StockReservation.objects.filter(product_variation=OuterRef('pk'), status='Held')
+        .values('product_variation')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return [
+        {
+            'id': variation_id,
+            'sku_code': sku_code,
+            'stock_level': stock_level,
+            'reorder_level': reorder_level,
+            'available_to_promise': max(stock_level - (reserved or 0), 0),
+        }
+        for variation_id, sku_code, stock_level, reorder_level, reserved in (
+            ProductVariation.objects.filter(sku_code__in=sku_codes)
+            .annotate(reserved=Subquery(held))
+            .values_list('id', 'sku_code', 'stock_level', 'reorder_level', 'reserved')
+        )
+    ]
+
+
+# Drop cached availability of the variations once the current transaction commits - in every process
+def invalidate_availability(variation_ids):
+    buckets = {variation_id % VERSION_BUCKETS for variation_id in variation_ids}
+    if buckets:
+        transaction.on_commit(lambda: _bump(buckets))
+
+
+def _bump(buckets):
+    for bucket in buckets:
+        try:
+            cache.incr(_version_key(bucket))
+        except ValueError:  # Never bumped, or evicted - start from the clock so an old version is never reused
+            cache.set(_version_key(bucket), time.time_ns(), timeout=None)
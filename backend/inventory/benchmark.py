@@ -0,0 +1,195 @@
+# API benchmark - a synthetic dataset written with bulk inserts and a fixed scenario of catalogue listing,
+# order creation, fulfillment, receipt, the reorder level forecast and the low stock check, run through the test client
+# Results are plain JSON (latency percentiles, throughput, queries per call) to compare between commits
+import io
+import random
+import time
+from contextlib import redirect_stdout
+from decimal import Decimal
+from django.contrib.auth.models import Group, User
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .models import Product, ProductVariation, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem, StockMovement, Supplier
+from .forecast import refresh_reorder_levels
+from .tasks import check_low_stock
+
+BATCH_SIZE = 1000  # Rows per bulk INSERT
+CATEGORIES = ['Apparel', 'Footwear', 'Electronics', 'Home', 'Garden', 'Toys', 'Sports', 'Beauty']
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+COLORS = ['black', 'white', 'red', 'blue', 'green', 'grey']
+LIST_ENDPOINTS = {
+    'list_products': '/api/products/',
+    'list_variations': '/api/variations/',
+    'list_low_stock': '/api/variations/?low_stock=true',
+    'list_purchase_orders': '/api/purchase-orders/',
+    'list_sales_orders': '/api/sales-orders/',
+}
+
+
+# Write the synthetic dataset - returns the row counts
+# Stock levels are opened with an Adjustment movement each, so the ledger agrees with stock_level
+def build_dataset(products, variations_per_product, suppliers, purchase_orders, sales_orders, lines_per_order, seed):
+    rng = random.Random(seed)
+    Product.objects.bulk_create([
+        Product(
+            name=f'Product {number:06d}', category=rng.choice(CATEGORIES), description=f'Synthetic product {number}',
+            price=Decimal(rng.randrange(100, 50000)) / 100,
+        )
+        for number in range(products)
+    ], batch_size=BATCH_SIZE)
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    ProductVariation.objects.bulk_create([
+        ProductVariation(
+            product_id=product_id, sku_code=f'SKU-{product_id}-{number}',
+            attributes={'size': rng.choice(SIZES), 'color': rng.choice(COLORS)},
+            stock_level=rng.randrange(0, 500), reorder_level=rng.randrange(5, 50),
+        )
+        for product_id in product_ids
+        for number in range(variations_per_product)
+    ], batch_size=BATCH_SIZE)
+    variations = list(ProductVariation.objects.order_by('id').values_list('id', 'stock_level'))
+    StockMovement.objects.bulk_create([
+        StockMovement(product_variation_id=variation_id, quantity=stock_level, reason='Adjustment')
+        for variation_id, stock_level in variations if stock_level
+    ], batch_size=BATCH_SIZE)
+
+    Supplier.objects.bulk_create([
+        Supplier(name=f'Supplier {number}', email=f'supplier{number}@example.com', phone=f'555-{number:04d}')
+        for number in range(suppliers)
+    ], batch_size=BATCH_SIZE)
+    supplier_ids = list(Supplier.objects.values_list('id', flat=True))
+    variation_ids = [variation_id for variation_id, _ in variations]
+    lines = min(lines_per_order, len(variation_ids))
+
+    PurchaseOrder.objects.bulk_create([
+        PurchaseOrder(supplier_id=rng.choice(supplier_ids), status=rng.choice(['Draft', 'Submitted', 'Received']))
+        for _ in range(purchase_orders)
+    ], batch_size=BATCH_SIZE)
+    PurchaseOrderItem.objects.bulk_create([
+        PurchaseOrderItem(
+            purchase_order_id=order_id, product_variation_id=variation_id,
+            quantity_ordered=rng.randrange(10, 200), cost_per_unit=Decimal(rng.randrange(50, 20000)) / 100,
+        )
+        for order_id in PurchaseOrder.objects.values_list('id', flat=True).iterator()
+        for variation_id in rng.sample(variation_ids, lines)
+    ], batch_size=BATCH_SIZE)
+
+    SalesOrder.objects.bulk_create([
+        SalesOrder(customer_email=f'customer{rng.randrange(10000)}@example.com', status=rng.choice(['Pending', 'Fulfilled']))
+        for _ in range(sales_orders)
+    ], batch_size=BATCH_SIZE)
+    SalesOrderItem.objects.bulk_create([
+        SalesOrderItem(
+            sales_order_id=order_id, product_variation_id=variation_id,
+            quantity_sold=rng.randrange(1, 5), sale_price_per_unit=Decimal(rng.randrange(100, 50000)) / 100,
+        )
+        for order_id in SalesOrder.objects.values_list('id', flat=True).iterator()
+        for variation_id in rng.sample(variation_ids, lines)
+    ], batch_size=BATCH_SIZE)
+
+    # Someone for check_low_stock to mail
+    manager = User.objects.create_user('bench-manager', email='manager@example.com', password='bench')
+    manager.groups.add(Group.objects.get_or_create(name='Warehouse Manager')[0])
+    return {
+        'products': Product.objects.count(),
+        'variations': ProductVariation.objects.count(),
+        'suppliers': Supplier.objects.count(),
+        'purchase_orders': PurchaseOrder.objects.count(),
+        'sales_orders': SalesOrder.objects.count(),
+        'order_lines': PurchaseOrderItem.objects.count() + SalesOrderItem.objects.count(),
+    }
+
+
+# Run the fixed scenario - returns {step: summary}, steps in the order they ran
+# Each list endpoint gets one untimed warm-up call; writes are timed from the first one
+def run_scenario(iterations, lines_per_order, task_runs, seed):
+    rng = random.Random(seed)
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser('bench-admin', 'admin@example.com', 'bench'))
+    results = {}
+
+    for step, url in LIST_ENDPOINTS.items():
+        client.get(url)
+        results[step] = _time(iterations, lambda: client.get(url), 200)
+
+    # Orders on well-stocked SKUs, so every fulfillment succeeds
+    stocked = list(ProductVariation.objects.filter(stock_level__gte=iterations * 5).values_list('id', flat=True)[:1000])
+    supplier_ids = list(Supplier.objects.values_list('id', flat=True)[:100])
+    if not stocked or not supplier_ids:
+        raise ValueError('The dataset has no well-stocked SKUs or no suppliers to order from')
+    created = {'sales': [], 'purchase': []}
+
+    def create_sales_order():
+        response = client.post('/api/sales-orders/', {
+            'customer_email': f'bench{rng.randrange(10000)}@example.com',
+            'items_data': [
+                {'product_variation': variation_id, 'quantity_sold': rng.randrange(1, 4), 'sale_price_per_unit': '19.99'}
+                for variation_id in rng.sample(stocked, min(lines_per_order, len(stocked)))
+            ],
+        }, format='json')
+        if response.status_code == 201:
+            created['sales'].append(response.data['id'])
+        return response
+
+    def create_purchase_order():
+        response = client.post('/api/purchase-orders/', {
+            'supplier': rng.choice(supplier_ids),
+            'items_data': [
+                {'product_variation': variation_id, 'quantity_ordered': rng.randrange(10, 100), 'cost_per_unit': '7.50'}
+                for variation_id in rng.sample(stocked, min(lines_per_order, len(stocked)))
+            ],
+        }, format='json')
+        if response.status_code == 201:
+            created['purchase'].append(response.data['id'])
+        return response
+
+    results['create_sales_order'] = _time(iterations, create_sales_order, 201)
+    results['create_purchase_order'] = _time(iterations, create_purchase_order, 201)
+    sales_ids, purchase_ids = iter(created['sales']), iter(created['purchase'])
+    results['fulfill_sales_order'] = _time(
+        len(created['sales']), lambda: client.patch(f'/api/sales-orders/{next(sales_ids)}/', {'status': 'Fulfilled'}, format='json'), 200,
+    )
+    results['receive_purchase_order'] = _time(
+        len(created['purchase']), lambda: client.patch(f'/api/purchase-orders/{next(purchase_ids)}/', {'status': 'Received'}, format='json'), 200,
+    )
+    results['forecast_reorder_levels'] = _time(task_runs, refresh_reorder_levels, None)  # Reads every SKU's history each run
+    with redirect_stdout(io.StringIO()):  # The task prints its digest summary - keep stdout pure JSON
+        results['check_low_stock'] = _time(task_runs, check_low_stock, None)  # First run mails the backlog, later runs only re-check
+    return results
+
+
+# Call fn count times - latency percentiles, throughput, queries per call and calls that didn't answer expected_status
+def _time(count, fn, expected_status):
+    latencies, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(count):
+        reset_queries()  # The query log is capped - keep it from filling up
+        with CaptureQueriesContext(connection) as captured:
+            call_started = time.perf_counter()
+            result = fn()
+            latencies.append(time.perf_counter() - call_started)
+        queries.append(len(captured))
+        if expected_status is not None and result.status_code != expected_status:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {'calls': 0}
+    latencies.sort()
+    return {
+        'calls': count,
+        'errors': errors,
+        'p50_ms': _percentile(latencies, 50),
+        'p95_ms': _percentile(latencies, 95),
+        'p99_ms': _percentile(latencies, 99),
+        'mean_ms': round(sum(latencies) / count * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'throughput_per_s': round(count / elapsed, 1),
+        'queries': {'min': min(queries), 'max': max(queries), 'mean': round(sum(queries) / count, 2)},
+    }
+
+
+# Nearest-rank percentile of sorted latencies, in milliseconds
+def _percentile(latencies, percent):
+    rank = max(1, -(-len(latencies) * percent // 100))
+    return round(latencies[rank - 1] * 1000, 3)
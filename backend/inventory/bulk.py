@@ -0,0 +1,89 @@
+# Bulk order ingestion - validates a batch of orders, resolves every foreign key with
+# one query per model and writes orders and line items with batched INSERTs in one transaction
+from django.db import transaction
+from rest_framework import serializers, status
+from .models import ProductVariation
+
+MAX_BULK_ORDERS = 5000  # Upper bound on orders accepted per request
+INSERT_BATCH_SIZE = 1000  # Rows per INSERT statement
+
+
+# Create every valid order in `payload` and return (created order ids, per-order errors)
+# order_refs maps order-level id fields to their model, e.g. {'supplier': Supplier}
+def ingest_orders(payload, serializer_class, item_model, order_field, order_refs=None):
+    if not isinstance(payload, list):
+        raise serializers.ValidationError('Expected a list of orders.')
+    if len(payload) > MAX_BULK_ORDERS:
+        raise serializers.ValidationError(f'At most {MAX_BULK_ORDERS} orders per request.')
+    order_refs = order_refs or {}
+
+    # Field-level validation for each order - no database access
+    valid, errors = [], []
+    for index, order_data in enumerate(payload):
+        serializer = serializer_class(data=order_data)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # Resolve all referenced ids with one query per model
+    existing = {
+        field: set(model.objects.filter(id__in={data[field] for _, data in valid}).values_list('id', flat=True))
+        for field, model in order_refs.items()
+    }
+    variation_ids = {item['product_variation'] for _, data in valid for item in data.get('items_data', [])}
+    existing_variations = set(ProductVariation.objects.filter(id__in=variation_ids).values_list('id', flat=True))
+
+    # Drop orders that reference missing rows
+    resolved = []
+    for index, data in valid:
+        order_errors = {
+            field: [f'Invalid pk "{data[field]}" - object does not exist.']
+            for field in order_refs if data[field] not in existing[field]
+        }
+        item_errors = [
+            {'product_variation': [f'Invalid pk "{item["product_variation"]}" - object does not exist.']}
+            if item['product_variation'] not in existing_variations else {}
+            for item in data.get('items_data', [])
+        ]
+        if any(item_errors):
+            order_errors['items_data'] = item_errors
+        if order_errors:
+            errors.append({'index': index, 'errors': order_errors})
+        else:
+            resolved.append(data)
+
+    order_model = serializer_class.Meta.model
+    with transaction.atomic():
+        # Orders first - bulk_create fills in primary keys on PostgreSQL and SQLite
+        orders = order_model.objects.bulk_create(
+            [order_model(**_model_kwargs(data, order_refs)) for data in resolved],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        # Then every line item of every order
+        item_model.objects.bulk_create(
+            [
+                item_model(**{f'{order_field}_id': order.id}, **_model_kwargs(item, ['product_variation']))
+                for order, data in zip(orders, resolved)
+                for item in data.get('items_data', [])
+            ],
+            batch_size=INSERT_BATCH_SIZE,
+        )
+
+    errors.sort(key=lambda error: error['index'])
+    return [order.id for order in orders], errors
+
+
+# Map validated data to model kwargs - id-valued foreign keys go to their <field>_id column
+def _model_kwargs(data, fk_fields):
+    return {
+        f'{field}_id' if field in fk_fields else field: value
+        for field, value in data.items() if field != 'items_data'
+    }
+
+
+# 201 when every order was created, 207 when some failed, 400 when none were created
+def bulk_status(created, errors):
+    if not errors:
+        return status.HTTP_201_CREATED
+    return status.HTTP_207_MULTI_STATUS if created else status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,91 @@
+# Versioned response cache for read-heavy endpoints
+# Each namespace has a version number in the cache. Responses are stored under the current version,
+# and any write to the namespace bumps the version, which orphans every cached response at once
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+from .routers import primary_reads
+
+CATALOGUE = 'catalogue'  # Products and variations, including stock levels
+
+
+def _key(namespace, *parts):
+    return ':'.join(['inventory', namespace, *map(str, parts)])
+
+
+# Current version of a namespace - seeded from the clock so a version lost to eviction is never reused
+def namespace_version(namespace):
+    return cache.get_or_set(_key(namespace, 'version'), _fresh_version, timeout=None)
+
+
+def _fresh_version():
+    return time.time_ns()
+
+
+# Invalidate a namespace once the current transaction commits, so no reader can cache
+# pre-commit data under the new version
+def invalidate(namespace):
+    transaction.on_commit(lambda: _bump(namespace))
+
+
+def _bump(namespace):
+    try:
+        cache.incr(_key(namespace, 'version'))
+    except ValueError:  # Version was evicted - start a new, never-used sequence
+        cache.set(_key(namespace, 'version'), _fresh_version(), timeout=None)
+
+
+def _count(namespace, outcome):
+    try:
+        cache.incr(_key(namespace, outcome))
+    except ValueError:
+        cache.set(_key(namespace, outcome), 1, timeout=None)
+
+
+# Hit/miss counters of a namespace since the cache was last flushed
+def cache_stats(namespace):
+    counts = cache.get_many([_key(namespace, 'hits'), _key(namespace, 'misses')])
+    return {
+        'hits': counts.get(_key(namespace, 'hits'), 0),
+        'misses': counts.get(_key(namespace, 'misses'), 0),
+    }
+
+
+# Cached response data for a request path - (key to store it under on a miss, data or None); counts hits
+def cached_data(namespace, path):
+    key = _key(namespace, namespace_version(namespace), hashlib.md5(path.encode()).hexdigest())
+    data = cache.get(key)
+    if data is not None:
+        _count(namespace, 'hits')
+    return key, data
+
+
+# Cache response data built after a cached_data() miss - None for responses not to cache (errors); counts the miss
+def store_data(namespace, key, data):
+    if data is not None:
+        cache.set(key, data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    _count(namespace, 'misses')
+
+
+# ViewSet mixin that serves list/retrieve from the cache - set cache_namespace on the view
+# Cached data is shared by every user allowed to call the endpoint; permissions are still checked per request
+class CachedResponseMixin:
+    cache_namespace = None
+
+    def cached_response(self, request, build_response):
+        key, data = cached_data(self.cache_namespace, request.get_full_path())
+        if data is not None:
+            return Response(data)
+        with primary_reads():  # A lagging replica must not be cached past the invalidation that sent us here
+            response = build_response()
+        store_data(self.cache_namespace, key, response.data if response.status_code == 200 else None)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
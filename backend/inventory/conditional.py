@@ -0,0 +1,65 @@
+# Conditional GET support - ETag / Last-Modified validators computed before serializing
+import hashlib
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+# ViewSet mixin answering list/retrieve with 304 Not Modified when the validator matches
+# Lists are validated by max(timestamp) + count over the filtered queryset, details by the row's timestamp.
+# validator_dependencies lists (model, timestamp field) pairs for related rows embedded in the payload - each adds
+# its max(timestamp) + count, so an edit or a deletion of any embedded row changes every validator
+class ConditionalGetMixin:
+    last_modified_field = 'updated_at'
+    validator_dependencies = []
+
+    def list(self, request, *args, **kwargs):
+        stats = self.filter_queryset(self.get_queryset()).aggregate(
+            last=Max(self.last_modified_field), count=Count('pk')
+        )
+        # No Last-Modified on lists - a deletion lowers the count without moving max(timestamp)
+        return self._conditional(
+            request, [stats['count'], stats['last']], with_last_modified=False,
+            build_response=lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            last = self.filter_queryset(self.get_queryset()).filter(**lookup).aggregate(
+                last=Max(self.last_modified_field)
+            )['last']
+        except (TypeError, ValueError, ValidationError):  # Malformed lookup value (e.g. /api/products/abc/) - as get_object
+            raise Http404
+        if last is None:  # Missing row - let retrieve raise its 404
+            return super().retrieve(request, *args, **kwargs)
+        return self._conditional(
+            request, [last], with_last_modified=True,
+            build_response=lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    def _conditional(self, request, parts, with_last_modified, build_response):
+        timestamps = [part for part in parts[-1:] if part is not None]
+        for model, field in self.validator_dependencies:
+            # The count moves when an embedded row is deleted without being the newest; both are index-only
+            stats = model.objects.aggregate(last=Max(field), count=Count('pk'))
+            last = stats['last']
+            parts += [stats['count'], last]
+            if last is not None:
+                timestamps.append(last)
+        parts.append(request.get_full_path())
+        etag = quote_etag(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest())
+        # HTTP dates have whole-second precision - truncate so If-Modified-Since can match
+        last_modified = int(max(timestamps).timestamp()) if with_last_modified and timestamps else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = build_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            response['Cache-Control'] = 'private, no-cache'  # Browsers keep the body but revalidate every time
+        return response
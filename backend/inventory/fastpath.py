@@ -0,0 +1,205 @@
+# Fast read path for list endpoints - rows come from .values() instead of model instances, are shaped by a plan
+# compiled from the view's serializer, and are rendered with orjson. Output is byte-for-byte what the serializer
+# and DRF's JSONRenderer produce; serializers with fields the plan doesn't understand use the normal path
+from decimal import Decimal
+import orjson
+from django.conf import settings
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+from .instrumentation import serializing
+
+VALUE, JSON, ONE, MANY = range(4)  # Plan step kinds
+IDENTITY_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField, serializers.ChoiceField)  # Values pass through unchanged
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+# Per-request state shared by every row built from a plan
+class BuildState:
+    def __init__(self):
+        self.json_safe = True  # False once a JSON value orjson would format differently (floats, huge ints)
+
+
+# Columns to select and steps to turn a values() row into the serializer's representation
+# Nested serializers on a foreign key are joined into the same row (prefixed paths);
+# nested lists of a reverse foreign key are fetched with one extra query per page
+class RowPlan:
+    def __init__(self, serializer, model, prefix=''):
+        self.model, self.prefix = model, prefix
+        self.columns, self.steps, self.children = [], [], {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            if source == '*' or '.' in source:
+                raise UnsupportedField(name)
+            path = prefix + source
+            if isinstance(field, serializers.ListSerializer):
+                relation = model._meta.get_field(source)
+                if not relation.one_to_many:
+                    raise UnsupportedField(name)
+                self.children[name] = (RowPlan(field.child, relation.related_model), relation.field.name, source)
+                self._select(prefix + model._meta.pk.name)
+                self.steps.append((MANY, name, prefix + model._meta.pk.name, None))
+            elif isinstance(field, serializers.BaseSerializer):
+                relation = model._meta.get_field(source)
+                if not (relation.many_to_one or relation.one_to_one) or not relation.concrete:
+                    raise UnsupportedField(name)
+                nested = RowPlan(field, relation.related_model, path + '__')
+                if nested.children:
+                    raise UnsupportedField(name)
+                self._select(path)  # Foreign key value - None means no related row
+                for column in nested.columns:
+                    self._select(column)
+                self.steps.append((ONE, name, path, nested))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                self._select(path)
+                self.steps.append((VALUE, name, path, None))
+            elif isinstance(field, serializers.JSONField) and not field.binary:
+                self._select(path)
+                self.steps.append((JSON, name, path, None))
+            else:
+                self._select(path)
+                self.steps.append((VALUE, name, path, _converter(field)))
+
+    def _select(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+    # The serializer's representation of one values() row - children maps list names to {parent pk: [rows]}
+    def build(self, row, state, children=None):
+        data = {}
+        for kind, name, path, extra in self.steps:
+            value = row[path]
+            if kind == VALUE:
+                data[name] = value if extra is None or value is None else extra(value)
+            elif kind == JSON:
+                if state.json_safe and not _orjson_safe(value):
+                    state.json_safe = False
+                data[name] = value
+            elif kind == ONE:
+                data[name] = None if value is None else extra.build(row, state)
+            else:
+                data[name] = children[name].get(value, [])
+        return data
+
+    # Build a page of rows, fetching nested lists for all of them at once
+    # prefetches maps list sources to the querysets the view would have prefetched them with
+    def build_page(self, rows, state, prefetches):
+        children = {}
+        for name, child, fk_name, queryset in self.child_queries(rows, prefetches):
+            child_rows = list(queryset)
+            children[name] = group_by_parent(child_rows, child.build_page(child_rows, state, {}), fk_name)
+        return [self.build(row, state, children) for row in rows]
+
+    # values() querysets of the nested lists of a page of rows - (list name, child plan, parent key column, queryset)
+    def child_queries(self, rows, prefetches):
+        if not self.children:
+            return
+        ids = [row[self.prefix + self.model._meta.pk.name] for row in rows]
+        for name, (child, fk_name, source) in self.children.items():
+            queryset = prefetches.get(source)
+            if queryset is None:
+                queryset = child.model._default_manager.all()
+            queryset = queryset.filter(**{f'{fk_name}__in': ids})
+            if not queryset.ordered:
+                queryset = queryset.order_by('pk')
+            yield name, child, fk_name, queryset.values(*child.columns, *([fk_name] if fk_name not in child.columns else []))
+
+
+# Built child rows grouped by their parent's key - what build() takes for a nested list
+def group_by_parent(child_rows, built, fk_name):
+    grouped = {}
+    for child_row, data in zip(child_rows, built):
+        grouped.setdefault(child_row[fk_name], []).append(data)
+    return grouped
+
+
+# Output conversion for a scalar field - None where the database value is already the representation
+def _converter(field):
+    if isinstance(field, IDENTITY_FIELDS):
+        return None
+    if isinstance(field, serializers.DecimalField):
+        if not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) or field.localize:
+            return field.to_representation
+        return lambda value: '{:f}'.format(field.quantize(value)) if isinstance(value, Decimal) else field.to_representation(value)
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or timezone is None:
+            return field.to_representation
+        return lambda value: _isoformat(value, timezone) if value.tzinfo is not None else field.to_representation(value)
+    if isinstance(field, (serializers.DateField, serializers.UUIDField)):
+        return field.to_representation  # Strings either way
+    raise UnsupportedField(field.field_name)
+
+
+def _isoformat(value, timezone):
+    value = value.astimezone(timezone).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+# True if orjson renders a JSON value exactly like the stdlib encoder - it formats floats and
+# rejects integers outside 64 bits differently
+def _orjson_safe(value):
+    if isinstance(value, str) or value is None or isinstance(value, bool):
+        return True
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 64
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and _orjson_safe(item) for key, item in value.items())
+    if isinstance(value, list):
+        return all(_orjson_safe(item) for item in value)
+    return False
+
+
+# JSONRenderer producing the same bytes through orjson - only handed data made of str / int / bool / None,
+# dicts and lists (see RowPlan), for compact, non-ASCII-escaped output
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')  # As JSONRenderer
+        return ret
+
+
+# ViewSet mixin serving list through a RowPlan when the client takes plain JSON (FAST_LIST_RESPONSES setting)
+# Mix in after the caching / conditional mixins so they wrap it like they wrap the normal list
+class FastListMixin:
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_LIST_RESPONSES or type(request.accepted_renderer) is not JSONRenderer:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            plan = RowPlan(self.get_serializer(), queryset.model)
+        except UnsupportedField:
+            return super().list(request, *args, **kwargs)
+
+        prefetches = {
+            lookup.prefetch_to: lookup.queryset
+            for lookup in queryset._prefetch_related_lookups
+            if isinstance(lookup, Prefetch) and lookup.queryset is not None
+        }
+        columns = list(plan.columns)
+        for field in getattr(self.paginator, 'ordering', ()) or ():
+            if field.lstrip('-') not in columns:
+                columns.append(field.lstrip('-'))  # Cursor pagination reads its position from the row
+        rows = queryset.prefetch_related(None).values(*columns)
+
+        state = BuildState()
+        page = self.paginate_queryset(rows)
+        with serializing():
+            data = plan.build_page(list(rows) if page is None else page, state, prefetches)
+        response = Response(data) if page is None else self.get_paginated_response(data)
+        if state.json_safe:
+            request.accepted_renderer = FastJSONRenderer()
+        return response
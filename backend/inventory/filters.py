@@ -0,0 +1,47 @@
+# Query-string filtering for list endpoints
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+from .attributes import filter_by_attributes
+
+
+# Applies the view's filter_params - {query param: ORM lookup} - for every param present in the request
+# e.g. filter_params = {'status': 'status', 'created_after': 'created_at__gte'} makes ?status=Pending&created_after=2024-01-01 work
+class QueryParamFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        for param, lookup in getattr(view, 'filter_params', {}).items():
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: value})
+            except (ValueError, DjangoValidationError):
+                raise serializers.ValidationError({param: f'Invalid value "{value}".'})
+        return queryset
+
+
+# ?low_stock=true narrows variations to stock_level <= reorder_level (served by the partial low stock index)
+class LowStockFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get('low_stock', '').lower() in ('true', '1', 'yes'):
+            queryset = queryset.filter(stock_level__lte=F('reorder_level'))
+        return queryset
+
+
+# ?attr.<key>=<value> narrows variations by their JSON attributes - keys AND together, while comma-separated
+# or repeated values match any of them (?attr.size=L,XL&attr.color=red). Nested keys are dotted (?attr.dims.width=10)
+class AttributeFilterBackend(BaseFilterBackend):
+    prefix = 'attr.'
+
+    def filter_queryset(self, request, queryset, view):
+        criteria = {}
+        for param in request.query_params:
+            if not param.startswith(self.prefix):
+                continue
+            path = param[len(self.prefix):]
+            values = [value for raw in request.query_params.getlist(param) for value in raw.split(',') if value]
+            if not path or not values or '' in path.split('.'):
+                raise serializers.ValidationError({param: 'Expected attr.<key>=<value>[,<value>...].'})
+            criteria[path] = values
+        return filter_by_attributes(queryset, criteria) if criteria else queryset
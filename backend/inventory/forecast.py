@@ -0,0 +1,202 @@
+# Demand forecasting - reorder levels from each SKU's sales history and its supplier lead times
+# History is streamed from the database once, a chunk of rows at a time, and folded into per-SKU NumPy arrays;
+# every statistic is computed over all SKUs at once. A SKU's reorder level covers its expected demand over the
+# lead time plus safety stock for the service level:
+#   rate * lead + z * sqrt(lead * demand variance + rate^2 * lead variance)
+# with demand per day over FORECAST_HISTORY_DAYS (days without sales count as zero) and lead time from purchase
+# order creation to its receipt in the stock ledger. SKUs never received use the lead time of all receipts
+import time
+from datetime import timedelta
+from itertools import chain, islice
+from statistics import NormalDist
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .availability import invalidate_availability
+from .cache import CATALOGUE, invalidate
+from .models import ProductVariation, PurchaseOrderItem, SalesOrderItem, StockMovement
+from .stock import lock_stock
+
+LOAD_CHUNK_SIZE = 50000  # Rows fetched and folded into the arrays at a time
+WRITE_CHUNK_SIZE = 2000  # SKUs per reorder level UPDATE - each is its own short transaction
+DENSE_INDEX_FACTOR = 8  # Ids are looked up in a table up to this many times longer than the id list, else by binary search
+SECONDS_PER_DAY = 86400
+
+
+# Recompute the reorder level of every SKU and write the ones that changed - returns a report
+# SKUs younger than FORECAST_MIN_HISTORY_DAYS keep their level
+def refresh_reorder_levels(now=None):
+    started = time.perf_counter()
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.FORECAST_HISTORY_DAYS)
+    ids, history_days, current = _variations(now, since)
+    demand_total, demand_squares = _demand(ids, since)
+    lead_count, lead_total, lead_squares = _lead_times(ids, since)
+    levels = reorder_levels(
+        history_days, demand_total, demand_squares, lead_count, lead_total, lead_squares,
+        settings.FORECAST_SERVICE_LEVEL, settings.FORECAST_DEFAULT_LEAD_DAYS,
+    )
+    changed = (levels != current) & (history_days >= settings.FORECAST_MIN_HISTORY_DAYS)
+    updated = _write(ids[changed], levels[changed], now)
+    return {'skus': len(ids), 'updated': updated, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+# Reorder level per SKU from its per-day demand sums and lead time samples - every argument is indexed by SKU
+def reorder_levels(history_days, demand_total, demand_squares, lead_count, lead_total, lead_squares, service_level, default_lead_days):
+    days = np.maximum(history_days, 1)
+    rate = demand_total / days
+    demand_variance = np.where(days > 1, (demand_squares - demand_total * rate) / np.maximum(days - 1, 1), 0)
+
+    samples = lead_count.sum()
+    if samples:  # Lead time of every receipt, for SKUs never received
+        fallback = lead_total.sum() / samples
+        fallback_variance = (lead_squares.sum() - lead_total.sum() * fallback) / (samples - 1) if samples > 1 else 0
+    else:
+        fallback, fallback_variance = default_lead_days, 0
+    counts = np.maximum(lead_count, 1)
+    lead = np.where(lead_count > 0, lead_total / counts, fallback)
+    lead_variance = np.where(
+        lead_count > 1, (lead_squares - lead_total * lead) / np.maximum(lead_count - 1, 1),
+        np.where(lead_count > 0, 0, fallback_variance),
+    )
+
+    z = NormalDist().inv_cdf(service_level)
+    safety = z * np.sqrt(np.maximum(lead * np.maximum(demand_variance, 0) + rate ** 2 * np.maximum(lead_variance, 0), 0))
+    return np.ceil(np.maximum(rate * lead + safety, 0) - 1e-9).astype(np.int64)  # Tolerance - 2.0000000001 is 2
+
+
+# Every SKU in id order - (ids, days of history within the window, current reorder levels)
+def _variations(now, since):
+    ids, created, current = [], [], []
+    for chunk in _chunks(ProductVariation.objects.order_by('id').values_list('id', 'created_at', 'reorder_level')):
+        ids.append(np.fromiter((row[0] for row in chunk), np.int64, len(chunk)))
+        created.append(np.fromiter((max(row[1], since).timestamp() for row in chunk), np.float64, len(chunk)))
+        current.append(np.fromiter((row[2] for row in chunk), np.int64, len(chunk)))
+    if not ids:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0, np.int64)
+    return np.concatenate(ids), (now.timestamp() - np.concatenate(created)) / SECONDS_PER_DAY, np.concatenate(current)
+
+
+# Units sold per SKU per day since `since`, folded into per-SKU sums - (total units, sum of squared daily units)
+def _demand(ids, since):
+    total, squares = np.zeros(len(ids)), np.zeros(len(ids))
+    positions_of = _indexer(ids)
+    daily = (
+        SalesOrderItem.objects.filter(sales_order__created_at__gte=since)
+        .annotate(day=TruncDate('sales_order__created_at'))
+        .values('product_variation_id', 'day')
+        .annotate(quantity=Sum('quantity_sold'))
+        .values_list('product_variation_id', 'quantity')
+    )
+    for rows in _int_chunks(daily, 2):
+        positions, found = positions_of(rows[:, 0])
+        quantity = rows[found, 1].astype(np.float64)
+        np.add.at(total, positions[found], quantity)
+        np.add.at(squares, positions[found], quantity ** 2)
+    return total, squares
+
+
+# Lead time samples per SKU - one per received purchase order line created since `since`, in days
+# Returns (sample count, sum, sum of squares)
+def _lead_times(ids, since):
+    # Receipt time per order from the ledger - the movements are written in the receiving transaction
+    receipts = (
+        StockMovement.objects.filter(reason='Receipt', purchase_order__created_at__gte=since)
+        .values('purchase_order_id', 'purchase_order__created_at')
+        .annotate(lead=ExpressionWrapper(Min('created_at') - F('purchase_order__created_at'), output_field=DurationField()))
+        .values_list('purchase_order_id', 'lead')
+        .order_by('purchase_order_id')
+    )
+    order_ids, leads = [], []
+    for chunk in _chunks(receipts):
+        order_ids.append(np.fromiter((row[0] for row in chunk), np.int64, len(chunk)))
+        leads.append(np.fromiter((row[1].total_seconds() / SECONDS_PER_DAY for row in chunk), np.float64, len(chunk)))
+    count, total, squares = np.zeros(len(ids)), np.zeros(len(ids)), np.zeros(len(ids))
+    if not order_ids:
+        return count, total, squares
+    leads = np.concatenate(leads)
+    positions_of, orders_of = _indexer(ids), _indexer(np.concatenate(order_ids))
+
+    lines = PurchaseOrderItem.objects.filter(purchase_order__created_at__gte=since, purchase_order__status='Received').values_list(
+        'product_variation_id', 'purchase_order_id'
+    )
+    for rows in _int_chunks(lines, 2):
+        positions, found = positions_of(rows[:, 0])
+        orders, received = orders_of(rows[:, 1])
+        found &= received
+        lead = leads[orders[found]]
+        np.add.at(count, positions[found], 1)
+        np.add.at(total, positions[found], lead)
+        np.add.at(squares, positions[found], lead ** 2)
+    return count, total, squares
+
+
+# Rows of a queryset in lists of LOAD_CHUNK_SIZE, streamed through a database cursor
+def _chunks(queryset):
+    rows = queryset.iterator(chunk_size=LOAD_CHUNK_SIZE)
+    while chunk := list(islice(rows, LOAD_CHUNK_SIZE)):
+        yield chunk
+
+
+# Integer rows of a queryset as (rows, width) arrays, a chunk at a time
+def _int_chunks(queryset, width):
+    for chunk in _chunks(queryset):
+        yield np.fromiter(chain.from_iterable(chunk), np.int64, len(chunk) * width).reshape(-1, width)
+
+
+# Lookup of positions in the sorted, unique array keys - returns f(values) -> (positions, mask of values found)
+# Compact ids (the usual auto-increment keys) go through a table indexed by id - random binary searches over a
+# million keys cost more than everything else in a forecast
+def _indexer(keys):
+    if not len(keys):
+        return lambda values: (np.zeros(len(values), np.int64), np.zeros(len(values), bool))
+    if keys[0] >= 0 and keys[-1] < DENSE_INDEX_FACTOR * len(keys) + LOAD_CHUNK_SIZE:
+        table = np.full(keys[-1] + 1, -1, np.int64)
+        table[keys] = np.arange(len(keys))
+
+        def lookup(values):
+            positions = table[np.clip(values, 0, len(table) - 1)]
+            found = (positions >= 0) & (values >= 0) & (values < len(table))
+            return positions, found
+        return lookup
+
+    def search(values):
+        positions = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+        return positions, keys[positions] == values
+    return search
+
+
+# Set reorder levels with one UPDATE per level value and chunk of SKUs - returns the number of SKUs written
+# Statements are grouped into transactions of about WRITE_CHUNK_SIZE SKUs, whose rows are locked in id order first
+# (as every stock write locks them) so fulfillment can't deadlock against the job
+def _write(ids, levels, now):
+    order = np.argsort(levels, kind='stable')  # Grouped by level, ids ascending within each level
+    ids, levels = ids[order], levels[order]
+    starts = np.flatnonzero(np.r_[True, levels[1:] != levels[:-1]]) if len(levels) else []
+    bounds = [*starts, len(levels)]
+    batch, size = [], 0
+    for first, last in zip(bounds, bounds[1:]):
+        for start in range(first, last, WRITE_CHUNK_SIZE):
+            chunk = ids[start:min(start + WRITE_CHUNK_SIZE, last)].tolist()
+            batch.append((int(levels[first]), chunk))
+            size += len(chunk)
+            if size >= WRITE_CHUNK_SIZE:
+                _write_batch(batch, now)
+                batch, size = [], 0
+    if batch:
+        _write_batch(batch, now)
+    if len(ids):
+        invalidate(CATALOGUE)  # Queryset updates skip post_save
+    return len(ids)
+
+
+def _write_batch(batch, now):
+    variation_ids = [variation_id for _, chunk in batch for variation_id in chunk]
+    with transaction.atomic():
+        lock_stock(variation_ids)
+        for level, chunk in batch:
+            ProductVariation.objects.filter(id__in=chunk).update(reorder_level=level, updated_at=now)
+        invalidate_availability(variation_ids)
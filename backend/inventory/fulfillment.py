@@ -0,0 +1,54 @@
+# Asynchronous fulfillment - a PATCH that opts in (Prefer: respond-async) queues a FulfillmentJob and is answered
+# 202 Accepted; the drain_fulfillment_queue task fulfills queued orders FULFILLMENT_BATCH_SIZE at a time. A batch
+# goes through fulfill_sales_orders in one transaction, so however many of its orders share a SKU, the SKU is locked
+# once and decremented by a single UPDATE, and every job's outcome commits with the stock it moved
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import FulfillmentJob, SalesOrder
+from .stock import fulfill_sales_orders
+
+
+# Queue fulfillment of an order - returns its queued job, the one already queued if there is one
+def queue_fulfillment(order_id):
+    with transaction.atomic():
+        # Lock the order as fulfillment and delete do, so two requests can't queue it twice
+        list(SalesOrder.objects.select_for_update().filter(pk=order_id).values_list('id', flat=True))
+        job = FulfillmentJob.objects.filter(sales_order_id=order_id, status='Queued').first()
+        if job is None:
+            job = FulfillmentJob.objects.create(sales_order_id=order_id)
+    return job
+
+
+# Fulfill queued jobs a batch per transaction until none are left - returns {'batches', 'fulfilled', 'failed'}
+# Orders another transaction has locked are skipped and left for the next drain (at the latest the scheduled one)
+def drain_fulfillments(batch_size=None):
+    batch_size = batch_size or settings.FULFILLMENT_BATCH_SIZE
+    report = {'batches': 0, 'fulfilled': 0, 'failed': 0}
+    while True:
+        with transaction.atomic():
+            order_ids = list(
+                SalesOrder.objects.select_for_update(skip_locked=True)
+                .filter(id__in=FulfillmentJob.objects.filter(status='Queued').values('sales_order_id'))
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not order_ids:
+                return report
+            fulfilled, errors = fulfill_sales_orders(order_ids)
+            _finish(fulfilled, errors)
+        report['batches'] += 1
+        report['fulfilled'] += len(fulfilled)
+        report['failed'] += len(errors)
+
+
+# Record the outcome of a batch on its queued jobs - one UPDATE for the fulfilled orders and one per error message
+def _finish(fulfilled, errors):
+    now = timezone.now()
+    queued = FulfillmentJob.objects.filter(status='Queued')
+    queued.filter(sales_order_id__in=fulfilled).update(status='Fulfilled', finished_at=now)
+    failed = {}
+    for order_id, message in errors.items():
+        failed.setdefault(message, []).append(order_id)
+    for message, order_ids in failed.items():
+        queued.filter(sales_order_id__in=order_ids).update(status='Failed', error=message, finished_at=now)
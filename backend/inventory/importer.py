@@ -0,0 +1,176 @@
+# Streaming catalogue import - products and variations from CSV or NDJSON
+# Rows are parsed one at a time and upserted in chunks keyed on sku_code, so memory stays bounded
+# by the chunk size whatever the size of the feed
+import csv
+import io
+import json
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from .attributes import index_attributes
+from .availability import invalidate_availability
+from .cache import CATALOGUE, invalidate
+from .models import Product, ProductVariation, StockMovement
+from .reservations import rebalance
+from .search import index_products, index_variations
+from .stock import record_movements
+
+IMPORT_CHUNK_SIZE = 1000  # Rows per upsert transaction
+MAX_REPORTED_ERRORS = 1000  # Row errors kept in the report - the rest are only counted
+UPDATE_BATCH_SIZE = 100  # Rows per bulk UPDATE - its CASE expressions grow quadratically with batch size
+FORMATS = ('csv', 'ndjson')
+
+
+# One feed row - a variation plus the product it belongs to (products are matched by name)
+class CatalogueRowSerializer(serializers.Serializer):
+    product_name = serializers.CharField(max_length=200)
+    category = serializers.CharField(max_length=100, default='General')
+    description = serializers.CharField(allow_blank=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    sku_code = serializers.CharField(max_length=100)
+    attributes = serializers.JSONField(default=dict)
+    stock_level = serializers.IntegerField(required=False)  # Left unchanged on existing SKUs when omitted
+    reorder_level = serializers.IntegerField(required=False)
+
+    def validate_attributes(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Must be a JSON object.')
+        return value
+
+
+# Yield (line number, row dict) from a binary or text stream without reading it all into memory
+def read_rows(stream, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' - expected one of {', '.join(FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='') if isinstance(stream.read(0), bytes) else stream
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Blank cells mean "not given"; attributes arrive as a JSON string
+            row = {field: value for field, value in row.items() if field and value != ''}
+            if 'attributes' in row:
+                try:
+                    row['attributes'] = json.loads(row['attributes'])
+                except ValueError:
+                    pass  # Left as a string - validate_attributes reports it
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+
+# Import a catalogue feed - returns a report of counts and (capped) per-row errors
+# progress, if given, is called with the running report after every chunk
+def import_catalogue(stream, fmt, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    report = {'rows': 0, 'products_created': 0, 'variations_created': 0, 'variations_updated': 0, 'variations_unchanged': 0, 'error_count': 0, 'errors': []}
+    chunk = {}
+    for line_number, row in read_rows(stream, fmt):
+        report['rows'] += 1
+        serializer = CatalogueRowSerializer(data=row) if isinstance(row, dict) else None
+        if serializer is None or not serializer.is_valid():
+            _report_error(report, line_number, serializer.errors if serializer else {'row': ['Not a JSON object.']})
+            continue
+        chunk[serializer.validated_data['sku_code']] = serializer.validated_data  # Last row wins for repeated SKUs
+        if len(chunk) >= chunk_size:
+            _upsert_chunk(list(chunk.values()), report)
+            chunk = {}
+            if progress:
+                progress(report)
+    if chunk:
+        _upsert_chunk(list(chunk.values()), report)
+    if progress:
+        progress(report)
+    return report
+
+
+def _report_error(report, line_number, errors):
+    report['error_count'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line_number, 'errors': errors})
+
+
+# Set the given attributes on an instance - returns True if any of them changed
+def _assign(instance, **values):
+    changed = False
+    for field, value in values.items():
+        if field == 'product':
+            if instance.product_id != value.pk:
+                instance.product, changed = value, True
+        elif getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed = True
+    return changed
+
+
+def _upsert_chunk(rows, report):
+    now = timezone.now()
+    with transaction.atomic():
+        # Products by name - one lookup, one INSERT for the missing ones, one UPDATE for the changed ones
+        products = {}
+        for product in Product.objects.filter(name__in={row['product_name'] for row in rows}).order_by('-id'):
+            products[product.name] = product  # Lowest id wins when names repeat
+        new_products, changed_products = {}, {}
+        for row in rows:
+            values = {'category': row['category'], 'description': row['description'], 'price': row['price']}
+            product = products.get(row['product_name'])
+            if product is None:
+                product = new_products.setdefault(row['product_name'], Product(name=row['product_name'], quantity=0))
+                _assign(product, **values)  # Last row wins for repeated names
+            elif _assign(product, **values):
+                product.updated_at = now
+                changed_products[product.name] = product
+        Product.objects.bulk_create(new_products.values())
+        Product.objects.bulk_update(
+            changed_products.values(), ['category', 'description', 'price', 'updated_at'], batch_size=UPDATE_BATCH_SIZE,
+        )
+        index_products([*new_products.values(), *changed_products.values()])  # Bulk writes skip post_save
+        products.update(new_products)
+
+        # Variations by sku_code - existing rows are locked in id order like every other stock write
+        existing = {
+            variation.sku_code: variation
+            for variation in ProductVariation.objects.select_for_update().filter(
+                sku_code__in=[row['sku_code'] for row in rows]
+            ).order_by('id')
+        }
+        created, updated, movements = [], [], []
+        for row in rows:
+            variation = existing.get(row['sku_code'])
+            values = {'product': products[row['product_name']], 'attributes': row['attributes']}
+            values.update({field: row[field] for field in ('stock_level', 'reorder_level') if field in row})
+            if variation is None:
+                variation = ProductVariation(sku_code=row['sku_code'], **values)
+                created.append(variation)
+                continue
+            previous_stock = variation.stock_level
+            if _assign(variation, **values):  # Unchanged rows are skipped - re-imports of a stable feed write nothing
+                variation.updated_at = now
+                updated.append(variation)
+                movements.append(StockMovement(
+                    product_variation=variation, quantity=variation.stock_level - previous_stock, reason='Adjustment',
+                ))
+        ProductVariation.objects.bulk_create(created)
+        ProductVariation.objects.bulk_update(
+            updated, ['product', 'attributes', 'stock_level', 'reorder_level', 'updated_at'], batch_size=UPDATE_BATCH_SIZE,
+        )
+        index_attributes(created + updated)  # Bulk writes skip post_save
+        index_variations(created + updated)
+        movements += [
+            StockMovement(product_variation=variation, quantity=variation.stock_level, reason='Adjustment')
+            for variation in created
+        ]
+        record_movements(movements)  # Zero-quantity movements are dropped
+        if new_products or changed_products or created or updated:
+            invalidate(CATALOGUE)  # Bulk writes skip post_save
+        invalidate_availability([variation.id for variation in updated])
+        rebalance([variation.id for variation in updated])  # Stock levels may have moved under reserved units
+
+    report['products_created'] += len(new_products)
+    report['variations_created'] += len(created)
+    report['variations_updated'] += len(updated)
+    report['variations_unchanged'] += len(existing) - len(updated)
@@ -0,0 +1,152 @@
+# Per-request and per-task performance instrumentation - SQL query count and time, serialization time and
+# total latency, sent back in a Server-Timing header and aggregated into the histograms behind /metrics
+# Queries slower than SLOW_QUERY_MS are logged to the inventory.slow_query logger
+import contextvars
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from . import metrics
+
+logger = logging.getLogger('inventory.slow_query')
+_current = contextvars.ContextVar('inventory_stats', default=None)
+_running_tasks = {}  # Celery task id -> (ExitStack closing its measurement, stats, start time)
+
+
+# What a request or task spent its time on so far
+class Stats:
+    __slots__ = ('queries', 'db_seconds', 'serialize_seconds', 'serializing')
+
+    def __init__(self):
+        self.queries, self.db_seconds, self.serialize_seconds, self.serializing = 0, 0.0, 0.0, False
+
+
+# Count and time every query run until the block exits - in this context, so also in the threads async ORM calls run on
+# Nested measurements (an eager Celery task inside a request) record into the innermost Stats only
+@contextmanager
+def measure():
+    token = _current.set(Stats())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+# Every connection times its queries through _record_query - it records into the Stats of whoever is measuring
+def _wrap_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:  # Reconnects reuse the wrapper object
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def _record_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning('Slow query (%.1f ms on %s): %s', elapsed * 1000, context['connection'].alias, sql)
+
+
+# Count the block as serialization time - queries it triggers (lazy relations) are left to the SQL time
+@contextmanager
+def serializing():
+    stats = _current.get()
+    if stats is None or stats.serializing:  # Nested serializers are part of the outer one's time
+        yield
+        return
+    stats.serializing = True
+    started, db_before = time.perf_counter(), stats.db_seconds
+    try:
+        yield
+    finally:
+        stats.serialize_seconds += time.perf_counter() - started - (stats.db_seconds - db_before)
+        stats.serializing = False
+
+
+# Serializer mixin counting to_representation as serialization time - inventory.serializers bases its classes on it
+# Nested serializers run inside the outermost one's time, and each row of a list is timed on its own
+class TimedRepresentationMixin:
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None or stats.serializing:  # Not measured, or already counted - skip the timer
+            return super().to_representation(instance)
+        with serializing():
+            return super().to_representation(instance)
+
+
+# Time every query and connect the Celery task hooks - called once from AppConfig.ready()
+def instrument():
+    connection_created.connect(_wrap_connection, weak=False)
+    task_prerun.connect(_start_task, weak=False)
+    task_postrun.connect(_finish_task, weak=False)
+
+
+def _start_task(task_id=None, task=None, **kwargs):
+    stack = ExitStack()
+    stats = stack.enter_context(measure())
+    _running_tasks[task_id] = (stack, stats, time.perf_counter())
+
+
+def _finish_task(task_id=None, task=None, state=None, **kwargs):
+    if task_id not in _running_tasks:
+        return
+    stack, stats, started = _running_tasks.pop(task_id)
+    stack.close()
+    labels = (task.name, state or 'UNKNOWN')
+    metrics.TASK_DURATION.observe(time.perf_counter() - started, *labels)
+    metrics.TASK_DB_DURATION.observe(stats.db_seconds, *labels)
+    metrics.TASK_DB_QUERIES.observe(stats.queries, *labels)
+    metrics.flush()
+
+
+# Middleware measuring every request - first in MIDDLEWARE so the timings cover the whole stack; runs sync or async
+# Streamed bodies (exports) are measured up to the point the response starts
+class PerformanceMiddleware:
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with measure() as stats:
+            response = self.get_response(request)
+        return self._record(request, response, stats, started)
+
+    async def _acall(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        with measure() as stats:
+            response = await self.get_response(request)
+        return self._record(request, response, stats, started)
+
+    def _record(self, request, response, stats, started):
+        elapsed = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+            f'serialize;dur={stats.serialize_seconds * 1000:.1f}, app;dur={elapsed * 1000:.1f}'
+        )
+        match = request.resolver_match
+        labels = (match.view_name if match else 'unmatched', request.method)  # Route names keep the label set small
+        metrics.REQUEST_DURATION.observe(elapsed, *labels)
+        metrics.REQUEST_DB_DURATION.observe(stats.db_seconds, *labels)
+        metrics.REQUEST_DB_QUERIES.observe(stats.queries, *labels)
+        metrics.REQUEST_SERIALIZE_DURATION.observe(stats.serialize_seconds, *labels)
+        metrics.flush()
+        return response
@@ -0,0 +1,74 @@
+# Management command: python manage.py bench --settings=backend.settings_bench [--products 1000] [--iterations 50]
+# Builds a synthetic dataset in an empty SQLite database and runs the API scenario, printing the results as JSON
+import json
+import platform
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from inventory.benchmark import build_dataset, run_scenario
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the API on a synthetic SQLite dataset - latency percentiles, throughput and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--variations-per-product', type=int, default=5)
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--purchase-orders', type=int, default=2000)
+        parser.add_argument('--sales-orders', type=int, default=5000)
+        parser.add_argument('--lines-per-order', type=int, default=3)
+        parser.add_argument('--iterations', type=int, default=50, help='Calls per list / create / fulfill / receive step')
+        parser.add_argument('--task-runs', type=int, default=5, help='forecast_reorder_levels and check_low_stock runs')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed - the same seed builds the same dataset and requests')
+        parser.add_argument('--output', help='Write the JSON report to this file as well')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench runs on SQLite - use --settings=backend.settings_bench')
+        call_command('migrate', verbosity=0, interactive=False)
+        if Product.objects.exists():
+            raise CommandError('bench builds its own dataset - point it at an empty database (BENCH_DB)')
+
+        started = time.perf_counter()
+        dataset = build_dataset(
+            options['products'], options['variations_per_product'], options['suppliers'],
+            options['purchase_orders'], options['sales_orders'], options['lines_per_order'], options['seed'],
+        )
+        dataset['build_seconds'] = round(time.perf_counter() - started, 2)
+        steps = run_scenario(options['iterations'], options['lines_per_order'], options['task_runs'], options['seed'])
+
+        report = {
+            'commit': _git_commit(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': connection.Database.sqlite_version,
+                'fast_list_responses': settings.FAST_LIST_RESPONSES,
+            },
+            'options': {name: options[name] for name in (
+                'iterations', 'task_runs', 'seed', 'lines_per_order',
+            )},
+            'dataset': dataset,
+            'steps': steps,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                stream.write(output + '\n')
+        self.stdout.write(output)
+
+
+# Short hash of the checked-out commit, so reports can be told apart - None outside a git checkout
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
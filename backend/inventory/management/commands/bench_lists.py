@@ -0,0 +1,65 @@
+# Management command: python manage.py bench_lists - list endpoint throughput with FAST_LIST_RESPONSES off and on
+# Runs against the configured database through the test client with the response cache disabled, checks both
+# paths return the same bytes and prints requests/second and queries per request as JSON
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+ENDPOINTS = ['/api/variations/', '/api/products/', '/api/purchase-orders/', '/api/sales-orders/']
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = 'Compare list endpoint throughput with and without the values() / orjson fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per endpoint and mode')
+        parser.add_argument('--page-size', type=int, default=100, help='page_size sent with every request')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help='Path to benchmark (repeatable, default: all list endpoints)')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_superuser=True, is_active=True).first()
+        if user is None:
+            raise CommandError('Needs an active superuser to call the API as - run createsuperuser first')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        results = []
+        with override_settings(CACHES=NO_CACHE):
+            for endpoint in options['endpoints'] or ENDPOINTS:
+                url = f"{endpoint}{'&' if '?' in endpoint else '?'}page_size={options['page_size']}"
+                normal, fast = (self._measure(client, url, fast, options['requests']) for fast in (False, True))
+                results.append({
+                    'endpoint': endpoint,
+                    'identical': normal.pop('body') == fast.pop('body'),
+                    'normal': normal,
+                    'fast': fast,
+                    'speedup': round(fast['requests_per_second'] / normal['requests_per_second'], 2),
+                })
+        self.stdout.write(json.dumps(results, indent=2))
+        if not all(result['identical'] for result in results):
+            raise CommandError('Fast path responses differ from the serializer output')
+
+    def _measure(self, client, url, fast, requests):
+        with override_settings(FAST_LIST_RESPONSES=fast):
+            reset_queries()  # The query log is capped - earlier timed runs fill it
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)  # Warm-up - also the body compared across modes
+            if response.status_code != 200:
+                raise CommandError(f'GET {url} returned {response.status_code}')
+            started = time.perf_counter()
+            for _ in range(requests):
+                client.get(url)
+            elapsed = time.perf_counter() - started
+        return {
+            'requests_per_second': round(requests / elapsed, 1),
+            'ms_per_request': round(elapsed / requests * 1000, 2),
+            'queries': len(queries),
+            'bytes': len(response.content),
+            'body': response.content,
+        }
@@ -0,0 +1,39 @@
+# Management command: python manage.py import_catalogue feed.csv [--format ndjson] [--chunk-size 1000]
+import json
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from inventory.importer import FORMATS, IMPORT_CHUNK_SIZE, import_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or NDJSON catalogue feed into products and variations, upserting on sku_code'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file to import')
+        parser.add_argument('--format', choices=FORMATS, help='Feed format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Rows per upsert transaction')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Can't tell the format of {path} - pass --format {'/'.join(FORMATS)}")
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+
+        # Print a progress line after every chunk
+        def progress(report):
+            self.stdout.write(
+                f"{report['rows']} rows: {report['variations_created']} created, "
+                f"{report['variations_updated']} updated, {report['error_count']} errors"
+            )
+
+        with path.open('rb') as stream:
+            report = import_catalogue(stream, fmt, chunk_size=options['chunk_size'], progress=progress)
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['rows']} rows ({report['products_created']} new products, "
+            f"{report['variations_created']} new and {report['variations_updated']} updated variations, "
+            f"{report['error_count']} errors)"
+        ))
@@ -0,0 +1,137 @@
+# Management command: python manage.py loadtest --url http://localhost:8001/api/async/stock/SKU-1-0/ --concurrency 500
+# Closed-loop HTTP load generator - each of --concurrency clients holds one keep-alive connection and sends GETs
+# back to back for --duration seconds, cycling through the --url list. Prints throughput and latency as JSON
+# Run it against a server started separately (WSGI or ASGI), from a machine or cores the server isn't using
+import asyncio
+import json
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+from django.core.management.base import BaseCommand, CommandError
+from inventory.benchmark import _percentile
+
+
+class Command(BaseCommand):
+    help = 'HTTP load test - requests per second and latency percentiles at a fixed number of concurrent clients'
+    requires_system_checks = []  # Only a client - the server under test may run other settings
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', required=True, help='URL to GET - repeat to cycle through several')
+        parser.add_argument('--concurrency', type=int, default=500, help='Concurrent clients, one connection each')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to measure for')
+        parser.add_argument('--warmup', type=float, default=3, help='Seconds of load before measuring starts')
+        parser.add_argument('--token', help='JWT access token sent as "Authorization: Bearer <token>"')
+        parser.add_argument('--username', help='Log in through /api/token/ instead of passing --token')
+        parser.add_argument('--password')
+        parser.add_argument('--output', help='Write the JSON report to this file as well')
+
+    def handle(self, *args, **options):
+        targets = [urlsplit(url) for url in options['url']]
+        if any(target.scheme != 'http' for target in targets) or len({target.netloc for target in targets}) > 1:
+            raise CommandError('--url must be plain http:// URLs on one host')
+        token = options['token']
+        if token is None and options['username']:
+            token = _login(targets[0], options['username'], options['password'])
+
+        report = asyncio.run(_run(targets, token, options['concurrency'], options['duration'], options['warmup']))
+        report['options'] = {name: options[name] for name in ('url', 'concurrency', 'duration')}
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as stream:
+                stream.write(output + '\n')
+        self.stdout.write(output)
+
+
+def _login(target, username, password):
+    body = json.dumps({'username': username, 'password': password}).encode()
+    request = Request(f'http://{target.netloc}/api/token/', body, {'Content-Type': 'application/json'})
+    try:
+        with urlopen(request, timeout=10) as response:
+            return json.load(response)['access']
+    except HTTPError as exc:
+        raise CommandError(f'Login failed ({exc.code}): {exc.read().decode()}')
+
+
+async def _run(targets, token, concurrency, duration, warmup):
+    host, _, port = targets[0].netloc.partition(':')
+    requests_bytes = [
+        (
+            f'GET {target.path or "/"}{"?" + target.query if target.query else ""} HTTP/1.1\r\n'
+            f'Host: {target.netloc}\r\nAccept: application/json\r\n'
+            + (f'Authorization: Bearer {token}\r\n' if token else '')
+            + '\r\n'
+        ).encode()
+        for target in targets
+    ]
+    latencies, statuses, errors = [], {}, {'connect': 0, 'io': 0}
+    started = time.perf_counter()
+    measure_from, stop_at = started + warmup, started + warmup + duration
+
+    async def client(number):
+        reader = writer = None
+        sent = number  # Offset the cycle so the clients don't all hit the same URL at once
+        while time.perf_counter() < stop_at:
+            if writer is None:
+                try:
+                    reader, writer = await asyncio.open_connection(host, int(port or 80))
+                except OSError:
+                    errors['connect'] += 1
+                    await asyncio.sleep(0.1)
+                    continue
+            request_started = time.perf_counter()
+            try:
+                writer.write(requests_bytes[sent % len(requests_bytes)])
+                status, keep_alive = await _read_response(reader)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors['io'] += 1
+                writer.close()
+                reader = writer = None
+                continue
+            sent += 1
+            if request_started >= measure_from:
+                latencies.append(time.perf_counter() - request_started)
+                statuses[status] = statuses.get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    return {
+        'requests': len(latencies),
+        'ok': ok,
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'ok_per_s': round(ok / elapsed, 1),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'errors': errors,
+        'p50_ms': _percentile(latencies, 50) if latencies else None,
+        'p95_ms': _percentile(latencies, 95) if latencies else None,
+        'p99_ms': _percentile(latencies, 99) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+
+
+# Read one HTTP/1.1 response, body included - (status code, whether the connection stays open)
+async def _read_response(reader):
+    status_line = await reader.readuntil(b'\r\n')
+    status = int(status_line.split(None, 2)[1])
+    headers = {}
+    while (line := await reader.readuntil(b'\r\n')) != b'\r\n':
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while (size := int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)):
+            await reader.readexactly(size + 2)
+        while await reader.readuntil(b'\r\n') != b'\r\n':  # Trailers
+            pass
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()  # Body runs to the end of the connection
+        return status, False
+    return status, headers.get('connection', '').lower() != 'close'
@@ -0,0 +1,14 @@
+# Management command: python manage.py rebuild_search_index - reindex every product and variation for /api/search/
+from django.core.management.base import BaseCommand
+from inventory.search import INDEX_BATCH_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Drop and rebuild the product / SKU search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=INDEX_BATCH_SIZE, help='Products or variations indexed per batch')
+
+    def handle(self, *args, **options):
+        written = rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {written} search entries'))
@@ -0,0 +1,106 @@
+# Prometheus histograms shared by every web and Celery worker process
+# Each process aggregates observations in memory and writes a snapshot of its totals to the cache every
+# METRICS_FLUSH_INTERVAL seconds; /metrics adds the snapshots of all live processes up in the text format
+import math
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from django.conf import settings
+from django.core.cache import cache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # Seconds
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)  # Seconds - tasks run longer than requests
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)  # Queries per request / task
+SNAPSHOT_TIMEOUT = 24 * 60 * 60  # Snapshots of processes that stopped flushing age out after a day
+INDEX_KEY = 'inventory:metrics:processes'
+
+
+# A histogram with a fixed label set - observations are counted per label values in this process
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name, self.help_text, self.buckets, self.labels = name, help_text, tuple(buckets), tuple(labels)
+        self.series = {}  # label values -> [per-bucket counts (last one is +Inf), sum, count]
+
+    def observe(self, value, *label_values):
+        with _lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+
+_lock = threading.Lock()
+_histograms = {}
+_process_key = f'inventory:metrics:process:{socket.gethostname()}:{os.getpid()}'
+_last_flush = 0.0
+
+
+def histogram(name, help_text, buckets, labels):
+    return _histograms.setdefault(name, Histogram(name, help_text, buckets, labels))
+
+
+REQUEST_DURATION = histogram('http_request_duration_seconds', 'Time to answer a request, rendering included', LATENCY_BUCKETS, ['endpoint', 'method'])
+REQUEST_DB_DURATION = histogram('http_request_db_duration_seconds', 'Time spent in SQL queries per request', LATENCY_BUCKETS, ['endpoint', 'method'])
+REQUEST_DB_QUERIES = histogram('http_request_db_queries', 'SQL queries run per request', QUERY_BUCKETS, ['endpoint', 'method'])
+REQUEST_SERIALIZE_DURATION = histogram('http_request_serialize_duration_seconds', 'Time spent turning rows into response data per request', LATENCY_BUCKETS, ['endpoint', 'method'])
+TASK_DURATION = histogram('celery_task_duration_seconds', 'Time to run a Celery task', TASK_BUCKETS, ['task', 'state'])
+TASK_DB_DURATION = histogram('celery_task_db_duration_seconds', 'Time spent in SQL queries per Celery task', TASK_BUCKETS, ['task', 'state'])
+TASK_DB_QUERIES = histogram('celery_task_db_queries', 'SQL queries run per Celery task', QUERY_BUCKETS, ['task', 'state'])
+
+
+# Write this process's totals to the cache if the last write is older than the flush interval (or force)
+def flush(force=False):
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    with _lock:
+        snapshot = {
+            name: {labels: [list(series[0]), series[1], series[2]] for labels, series in histogram.series.items()}
+            for name, histogram in _histograms.items()
+        }
+    cache.set(_process_key, snapshot, timeout=SNAPSHOT_TIMEOUT)
+    processes = cache.get(INDEX_KEY) or set()
+    if _process_key not in processes:  # Rechecked on every flush, so a lost concurrent update heals itself
+        cache.set(INDEX_KEY, processes | {_process_key}, timeout=None)
+
+
+# Totals of every process still in the cache, in the Prometheus text exposition format
+def render():
+    processes = cache.get(INDEX_KEY) or set()
+    snapshots = cache.get_many(list(processes))
+    if len(snapshots) < len(processes):
+        cache.set(INDEX_KEY, set(snapshots), timeout=None)  # Drop processes whose snapshot aged out
+    lines = []
+    for name, histogram in _histograms.items():
+        totals = {}
+        for snapshot in snapshots.values():
+            for labels, (counts, total, count) in snapshot.get(name, {}).items():
+                series = totals.setdefault(labels, [[0] * len(counts), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+        lines += [f'# HELP {name} {histogram.help_text}', f'# TYPE {name} histogram']
+        for labels, (counts, total, count) in sorted(totals.items()):
+            pairs = [f'{label}="{_escape(value)}"' for label, value in zip(histogram.labels, labels)]
+            cumulative = 0
+            for bound, bucket_count in zip((*histogram.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{float(bound)!r}"'
+                lines.append(f'{name}_bucket{_labels([*pairs, le])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(pairs)} {total}')
+            lines.append(f'{name}_count{_labels(pairs)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
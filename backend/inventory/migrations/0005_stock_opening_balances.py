@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 02:31
+
+from django.db import migrations
+
+
+# Seed the ledger with one opening Adjustment per SKU so the movements sum to today's stock_level
+def create_opening_balances(apps, schema_editor):
+    ProductVariation = apps.get_model('inventory', 'ProductVariation')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    batch = []
+    for variation_id, stock_level in ProductVariation.objects.exclude(stock_level=0).values_list('id', 'stock_level').iterator(chunk_size=2000):
+        batch.append(StockMovement(product_variation_id=variation_id, quantity=stock_level, reason='Adjustment'))
+        if len(batch) == 2000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_opening_balances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariation',
+            name='low_stock_alerted',
+            field=models.BooleanField(default=False),
+        ),
+    ]
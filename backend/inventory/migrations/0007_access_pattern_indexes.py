@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 02:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_low_stock_alerted'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productvariation',
+            index=models.Index(condition=models.Q(('stock_level__lte', models.F('reorder_level'))), fields=['id'], name='variation_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvariation',
+            index=models.Index(condition=models.Q(('low_stock_alerted', True)), fields=['id'], name='variation_alerted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['status', 'created_at'], name='po_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['supplier', 'created_at'], name='po_supplier_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(fields=['status', 'created_at'], name='so_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(fields=['customer_email', 'created_at'], name='so_email_created_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 02:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('sales_orders', models.IntegerField(default=0)),
+                ('purchase_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_purchased', models.IntegerField(default=0)),
+                ('purchase_orders', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySkuRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('purchase_spend', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_purchased', models.IntegerField(default=0)),
+                ('product_variation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.productvariation')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyskurollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product_variation'), name='sku_rollup_day_variation_uniq'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2 on 2026-10-18 02:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+
+# PostgreSQL: GIN index for attributes @> lookups (jsonb_path_ops - smaller, and containment is all we ask of it)
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS variation_attributes_gin_idx '
+            'ON inventory_productvariation USING gin (attributes jsonb_path_ops)'
+        )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS variation_attributes_gin_idx')
+
+
+# Copy of inventory.attributes.flatten_attributes as of this migration - later changes to it must not change
+# what the backfill writes
+def flatten_attributes(attributes, prefix=''):
+    pairs = set()
+    if not isinstance(attributes, dict):
+        return pairs
+    for key, value in attributes.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            pairs |= flatten_attributes(value, f'{path}.')
+            continue
+        for element in value if isinstance(value, list) else [value]:
+            if isinstance(element, (dict, list)):
+                continue  # Only scalars are searchable
+            text = element if isinstance(element, str) else json.dumps(element)
+            if len(path) <= 100 and len(text) <= 255:
+                pairs.add((path, text))
+    return pairs
+
+
+# Other backends: fill the key/value index from the existing attributes
+def backfill_attribute_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        return
+    ProductVariation = apps.get_model('inventory', 'ProductVariation')
+    VariationAttribute = apps.get_model('inventory', 'VariationAttribute')
+    batch = []
+    for variation_id, attributes in ProductVariation.objects.values_list('id', 'attributes').iterator(chunk_size=2000):
+        batch += [VariationAttribute(product_variation_id=variation_id, key=key, value=value) for key, value in flatten_attributes(attributes)]
+        if len(batch) >= 2000:
+            VariationAttribute.objects.bulk_create(batch)
+            batch = []
+    VariationAttribute.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_updated_at_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariationAttribute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('product_variation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attribute_index', to='inventory.productvariation')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='variationattribute',
+            index=models.Index(fields=['key', 'value', 'product_variation'], name='variation_attr_lookup_idx'),
+        ),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+        migrations.RunPython(backfill_attribute_index, migrations.RunPython.noop),
+    ]
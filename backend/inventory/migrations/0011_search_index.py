@@ -0,0 +1,187 @@
+# Generated by Django 4.2 on 2026-10-18 02:23
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+import re
+
+
+# PostgreSQL: GIN indexes for tsvector matches and trigram (typo) matches on the label
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS search_entry_vector_idx ON inventory_searchentry USING gin (vector)')
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS search_entry_label_trgm_idx ON inventory_searchentry USING gin (label gin_trgm_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS search_entry_label_trgm_idx')
+        schema_editor.execute('DROP INDEX IF EXISTS search_entry_vector_idx')
+
+
+# Copies of inventory.search / inventory.attributes as of this migration - later changes to them must not change
+# what the backfill writes
+FIELD_WEIGHTS = {'label': 1.0, 'category': 0.4, 'text': 0.2}
+MAX_TERM_LENGTH = 64
+MIN_TYPO_LENGTH = 4
+BATCH_SIZE = 1000
+TERM_RE = re.compile(r'\w+')
+
+
+def terms(text):
+    return [term for term in TERM_RE.findall(text.lower()) if len(term) <= MAX_TERM_LENGTH]
+
+
+def variants(term):
+    if len(term) < MIN_TYPO_LENGTH or not term.isalpha():
+        return {term}
+    return {term} | {term[:position] + term[position + 1:] for position in range(len(term))}
+
+
+def flatten_attributes(attributes, prefix=''):
+    pairs = set()
+    if not isinstance(attributes, dict):
+        return pairs
+    for key, value in attributes.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            pairs |= flatten_attributes(value, f'{path}.')
+            continue
+        for element in value if isinstance(value, list) else [value]:
+            if isinstance(element, (dict, list)):
+                continue
+            text = element if isinstance(element, str) else json.dumps(element)
+            if len(path) <= 100 and len(text) <= 255:
+                pairs.add((path, text))
+    return pairs
+
+
+# Fill the index from the existing products and variations - a tsvector per entry on PostgreSQL, postings and
+# typo variants elsewhere
+def backfill_search_index(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    ProductVariation = apps.get_model('inventory', 'ProductVariation')
+    SearchEntry = apps.get_model('inventory', 'SearchEntry')
+    SearchPosting = apps.get_model('inventory', 'SearchPosting')
+    SearchTermVariant = apps.get_model('inventory', 'SearchTermVariant')
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    vocabulary = set()
+
+    def write(entries):
+        SearchEntry.objects.bulk_create(entries)
+        if postgres:
+            SearchEntry.objects.filter(id__in=[entry.id for entry in entries]).update(vector=(
+                django.contrib.postgres.search.SearchVector('label', weight='A', config='english')
+                + django.contrib.postgres.search.SearchVector('category', weight='B', config='english')
+                + django.contrib.postgres.search.SearchVector('text', weight='C', config='english')
+            ))
+            return
+        postings, new_terms = [], set()
+        for entry in entries:
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in terms(getattr(entry, field)):
+                    weights[term] = max(weights.get(term, 0), weight)
+            postings += [SearchPosting(term=term, entry_id=entry.id, weight=weight) for term, weight in weights.items()]
+            new_terms |= weights.keys() - vocabulary
+        vocabulary.update(new_terms)
+        SearchPosting.objects.bulk_create(postings, batch_size=BATCH_SIZE)
+        SearchTermVariant.objects.bulk_create(
+            [SearchTermVariant(variant=variant, term=term) for term in sorted(new_terms) for variant in variants(term)],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+
+    for rows in (
+        (
+            SearchEntry(product_id=product_id, label=name, category=category, text=description)
+            for product_id, name, category, description
+            in Product.objects.values_list('id', 'name', 'category', 'description').iterator(chunk_size=BATCH_SIZE)
+        ),
+        (
+            SearchEntry(
+                product_id=product_id, product_variation_id=variation_id, label=sku_code,
+                text=' '.join(sorted(value for _, value in flatten_attributes(attributes))),
+            )
+            for variation_id, product_id, sku_code, attributes
+            in ProductVariation.objects.values_list('id', 'product_id', 'sku_code', 'attributes').iterator(chunk_size=BATCH_SIZE)
+        ),
+    ):
+        batch = []
+        for entry in rows:
+            batch.append(entry)
+            if len(batch) == BATCH_SIZE:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_variation_attribute_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=200)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('text', models.TextField(blank=True)),
+                ('vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTermVariant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('variant', models.CharField(max_length=64)),
+                ('term', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchtermvariant',
+            constraint=models.UniqueConstraint(fields=('variant', 'term'), name='search_variant_term_uniq'),
+        ),
+        migrations.AddField(
+            model_name='searchposting',
+            name='entry',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='inventory.searchentry'),
+        ),
+        migrations.AddField(
+            model_name='searchentry',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='inventory.product'),
+        ),
+        migrations.AddField(
+            model_name='searchentry',
+            name='product_variation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='inventory.productvariation'),
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', '-weight'], name='search_posting_term_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('product_variation__isnull', True)), fields=('product',), name='search_entry_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('product_variation',), name='search_entry_variation_uniq'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
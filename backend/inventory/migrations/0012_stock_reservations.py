@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 03:22
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariation',
+            name='reservation_shards',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField()),
+                ('status', models.CharField(choices=[('Held', 'Held'), ('Converted', 'Converted'), ('Released', 'Released')], default='Held', max_length=20)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product_variation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='inventory.productvariation')),
+                ('sales_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='inventory.salesorder')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReservationShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('allotted', models.IntegerField(default=0)),
+                ('reserved', models.IntegerField(default=0)),
+                ('product_variation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservation_shard_rows', to='inventory.productvariation')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(fields=['product_variation', 'status'], name='reservation_variation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(fields=['sales_order', 'status'], name='reservation_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockreservation',
+            index=models.Index(condition=models.Q(('status', 'Held')), fields=['expires_at'], name='reservation_expiry_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservationshard',
+            constraint=models.UniqueConstraint(fields=('product_variation', 'shard'), name='reservation_shard_uniq'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 03:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FulfillmentJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Fulfilled', 'Fulfilled'), ('Failed', 'Failed')], default='Queued', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('sales_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fulfillment_jobs', to='inventory.salesorder')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='fulfillmentjob',
+            index=models.Index(condition=models.Q(('status', 'Queued')), fields=['sales_order'], name='fulfillment_queued_idx'),
+        ),
+    ]
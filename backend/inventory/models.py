@@ -1,4 +1,6 @@
 # Database models for inventory management system
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 # Product model - represents a product in the inventory
@@ -11,6 +13,12 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)  # Auto-set on creation
     updated_at = models.DateTimeField(auto_now=True)  # Auto-update on save
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),  # Cursor pagination order
+            models.Index(fields=['updated_at'], name='product_updated_idx'),  # Conditional GET validators
+        ]
+
     # String representation for admin and debugging
     def __str__(self):
         return self.name
@@ -22,17 +30,91 @@ class ProductVariation(models.Model):
     attributes = models.JSONField()  # Flexible attributes (e.g., {"size": "L", "color": "red"})
     stock_level = models.IntegerField(default=0)  # Current stock quantity
     reorder_level = models.IntegerField(default=10)  # Threshold for low stock alerts
+    low_stock_alerted = models.BooleanField(default=False)  # Set once a low stock alert went out, cleared when restocked
+    reservation_shards = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(64)])  # Rows its reservations spread over - raise for hot SKUs
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Auto-update on save - set explicitly by queryset stock updates
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='variation_created_id_idx'),  # Cursor pagination order
+            models.Index(fields=['updated_at'], name='variation_updated_idx'),  # Conditional GET validators
+            models.Index(
+                fields=['id'], name='variation_low_stock_idx',
+                condition=models.Q(stock_level__lte=models.F('reorder_level')),
+            ),  # Partial index - only low stock rows, as scanned by check_low_stock and ?low_stock=true
+            models.Index(
+                fields=['id'], name='variation_alerted_idx', condition=models.Q(low_stock_alerted=True),
+            ),  # Partial index - alerted rows check_low_stock re-arms after restocking
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.sku_code}"
 
+# VariationAttribute model - key/value index over ProductVariation.attributes for backends without jsonb
+# One row per attribute value (list values get one row each, nested objects use dotted keys like "dims.width").
+# Maintained on save outside PostgreSQL, where a GIN index on attributes answers the same lookups
+class VariationAttribute(models.Model):
+    product_variation = models.ForeignKey(ProductVariation, related_name='attribute_index', on_delete=models.CASCADE)  # Indexed SKU
+    key = models.CharField(max_length=100)  # Attribute path, e.g. "size" or "dims.width"
+    value = models.CharField(max_length=255)  # Value as text - strings as-is, other scalars JSON-encoded
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value', 'product_variation'], name='variation_attr_lookup_idx'),  # ?attr.<key>=<value>
+        ]
+
+# SearchEntry model - one search document per product and per variation, rewritten whenever they are saved
+# Products index name / category / description, variations their SKU code and attribute values
+class SearchEntry(models.Model):
+    product = models.ForeignKey(Product, related_name='search_entries', on_delete=models.CASCADE)  # Product, or parent of the SKU
+    product_variation = models.ForeignKey(ProductVariation, null=True, blank=True, related_name='search_entries', on_delete=models.CASCADE)  # Set on SKU entries
+    label = models.CharField(max_length=200)  # Product name or SKU code - weighted highest and typo-matched
+    category = models.CharField(max_length=100, blank=True)
+    text = models.TextField(blank=True)  # Description or attribute values
+    vector = SearchVectorField(null=True)  # PostgreSQL only - weighted tsvector of the fields above
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product'], condition=models.Q(product_variation__isnull=True), name='search_entry_product_uniq'),
+            models.UniqueConstraint(fields=['product_variation'], name='search_entry_variation_uniq'),
+        ]
+
+# SearchPosting model - inverted index of SearchEntry terms for backends without tsvector
+class SearchPosting(models.Model):
+    term = models.CharField(max_length=64)  # Lowercased word
+    entry = models.ForeignKey(SearchEntry, related_name='postings', on_delete=models.CASCADE)
+    weight = models.FloatField()  # Field weight of the best field the term appears in
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', '-weight'], name='search_posting_term_idx'),  # Best postings of a term first
+        ]
+
+# SearchTermVariant model - single-deletion variants of every indexed term, for typo-tolerant lookups
+# (a query word and an indexed term within one edit share a variant) - the term itself is stored as its own variant
+class SearchTermVariant(models.Model):
+    variant = models.CharField(max_length=64)
+    term = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['variant', 'term'], name='search_variant_term_uniq'),
+        ]
+
 # Supplier model - represents suppliers for purchase orders
 class Supplier(models.Model):
     name = models.CharField(max_length=200)  # Supplier name
     email = models.EmailField()  # Contact email
     phone = models.CharField(max_length=20)  # Contact phone
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='supplier_created_id_idx'),  # Cursor pagination order
+            models.Index(fields=['updated_at'], name='supplier_updated_idx'),  # Conditional GET validators
+        ]
 
     def __str__(self):
         return self.name
@@ -49,6 +131,14 @@ class PurchaseOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='po_created_id_idx'),  # Cursor pagination order
+            models.Index(fields=['updated_at'], name='po_updated_idx'),  # Conditional GET validators
+            models.Index(fields=['status', 'created_at'], name='po_status_created_idx'),  # Status filter with date range
+            models.Index(fields=['supplier', 'created_at'], name='po_supplier_created_idx'),  # Orders per supplier
+        ]
+
     def __str__(self):
         return f"PO-{self.id} - {self.supplier.name}"
 
@@ -73,6 +163,14 @@ class SalesOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='so_created_id_idx'),  # Cursor pagination order
+            models.Index(fields=['updated_at'], name='so_updated_idx'),  # Conditional GET validators
+            models.Index(fields=['status', 'created_at'], name='so_status_created_idx'),  # Status filter with date range
+            models.Index(fields=['customer_email', 'created_at'], name='so_email_created_idx'),  # Customer order history
+        ]
+
     def __str__(self):
         return f"SO-{self.id} - {self.customer_email}"
 
@@ -85,3 +183,144 @@ class SalesOrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product_variation.sku_code} - {self.quantity_sold} units"
+
+# ReservationShard model - part of a SKU's stock set aside for reservations
+# A reservation takes from one shard with a conditional UPDATE, so concurrent orders for a SKU with several
+# shards lock different rows; inventory.reservations re-allots the unreserved stock when a shard runs dry
+class ReservationShard(models.Model):
+    product_variation = models.ForeignKey(ProductVariation, related_name='reservation_shard_rows', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()  # 0 .. reservation_shards - 1
+    allotted = models.IntegerField(default=0)  # Stock set aside in this shard, reserved units included
+    reserved = models.IntegerField(default=0)  # Units held by reservations taken from this shard
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_variation', 'shard'], name='reservation_shard_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_variation_id}#{self.shard}: {self.reserved}/{self.allotted}"
+
+# StockReservation model - stock held for a pending sales order line until it is fulfilled or the hold expires
+class StockReservation(models.Model):
+    STATUS_CHOICES = [
+        ('Held', 'Held'),  # Counts against available-to-promise
+        ('Converted', 'Converted'),  # Order fulfilled, stock deducted
+        ('Released', 'Released'),  # Expired or order deleted, stock free again
+    ]
+    sales_order = models.ForeignKey(SalesOrder, related_name='reservations', on_delete=models.CASCADE)  # Reserving order
+    product_variation = models.ForeignKey(ProductVariation, related_name='reservations', on_delete=models.CASCADE)  # Reserved SKU
+    shard = models.PositiveSmallIntegerField()  # ReservationShard the quantity was taken from
+    quantity = models.IntegerField()  # Units held
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Held')
+    expires_at = models.DateTimeField()  # Released by release_expired_reservations after this
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_variation', 'status'], name='reservation_variation_idx'),  # Held quantity per SKU
+            models.Index(fields=['sales_order', 'status'], name='reservation_order_idx'),  # Held lines of an order
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx', condition=models.Q(status='Held')),  # Expiry sweep
+        ]
+
+    def __str__(self):
+        return f"SO-{self.sales_order_id} {self.product_variation_id} x{self.quantity} ({self.status})"
+
+# FulfillmentJob model - an asynchronous fulfillment of a sales order, queued by PATCH and run by drain_fulfillment_queue
+class FulfillmentJob(models.Model):
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),  # Waiting for a drain
+        ('Fulfilled', 'Fulfilled'),  # Order fulfilled, stock deducted
+        ('Failed', 'Failed'),  # Order not fulfilled - see error
+    ]
+    sales_order = models.ForeignKey(SalesOrder, related_name='fulfillment_jobs', on_delete=models.CASCADE)  # Order to fulfill
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Queued')
+    error = models.TextField(blank=True)  # Why the order wasn't fulfilled
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)  # When a drain recorded the outcome
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sales_order'], name='fulfillment_queued_idx', condition=models.Q(status='Queued')),  # Queue drain
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} SO-{self.sales_order_id} ({self.status})"
+
+# StockMovement model - append-only ledger of every stock_level change
+class StockMovement(models.Model):
+    REASON_CHOICES = [
+        ('Receipt', 'Receipt'),  # Purchase order received
+        ('Fulfillment', 'Fulfillment'),  # Sales order fulfilled
+        ('Adjustment', 'Adjustment'),  # Stock level set directly (opening balance, manual edit)
+    ]
+    product_variation = models.ForeignKey(ProductVariation, related_name='movements', on_delete=models.CASCADE)  # SKU whose stock moved
+    quantity = models.IntegerField()  # Signed change in stock_level
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)  # Why the stock moved
+    purchase_order = models.ForeignKey(PurchaseOrder, null=True, blank=True, on_delete=models.SET_NULL)  # Source PO, if any
+    sales_order = models.ForeignKey(SalesOrder, null=True, blank=True, on_delete=models.SET_NULL)  # Source SO, if any
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_variation', 'created_at'], name='movement_variation_time_idx'),  # Per-SKU delta scans
+            models.Index(fields=['created_at', 'id'], name='movement_created_id_idx'),  # Snapshot windows, cursor pagination order
+        ]
+
+    def __str__(self):
+        return f"{self.product_variation_id} {self.quantity:+d} ({self.reason})"
+
+# StockSnapshot model - stock level of a SKU as of taken_at, built from the ledger by a periodic task
+class StockSnapshot(models.Model):
+    product_variation = models.ForeignKey(ProductVariation, related_name='snapshots', on_delete=models.CASCADE)  # SKU
+    stock_level = models.IntegerField()  # Sum of all movements up to taken_at
+    taken_at = models.DateTimeField()  # Ledger cut-off this snapshot covers
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product_variation', 'taken_at'], name='snapshot_variation_time_idx'),  # Latest snapshot lookups
+            models.Index(fields=['taken_at'], name='snapshot_taken_at_idx'),  # Last snapshot watermark
+        ]
+
+    def __str__(self):
+        return f"{self.product_variation_id} = {self.stock_level} @ {self.taken_at}"
+
+# DailyRollup model - sales and purchasing totals per day, maintained by the rollup_analytics task
+class DailyRollup(models.Model):
+    day = models.DateField(unique=True)  # UTC calendar day of the order's created_at
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Fulfilled sales value
+    units_sold = models.IntegerField(default=0)  # Fulfilled sales units
+    sales_orders = models.IntegerField(default=0)  # Fulfilled sales orders
+    purchase_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Received purchase value
+    units_purchased = models.IntegerField(default=0)  # Received purchase units
+    purchase_orders = models.IntegerField(default=0)  # Received purchase orders
+    refreshed_at = models.DateTimeField()  # Start of the task run that wrote this row
+
+    def __str__(self):
+        return f"{self.day}: {self.revenue} revenue, {self.purchase_spend} spend"
+
+# DailySkuRollup model - the same totals per day and SKU, for product, category and top SKU breakdowns
+class DailySkuRollup(models.Model):
+    day = models.DateField()
+    product_variation = models.ForeignKey(ProductVariation, related_name='daily_rollups', on_delete=models.CASCADE)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_sold = models.IntegerField(default=0)
+    purchase_spend = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_purchased = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product_variation'], name='sku_rollup_day_variation_uniq'),  # Also the day range index
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_variation_id}: {self.units_sold} sold"
+
+# RollupDirtyDay model - a day whose rollups a deleted order made stale; refresh_rollups rebuilds and drains it
+# Not unique - a day marked while a refresh is running gets its own row, which that refresh doesn't drain
+class RollupDirtyDay(models.Model):
+    day = models.DateField()  # Creation day of the deleted order
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.day} (marked {self.marked_at})"
@@ -0,0 +1,10 @@
+# Pagination classes for inventory API list endpoints
+from rest_framework.pagination import CursorPagination
+
+# Keyset pagination on (created_at, id) - each page is an indexed range scan,
+# so fetching page 1000 costs the same as fetching page 1
+class CreatedAtCursorPagination(CursorPagination):
+    ordering = ('-created_at', '-id')  # Newest first, id breaks ties between equal timestamps
+    page_size = 100  # Default rows per page
+    page_size_query_param = 'page_size'  # Client can request ?page_size=N
+    max_page_size = 1000  # Upper bound on ?page_size
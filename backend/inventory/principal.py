@@ -0,0 +1,133 @@
+# Cached authorization principal - the user row, group ids and flattened permission codenames of an API caller
+# Authenticating a request and checking its permissions costs no queries while the principal is cached;
+# it is dropped whenever the user row, their groups or permissions, or their groups' permissions change (see signals)
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .routers import primary_reads
+
+PRINCIPAL_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']  # The hash stays out of the cache
+
+
+def _key(user_id):
+    return f'inventory:principal:{user_id}'
+
+
+# The user with the given id, groups and permissions attached from the cache - None if there is no such user
+# Permission checks on the returned user (has_perm, get_all_permissions) are answered without queries
+def load_principal(user_id):
+    principal = cache.get(_key(user_id))
+    if principal is None:
+        principal = _build_principal(user_id)
+        if principal is None:
+            return None
+        cache.set(_key(user_id), principal, timeout=settings.PRINCIPAL_CACHE_TIMEOUT)
+    return _principal_user(principal)
+
+
+# load_principal for async views
+async def aload_principal(user_id):
+    principal = await cache.aget(_key(user_id))
+    if principal is None:
+        principal = await sync_to_async(_build_principal)(user_id)
+        if principal is None:
+            return None
+        await cache.aset(_key(user_id), principal, timeout=settings.PRINCIPAL_CACHE_TIMEOUT)
+    return _principal_user(principal)
+
+
+def _principal_user(principal):
+    # Deferred password - loaded only if something reads it, and left alone if the user is saved
+    user = User.from_db(User.objects.db, PRINCIPAL_FIELDS, [principal['user'][field] for field in PRINCIPAL_FIELDS])
+    user._principal_group_ids = frozenset(principal['group_ids'])
+    user._user_perm_cache = set(principal['user_permissions'])  # ModelBackend's own per-instance caches
+    user._group_perm_cache = set(principal['group_permissions'])
+    user._perm_cache = user._user_perm_cache | user._group_perm_cache
+    return user
+
+
+def _build_principal(user_id):
+    with primary_reads():  # Cached past the invalidation that sent us here - a lagging replica must not fill it
+        user = User.objects.filter(pk=user_id).values(*PRINCIPAL_FIELDS).first()
+        if user is None:
+            return None
+        return {
+            'user': user,
+            'group_ids': list(User.groups.through.objects.filter(user_id=user_id).values_list('group_id', flat=True)),
+            'user_permissions': _codenames(Permission.objects.filter(user=user_id)),
+            'group_permissions': _codenames(Permission.objects.filter(group__user=user_id)),
+        }
+
+
+def _codenames(permissions):
+    return sorted({f'{app_label}.{codename}' for app_label, codename in permissions.values_list('content_type__app_label', 'codename')})
+
+
+# Group ids of a user - from the principal when the user came from load_principal
+def group_ids(user):
+    if hasattr(user, '_principal_group_ids'):
+        return user._principal_group_ids
+    return frozenset(user.groups.values_list('id', flat=True))
+
+
+# Drop the cached principals of the given users once the current transaction commits
+def invalidate_principals(user_ids):
+    keys = [_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# Drop the cached principals of every member of a group - its permissions or existence changed
+def invalidate_group(group):
+    invalidate_principals(list(group.user_set.values_list('id', flat=True)))
+
+
+# Prefetch of users' groups with their permissions, the way UserSerializer reads them - two queries whatever the count
+def groups_prefetch():
+    return Prefetch('groups', queryset=Group.objects.prefetch_related('permissions'))
+
+
+# JWTAuthentication resolving the token's user through the principal cache
+# Falls back to the stock lookup when tokens are checked against the password hash (CHECK_REVOKE_TOKEN)
+# or identify users by something other than their primary key
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if _stock_lookup():
+            return super().get_user(validated_token)
+        return self._check(load_principal(self._user_id(validated_token)))
+
+    # authenticate() for async views - (user, token), or None when the request carries no token
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        raw_token = None if header is None else self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)  # Signature and expiry only - no I/O
+        if _stock_lookup():
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+        return self._check(await aload_principal(self._user_id(validated_token))), validated_token
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def _check(self, user):
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+def _stock_lookup():
+    return jwt_settings.CHECK_REVOKE_TOKEN or jwt_settings.USER_ID_FIELD not in ('id', 'pk')
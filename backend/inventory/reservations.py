@@ -0,0 +1,183 @@
+# Stock reservations - a pending sales order holds its lines' stock from creation until it is fulfilled, deleted,
+# or the hold expires after RESERVATION_TTL seconds (freed by the release_expired_reservations task)
+# Reservable stock of a SKU is allotted over its ReservationShard rows and a reservation takes from one of them with a
+# conditional UPDATE, so concurrent orders for a hot SKU (reservation_shards > 1) lock different rows. Only when no
+# shard can cover a quantity are the SKU's shards locked together and its unreserved stock allotted again
+# Every function that writes must run inside transaction.atomic() - lock order is always
+# sales orders, variations, reservations, then shards in (variation, shard) order
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .availability import invalidate_availability
+from .models import ProductVariation, ReservationShard, StockReservation
+
+RELEASE_BATCH_SIZE = 1000  # Expired reservations released per transaction
+SHARD_UPDATE_BATCH_SIZE = 1000  # Shard rows per UPDATE when re-allotting
+
+
+# A variation's unreserved stock can't cover a quantity
+class InsufficientStock(Exception):
+    def __init__(self, variation_id):
+        super().__init__(variation_id)
+        self.variation_id = variation_id
+
+
+# Reserve the lines of pending orders - {order_id: {variation_id: quantity}} -> {order_id: error message}
+# An order is reserved whole or not at all; an order that can't be holds nothing
+def reserve_orders(order_lines):
+    variations = {
+        variation_id: (sku_code, shards)
+        for variation_id, sku_code, shards in ProductVariation.objects.filter(
+            id__in={variation_id for lines in order_lines.values() for variation_id in lines}
+        ).values_list('id', 'sku_code', 'reservation_shards')
+    }
+    expires_at = timezone.now() + timedelta(seconds=settings.RESERVATION_TTL)
+    reserved, errors = set(), {}
+    for order_id, lines in sorted(order_lines.items()):
+        try:
+            with transaction.atomic():  # Savepoint - a short line hands back what the order's other lines took
+                StockReservation.objects.bulk_create([
+                    StockReservation(
+                        sales_order_id=order_id, product_variation_id=variation_id, quantity=quantity, expires_at=expires_at,
+                        shard=_take(variation_id, variations[variation_id][1], quantity),
+                    )
+                    for variation_id, quantity in sorted(lines.items()) if quantity > 0  # Variation order, as every lock
+                ])
+        except InsufficientStock as exc:
+            errors[order_id] = f'Insufficient stock for {variations[exc.variation_id][0]}'
+            continue
+        reserved.update(lines)
+    invalidate_availability(reserved)
+    return errors
+
+
+# Take quantity from one of the variation's shards, starting at a random one - returns the shard it came from
+def _take(variation_id, shards, quantity):
+    first = random.randrange(shards)
+    for offset in range(shards):
+        shard = (first + offset) % shards
+        if ReservationShard.objects.filter(
+            product_variation_id=variation_id, shard=shard, allotted__gte=F('reserved') + quantity,
+        ).update(reserved=F('reserved') + quantity):
+            return shard
+    rebalance([variation_id], take={variation_id: (first, quantity)})  # Every shard is short - pool them
+    return first
+
+
+# Allot each variation's unreserved stock evenly over its shards again, with the reserved units of every shard
+# recounted from the held reservations. take={variation_id: (shard, quantity)} reserves quantity on that shard too,
+# and raises InsufficientStock when the variation doesn't have it. Variations without shard rows are skipped
+# unless in take - they have never been reserved, and get their rows on first use
+def rebalance(variation_ids, take=None):
+    take = take or {}
+    rows = _lock_shards(variation_ids)
+    shard_counts = dict(
+        ProductVariation.objects.filter(id__in={*rows, *take}).values_list('id', 'reservation_shards')
+    )
+    missing = [
+        ReservationShard(product_variation_id=variation_id, shard=shard)
+        for variation_id, shards in shard_counts.items()
+        for shard in range(shards) if shard not in rows.get(variation_id, {})
+    ]
+    if missing:
+        ReservationShard.objects.bulk_create(missing, ignore_conflicts=True)
+        rows = _lock_shards(shard_counts)
+
+    # Read after the shard locks - writers that lower stock or reserve hold them until they commit
+    stock = dict(ProductVariation.objects.filter(id__in=rows).values_list('id', 'stock_level'))
+    held = {
+        (variation_id, shard): quantity
+        for variation_id, shard, quantity in StockReservation.objects.filter(product_variation_id__in=rows, status='Held')
+        .values('product_variation_id', 'shard')
+        .annotate(quantity=Sum('quantity'))
+        .values_list('product_variation_id', 'shard', 'quantity')
+    }
+    for variation_id, shard_rows in rows.items():
+        reserved = {shard: held.get((variation_id, shard), 0) for shard in shard_rows}
+        if variation_id in take:
+            shard, quantity = take[variation_id]
+            if stock[variation_id] - sum(reserved.values()) < quantity:
+                raise InsufficientStock(variation_id)
+            reserved[shard] += quantity
+        shards = shard_counts[variation_id]
+        share, extra = divmod(max(stock[variation_id] - sum(reserved.values()), 0), shards)
+        for shard, row in shard_rows.items():
+            row.reserved = reserved[shard]
+            row.allotted = reserved[shard] + (share + (shard < extra) if shard < shards else 0)  # Rows past reservation_shards drain
+    ReservationShard.objects.bulk_update(
+        [row for shard_rows in rows.values() for row in shard_rows.values()], ['allotted', 'reserved'],
+        batch_size=SHARD_UPDATE_BATCH_SIZE,
+    )
+
+
+# Lock the shard rows of the variations in (variation, shard) order - {variation_id: {shard: row}}
+def _lock_shards(variation_ids):
+    rows = {}
+    for row in ReservationShard.objects.select_for_update().filter(product_variation_id__in=variation_ids).order_by(
+        'product_variation_id', 'shard'
+    ):
+        rows.setdefault(row.product_variation_id, {})[row.shard] = row
+    return rows
+
+
+# Lock what fulfilling the orders needs - returns ({order_id: {variation_id: quantity it holds}},
+# {variation_id: quantity held by every order}). Shards stay locked, so no new reservations land until commit
+def lock_reservations(order_ids, variation_ids):
+    own = {}
+    for order_id, variation_id, quantity in (
+        StockReservation.objects.select_for_update()
+        .filter(sales_order_id__in=order_ids, status='Held')
+        .order_by('id')
+        .values_list('sales_order_id', 'product_variation_id', 'quantity')
+    ):
+        lines = own.setdefault(order_id, {})
+        lines[variation_id] = lines.get(variation_id, 0) + quantity
+    _lock_shards(variation_ids)
+    held = dict(
+        StockReservation.objects.filter(product_variation_id__in=variation_ids, status='Held')
+        .values('product_variation_id')
+        .annotate(quantity=Sum('quantity'))
+        .values_list('product_variation_id', 'quantity')
+    )
+    return own, held
+
+
+# Mark the held reservations of fulfilled orders converted - their stock leaves with the order
+# The caller deducts the stock, which re-allots the shards
+def convert_reservations(order_ids):
+    StockReservation.objects.filter(sales_order_id__in=order_ids, status='Held').update(status='Converted')
+
+
+# Release the held reservations of orders - returns the variations whose stock came free
+def release_orders(order_ids):
+    held = StockReservation.objects.filter(sales_order_id__in=order_ids, status='Held')
+    variation_ids = set(held.values_list('product_variation_id', flat=True))
+    held.update(status='Released')
+    rebalance(variation_ids)
+    invalidate_availability(variation_ids)
+    return variation_ids
+
+
+# Release every held reservation that expired by `now`, a batch per transaction - returns how many were released
+# Rows another transaction has locked (an order being fulfilled) are skipped and left to that transaction
+def release_expired(now=None):
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status='Held', expires_at__lte=now)
+                .order_by('id')
+                .values_list('id', 'product_variation_id')[:RELEASE_BATCH_SIZE]
+            )
+            if not expired:
+                return released
+            StockReservation.objects.filter(id__in=[reservation_id for reservation_id, _ in expired]).update(status='Released')
+            variation_ids = {variation_id for _, variation_id in expired}
+            rebalance(variation_ids)
+            invalidate_availability(variation_ids)
+        released += len(expired)
@@ -0,0 +1,97 @@
+# Read-replica routing - while a safe request (GET / HEAD / OPTIONS) is served, reads go to one of the
+# DATABASE_REPLICAS aliases; writes, reads inside a transaction and every read after the request's first write
+# use the primary, so a request always sees its own writes. Outside requests (Celery tasks, commands) everything
+# uses the primary - tasks read to write, and must not act on a lagging copy
+import contextvars
+import random
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_scope = contextvars.ContextVar('inventory_replica_scope', default=None)
+
+
+# Replica reads allowed for the current request - pinned to the primary by its first write
+class ReplicaScope:
+    __slots__ = ('pinned', 'alias')
+
+    def __init__(self):
+        self.pinned, self.alias = False, None
+
+
+# Let reads made inside the block go to a replica
+@contextmanager
+def replica_reads():
+    token = _scope.set(ReplicaScope())
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+# Send every read made inside the block to the primary - for data that outlives the request (cached responses)
+@contextmanager
+def primary_reads():
+    token = _scope.set(None)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+# The alias a read made now goes to - one replica per request, so its reads see one point in time
+def read_database():
+    scope = _scope.get()
+    if scope is None or scope.pinned or not settings.DATABASE_REPLICAS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    if scope.alias is None:
+        scope.alias = random.choice(settings.DATABASE_REPLICAS)
+    return scope.alias
+
+
+# DATABASE_ROUTERS entry
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        scope = _scope.get()
+        if scope is not None:
+            scope.pinned = True  # Later reads in this request must see the write
+        return DEFAULT_DB_ALIAS
+
+    # Replicas hold the same rows as the primary
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    # Replicas get their schema by replication
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+# Middleware opening a replica scope for safe requests - unsafe ones read from the primary throughout; runs sync or async
+class ReplicaRoutingMiddleware:
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        if request.method not in SAFE_METHODS:
+            return self.get_response(request)
+        with replica_reads():
+            return self.get_response(request)
+
+    async def _acall(self, request):
+        if request.method not in SAFE_METHODS:
+            return await self.get_response(request)
+        with replica_reads():
+            return await self.get_response(request)
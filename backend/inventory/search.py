@@ -0,0 +1,226 @@
+# Ranked, typo-tolerant search over products and SKUs
+# PostgreSQL ranks a weighted tsvector match plus trigram similarity on the label (GIN indexes on both);
+# other backends rank through the SearchPosting inverted index, with SearchTermVariant for typos
+import math
+import re
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import F, Q
+from .attributes import flatten_attributes
+from .models import Product, ProductVariation, SearchEntry, SearchPosting, SearchTermVariant
+
+SEARCH_CONFIG = 'english'  # PostgreSQL text search configuration
+FIELD_WEIGHTS = {'label': 1.0, 'category': 0.4, 'text': 0.2}  # PostgreSQL's default A / B / C rank weights
+PREFIX_FACTOR = 0.6  # Score of a term the query word is a prefix of, relative to an exact match
+TYPO_FACTORS = {1: 0.5, 2: 0.3}  # Score of a term one or two edits away
+MAX_TERM_LENGTH = 64
+MIN_TYPO_LENGTH = 4  # Shorter words match exactly or by prefix only
+MAX_QUERY_WORDS = 8
+MAX_PREFIX_TERMS = 10  # Terms a query word expands to by prefix
+MAX_POSTINGS_PER_TERM = 1000  # Best postings read for a query word - bounds the cost of very common words
+MAX_EXPANSION_POSTINGS = 200  # Best postings read for each prefix / typo expansion of it
+INDEX_BATCH_SIZE = 1000
+TERM_RE = re.compile(r'\w+')
+
+
+# True where search runs on the SearchPosting / SearchTermVariant tables rather than tsvector + trigram
+def uses_search_tables():
+    return connection.vendor != 'postgresql'
+
+
+# Lowercased words of a text, as indexed and as queried
+def terms(text):
+    return [term for term in TERM_RE.findall(text.lower()) if len(term) <= MAX_TERM_LENGTH]
+
+
+# Rewrite the search entries of the given products (name / category / description)
+def index_products(products):
+    _replace_entries([
+        SearchEntry(product_id=product.pk, label=product.name, category=product.category, text=product.description)
+        for product in products
+    ])
+
+
+# Rewrite the search entries of the given variations (SKU code / attribute values)
+def index_variations(variations):
+    _replace_entries([
+        SearchEntry(
+            product_id=variation.product_id, product_variation_id=variation.pk, label=variation.sku_code,
+            text=' '.join(sorted(value for _, value in flatten_attributes(variation.attributes))),
+        )
+        for variation in variations
+    ])
+
+
+# Drop and rebuild every search entry - for existing data and after bulk writes that bypassed indexing
+# Returns the number of entries written
+def rebuild_index(chunk_size=INDEX_BATCH_SIZE):
+    SearchPosting.objects.all().delete()
+    SearchTermVariant.objects.all().delete()
+    while ids := list(SearchEntry.objects.values_list('id', flat=True)[:chunk_size]):
+        SearchEntry.objects.filter(id__in=ids).delete()
+    written = 0
+    for queryset, index in (
+        (Product.objects.only('name', 'category', 'description'), index_products),
+        (ProductVariation.objects.only('product_id', 'sku_code', 'attributes'), index_variations),
+    ):
+        chunk = []
+        for instance in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(instance)
+            if len(chunk) == chunk_size:
+                index(chunk)
+                written, chunk = written + len(chunk), []
+        index(chunk)
+        written += len(chunk)
+    return written
+
+
+def _replace_entries(entries):
+    if not entries:
+        return
+    with transaction.atomic():
+        SearchEntry.objects.filter(
+            Q(product_id__in=[entry.product_id for entry in entries if entry.product_variation_id is None], product_variation__isnull=True)
+            | Q(product_variation_id__in=[entry.product_variation_id for entry in entries if entry.product_variation_id is not None])
+        ).delete()  # Postings go with them
+        SearchEntry.objects.bulk_create(entries, batch_size=INDEX_BATCH_SIZE)
+        if uses_search_tables():
+            _post_terms(entries)
+        else:
+            SearchEntry.objects.filter(id__in=[entry.id for entry in entries]).update(vector=(
+                SearchVector('label', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('category', weight='B', config=SEARCH_CONFIG)
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+            ))
+
+
+# Write the postings of freshly created entries, and deletion variants for terms seen for the first time
+def _post_terms(entries):
+    postings, vocabulary = [], set()
+    for entry in entries:
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in terms(getattr(entry, field)):
+                weights[term] = max(weights.get(term, 0), weight)
+        postings += [SearchPosting(term=term, entry_id=entry.id, weight=weight) for term, weight in weights.items()]
+        vocabulary |= weights.keys()
+    SearchPosting.objects.bulk_create(postings, batch_size=INDEX_BATCH_SIZE)
+
+    vocabulary = sorted(vocabulary)
+    new_terms = []
+    for start in range(0, len(vocabulary), INDEX_BATCH_SIZE):
+        batch = vocabulary[start:start + INDEX_BATCH_SIZE]
+        known = set(SearchTermVariant.objects.filter(variant__in=batch, term=F('variant')).values_list('term', flat=True))
+        new_terms += [term for term in batch if term not in known]
+    SearchTermVariant.objects.bulk_create(
+        [SearchTermVariant(variant=variant, term=term) for term in new_terms for variant in _variants(term)],
+        batch_size=INDEX_BATCH_SIZE, ignore_conflicts=True,
+    )
+
+
+# A term and its single-character deletions - words with digits (SKU numbers, sizes) only match exactly or by prefix
+def _variants(term):
+    if len(term) < MIN_TYPO_LENGTH or not term.isalpha():
+        return {term}
+    return {term} | {term[:position] + term[position + 1:] for position in range(len(term))}
+
+
+# Best matches for a free-text query - dicts of type ("product" / "variation"), id, product, label, category, score
+# kind narrows the results to one type
+def search(query, kind=None, limit=20):
+    words = list(dict.fromkeys(terms(query)))[:MAX_QUERY_WORDS]
+    if not words:
+        return []
+    if uses_search_tables():
+        return _search_tables(words, kind, limit)
+    return _search_postgres(query, kind, limit)
+
+
+def _search_postgres(query, kind, limit):
+    tsquery = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    entries = _of_kind(SearchEntry.objects.filter(Q(vector=tsquery) | Q(label__trigram_word_similar=query)), kind)
+    rows = entries.annotate(
+        score=SearchRank(F('vector'), tsquery) + TrigramWordSimilarity(query, 'label'),
+    ).order_by('-score', 'label', 'id').values('product_id', 'product_variation_id', 'label', 'category', 'score')[:limit]
+    return [_result(row, row['score']) for row in rows]
+
+
+# Score entries per query word (best matching term), then rank by words matched and total score
+def _search_tables(words, kind, limit):
+    scores = {}  # entry id -> [words matched, score]
+    for word in words:
+        best = {}
+        for term, factor in _expand(word).items():
+            cap = MAX_POSTINGS_PER_TERM if term == word else MAX_EXPANSION_POSTINGS
+            postings = list(SearchPosting.objects.filter(term=term).order_by('-weight').values_list('entry_id', 'weight')[:cap])
+            idf = 1 + math.log(cap / len(postings)) if postings else 0  # Rarer terms count more
+            for entry_id, weight in postings:
+                best[entry_id] = max(best.get(entry_id, 0), weight * factor * idf)
+        for entry_id, score in best.items():
+            hit = scores.setdefault(entry_id, [0, 0.0])
+            hit[0] += 1
+            hit[1] += score
+    ranked = sorted(scores.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+
+    # Load entries a window at a time - with a kind filter some ranked ids drop out
+    results = []
+    for start in range(0, len(ranked), limit * 4):
+        window = ranked[start:start + limit * 4]
+        entries = _of_kind(SearchEntry.objects.filter(id__in=[entry_id for entry_id, _ in window]), kind).values(
+            'id', 'product_id', 'product_variation_id', 'label', 'category',
+        )
+        entries = {entry['id']: entry for entry in entries}
+        for entry_id, (_, score) in window:
+            if entry_id in entries:
+                results.append(_result(entries[entry_id], score))
+                if len(results) == limit:
+                    return results
+    return results
+
+
+# Indexed terms a query word stands for, with their score factor - itself, terms it prefixes, terms within two edits
+def _expand(word):
+    expansions = {word: 1.0}
+    for term in SearchTermVariant.objects.filter(
+        variant__gt=word, variant__lt=word + '\uffff', term=F('variant'),
+    ).values_list('term', flat=True)[:MAX_PREFIX_TERMS]:
+        expansions[term] = PREFIX_FACTOR
+    if len(_variants(word)) > 1:
+        for term in SearchTermVariant.objects.filter(variant__in=_variants(word)).values_list('term', flat=True).distinct():
+            factor = TYPO_FACTORS.get(_edit_distance(word, term))
+            if term not in expansions and factor:
+                expansions[term] = factor
+    return expansions
+
+
+# Optimal string alignment distance - insertions, deletions, substitutions and adjacent transpositions
+def _edit_distance(a, b):
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+def _of_kind(entries, kind):
+    if kind == 'product':
+        return entries.filter(product_variation__isnull=True)
+    if kind == 'variation':
+        return entries.filter(product_variation__isnull=False)
+    return entries
+
+
+def _result(entry, score):
+    is_variation = entry['product_variation_id'] is not None
+    return {
+        'type': 'variation' if is_variation else 'product',
+        'id': entry['product_variation_id'] if is_variation else entry['product_id'],
+        'product': entry['product_id'],
+        'label': entry['label'],
+        'category': entry['category'],
+        'score': round(score, 4),
+    }
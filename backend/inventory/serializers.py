@@ -1,31 +1,78 @@
 # Serializers convert models to/from JSON for API responses
 from rest_framework import serializers
-from .models import Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem
+from django.db import transaction
+from .models import Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem, StockMovement, FulfillmentJob
 from django.contrib.auth.models import Group, Permission, User
+from .stock import fulfill_sales_orders, receive_purchase_orders, lock_stock, record_movements
+from .reservations import rebalance, reserve_orders
+from .instrumentation import TimedRepresentationMixin
+
+# Bases for every serializer here - rendering output counts as serialization time in the request metrics
+class TimedModelSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    pass
+
+class TimedSerializer(TimedRepresentationMixin, serializers.Serializer):
+    pass
 
 # ProductVariation serializer - handles product SKU data
-class ProductVariationSerializer(serializers.ModelSerializer):
+class ProductVariationSerializer(TimedModelSerializer):
     class Meta:
         model = ProductVariation
         fields = '__all__'  # Include all model fields
-        read_only_fields = ['product']  # Product field set via nested route
+        read_only_fields = ['product', 'low_stock_alerted']  # Product set via nested route, alert flag by check_low_stock
+
+    # Direct stock_level writes are recorded in the ledger as Adjustment movements and re-allot the reservation shards
+    def create(self, validated_data):
+        with transaction.atomic():
+            variation = super().create(validated_data)
+            record_movements([StockMovement(product_variation=variation, quantity=variation.stock_level, reason='Adjustment')])
+        return variation
+
+    def update(self, instance, validated_data):
+        if 'stock_level' not in validated_data and 'reservation_shards' not in validated_data:
+            return super().update(instance, validated_data)
+        with transaction.atomic():
+            previous = lock_stock([instance.id])[instance.id][1]  # Current level, locked against concurrent orders
+            variation = super().update(instance, validated_data)
+            record_movements([StockMovement(product_variation=variation, quantity=variation.stock_level - previous, reason='Adjustment')])
+            rebalance([variation.id])
+        return variation
 
 # Product serializer - includes nested variations
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedModelSerializer):
     variations = ProductVariationSerializer(many=True, read_only=True)  # Nested variations list
     
     class Meta:
         model = Product
         fields = '__all__'
 
+    # Drop nested variations when the view asks for a flat product list
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get('include_variations', True):
+            fields.pop('variations')
+        return fields
+
+# StockMovement serializer - read-only view of the ledger
+class StockMovementSerializer(TimedModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = '__all__'
+
+# FulfillmentJob serializer - read-only status of an asynchronous fulfillment
+class FulfillmentJobSerializer(TimedModelSerializer):
+    class Meta:
+        model = FulfillmentJob
+        fields = ['id', 'sales_order', 'status', 'error', 'created_at', 'finished_at']
+
 # Supplier serializer
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(TimedModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
 
 # PurchaseOrderItem serializer - includes product details
-class PurchaseOrderItemSerializer(serializers.ModelSerializer):
+class PurchaseOrderItemSerializer(TimedModelSerializer):
     product_variation_details = ProductVariationSerializer(source='product_variation', read_only=True)  # Nested product info
     
     class Meta:
@@ -33,7 +80,7 @@ class PurchaseOrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product_variation', 'product_variation_details', 'quantity_ordered', 'cost_per_unit']
 
 # PurchaseOrder serializer - handles order creation and stock updates
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(TimedModelSerializer):
     items = PurchaseOrderItemSerializer(many=True, read_only=True)  # For reading items
     supplier_details = SupplierSerializer(source='supplier', read_only=True)  # Nested supplier info
     items_data = PurchaseOrderItemSerializer(many=True, write_only=True, required=False, source='items')  # For creating items
@@ -46,30 +93,31 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
         purchase_order = PurchaseOrder.objects.create(**validated_data)
-        for item_data in items_data:
-            PurchaseOrderItem.objects.create(purchase_order=purchase_order, **item_data)
+        PurchaseOrderItem.objects.bulk_create(
+            [PurchaseOrderItem(purchase_order=purchase_order, **item_data) for item_data in items_data]  # One INSERT for all lines
+        )
         return purchase_order
     
     # Update order - increases stock when status changes to 'Received'
     def update(self, instance, validated_data):
-        from django.db.models import F
         old_status = instance.status
         new_status = validated_data.get('status', old_status)
         
-        instance.status = new_status
-        instance.save()
-        
-        # Increase stock when order is received
+        # Increase stock when order is received - status and stock commit together
         if old_status != 'Received' and new_status == 'Received':
-            for item in instance.items.all():
-                ProductVariation.objects.filter(id=item.product_variation.id).update(
-                    stock_level=F('stock_level') + item.quantity_ordered  # F() prevents race conditions
-                )
+            with transaction.atomic():
+                received, errors = receive_purchase_orders([instance.id])
+                if errors:
+                    raise serializers.ValidationError(errors[instance.id])
+            instance.refresh_from_db(fields=['status', 'updated_at'])
+            return instance
         
+        instance.status = new_status
+        instance.save()
         return instance
 
 # SalesOrderItem serializer
-class SalesOrderItemSerializer(serializers.ModelSerializer):
+class SalesOrderItemSerializer(TimedModelSerializer):
     product_variation_details = ProductVariationSerializer(source='product_variation', read_only=True)  # Nested product info
     
     class Meta:
@@ -77,7 +125,7 @@ class SalesOrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'product_variation', 'product_variation_details', 'quantity_sold', 'sale_price_per_unit']
 
 # SalesOrder serializer - validates stock and deducts on fulfillment
-class SalesOrderSerializer(serializers.ModelSerializer):
+class SalesOrderSerializer(TimedModelSerializer):
     items = SalesOrderItemSerializer(many=True, read_only=True)  # For reading items
     items_data = SalesOrderItemSerializer(many=True, write_only=True, required=False, source='items')  # For creating items
     
@@ -85,45 +133,126 @@ class SalesOrderSerializer(serializers.ModelSerializer):
         model = SalesOrder
         fields = ['id', 'customer_email', 'status', 'items', 'items_data', 'created_at', 'updated_at']
     
-    # Create sales order with line items
+    # Create sales order with line items - a pending order reserves its lines' stock, or isn't created
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
-        sales_order = SalesOrder.objects.create(**validated_data)
-        for item_data in items_data:
-            SalesOrderItem.objects.create(sales_order=sales_order, **item_data)
+        with transaction.atomic():
+            sales_order = SalesOrder.objects.create(**validated_data)
+            SalesOrderItem.objects.bulk_create(
+                [SalesOrderItem(sales_order=sales_order, **item_data) for item_data in items_data]  # One INSERT for all lines
+            )
+            if sales_order.status == 'Pending':
+                lines = {}
+                for item_data in items_data:
+                    variation_id = item_data['product_variation'].id
+                    lines[variation_id] = lines.get(variation_id, 0) + item_data['quantity_sold']
+                errors = reserve_orders({sales_order.id: lines})
+                if errors:
+                    raise serializers.ValidationError(errors[sales_order.id])
         return sales_order
     
     # Update order - validates stock and deducts when status changes to 'Fulfilled'
     def update(self, instance, validated_data):
-        from django.db.models import F
         old_status = instance.status
         new_status = validated_data.get('status', old_status)
         
         if old_status != 'Fulfilled' and new_status == 'Fulfilled':
-            # Validate sufficient stock before fulfilling
-            for item in instance.items.all():
-                variation = ProductVariation.objects.get(id=item.product_variation.id)
-                if variation.stock_level < item.quantity_sold:
-                    raise serializers.ValidationError(f"Insufficient stock for {variation.sku_code}")
-            
-            # Deduct stock after validation
-            for item in instance.items.all():
-                ProductVariation.objects.filter(id=item.product_variation.id).update(
-                    stock_level=F('stock_level') - item.quantity_sold
-                )
+            # Lock, check and decrement every line in one transaction - all lines or none
+            with transaction.atomic():
+                fulfilled, errors = fulfill_sales_orders([instance.id])
+                if errors:
+                    raise serializers.ValidationError(errors[instance.id])
+            instance.refresh_from_db(fields=['status', 'updated_at'])
+            return instance
         
         instance.status = new_status
         instance.save()
         return instance
 
+# Bulk ingestion serializers - foreign keys are plain ids here so validating an order
+# never touches the database; inventory.bulk resolves them for the whole batch at once
+class BulkPurchaseOrderItemSerializer(TimedModelSerializer):
+    product_variation = serializers.IntegerField()  # Resolved in bulk
+
+    class Meta:
+        model = PurchaseOrderItem
+        fields = ['product_variation', 'quantity_ordered', 'cost_per_unit']
+
+class BulkPurchaseOrderSerializer(TimedModelSerializer):
+    supplier = serializers.IntegerField()  # Resolved in bulk
+    items_data = BulkPurchaseOrderItemSerializer(many=True, required=False)
+
+    class Meta:
+        model = PurchaseOrder
+        fields = ['supplier', 'status', 'items_data']
+
+class BulkSalesOrderItemSerializer(TimedModelSerializer):
+    product_variation = serializers.IntegerField()  # Resolved in bulk
+
+    class Meta:
+        model = SalesOrderItem
+        fields = ['product_variation', 'quantity_sold', 'sale_price_per_unit']
+
+class BulkSalesOrderSerializer(TimedModelSerializer):
+    items_data = BulkSalesOrderItemSerializer(many=True, required=False)
+
+    class Meta:
+        model = SalesOrder
+        fields = ['customer_email', 'status', 'items_data']
+
+# Payload for batch status actions - {"ids": [1, 2, 3]}
+class OrderIdsSerializer(TimedSerializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=5000)
+
+# Payload for POST /api/stock/availability/ - {"sku_codes": ["TSHIRT-RED-M", ...]}
+class AvailabilityQuerySerializer(TimedSerializer):
+    sku_codes = serializers.ListField(child=serializers.CharField(max_length=100), allow_empty=False, max_length=5000)
+
+# Analytics report rows - read-only, decimals rendered like the rest of the API
+class RollupMetricsSerializer(TimedSerializer):
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units_sold = serializers.IntegerField()
+    purchase_spend = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units_purchased = serializers.IntegerField()
+
+class DailyTotalsSerializer(RollupMetricsSerializer):
+    day = serializers.DateField()
+    sales_orders = serializers.IntegerField()
+    purchase_orders = serializers.IntegerField()
+
+class ProductTotalsSerializer(RollupMetricsSerializer):
+    product = serializers.IntegerField()
+    name = serializers.CharField()
+
+class CategoryTotalsSerializer(RollupMetricsSerializer):
+    category = serializers.CharField()
+
+class SkuTotalsSerializer(RollupMetricsSerializer):
+    variation = serializers.IntegerField()
+    sku_code = serializers.CharField()
+
+# Search serializers - query parameters and ranked hits of /api/search/
+class SearchQuerySerializer(TimedSerializer):
+    q = serializers.CharField(max_length=200)
+    type = serializers.ChoiceField(choices=['product', 'variation'], required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+class SearchResultSerializer(TimedSerializer):
+    type = serializers.CharField()  # "product" or "variation"
+    id = serializers.IntegerField()  # Product or variation id, per type
+    product = serializers.IntegerField()
+    label = serializers.CharField()  # Product name or SKU code
+    category = serializers.CharField()
+    score = serializers.FloatField()
+
 # Permission serializer - for role-based access control
-class PermissionSerializer(serializers.ModelSerializer):
+class PermissionSerializer(TimedModelSerializer):
     class Meta:
         model = Permission
         fields = ['id', 'name', 'codename']
 
 # Group serializer - manages user groups/roles
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(TimedModelSerializer):
     permissions = PermissionSerializer(many=True, read_only=True)  # For reading permissions
     permission_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)  # For assigning permissions
 
@@ -143,12 +272,12 @@ class GroupSerializer(serializers.ModelSerializer):
         instance.name = validated_data.get('name', instance.name)
         instance.save()
         if permission_ids is not None:
-            instance.permissions.set(permission_ids)  # Update group permissions
+            instance.permissions.set(permission_ids)  # Update group permissions - m2m_changed drops members' principals
         return instance
 
 
 # User serializer - manages user accounts and group assignments
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedModelSerializer):
     groups = GroupSerializer(many=True, read_only=True)  # For reading user groups
     group_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True, required=False)  # For assigning groups
     password = serializers.CharField(write_only=True, required=False)  # Password never returned in responses
@@ -174,5 +303,5 @@ class UserSerializer(serializers.ModelSerializer):
             instance.set_password(password)  # Hash password before saving
         instance.save()
         if group_ids is not None:
-            instance.groups.set(group_ids)  # Update user groups
+            instance.groups.set(group_ids)  # Update user groups - m2m_changed drops the cached principal
         return instance
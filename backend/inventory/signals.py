@@ -0,0 +1,89 @@
+# Model signal handlers - connected in InventoryConfig.ready()
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.contrib.auth.models import Group, User
+from django.dispatch import receiver
+from .analytics import mark_deleted_order
+from .attributes import index_attributes
+from .availability import invalidate_availability
+from .cache import CATALOGUE, invalidate
+from .principal import invalidate_group, invalidate_principals
+from .search import index_products, index_variations
+from .models import Product, ProductVariation, PurchaseOrder, SalesOrder
+
+
+# Any product or variation write invalidates the cached catalogue responses
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductVariation)
+def invalidate_catalogue(sender, **kwargs):
+    invalidate(CATALOGUE)
+
+
+# A variation write can change its stock or reorder level - drop its cached availability
+@receiver([post_save, post_delete], sender=ProductVariation)
+def invalidate_variation_availability(sender, instance, **kwargs):
+    invalidate_availability([instance.pk])
+
+
+# Keep the attribute key/value index in step with the JSON (bulk writers call index_attributes themselves)
+@receiver(post_save, sender=ProductVariation)
+def reindex_attributes(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'attributes' in update_fields:
+        index_attributes([instance])
+
+
+# Keep the search index in step with product and SKU text (bulk writers call index_products / index_variations themselves)
+@receiver(post_save, sender=Product)
+def reindex_product_search(sender, instance, **kwargs):
+    index_products([instance])
+
+
+@receiver(post_save, sender=ProductVariation)
+def reindex_variation_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'product', 'sku_code', 'attributes'} & set(update_fields):
+        index_variations([instance])
+
+
+# Any user row write (admin site, password change, deactivation) drops the user's cached principal
+@receiver([post_save, post_delete], sender=User)
+def invalidate_principal(sender, instance, **kwargs):
+    invalidate_principals([instance.pk])
+
+
+# Group membership and direct permission grants, from either side (user.groups / group.user_set, user.user_permissions /
+# permission.user_set) - a clear is handled before it runs, while the linked users can still be read
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_principals([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_principals(list(instance.user_set.values_list('id', flat=True)))
+    else:
+        invalidate_principals(pk_set)
+
+
+# Group permission grants, from either side (group.permissions / permission.group_set) - every member is affected
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_group(instance)
+        return
+    groups = instance.group_set.all() if action == 'pre_clear' else Group.objects.filter(pk__in=pk_set)
+    invalidate_principals(list(User.objects.filter(groups__in=groups).values_list('id', flat=True).distinct()))
+
+
+# A deleted fulfilled / received order leaves its day's rollups inflated - mark the day for the next refresh
+@receiver(post_delete, sender=SalesOrder)
+@receiver(post_delete, sender=PurchaseOrder)
+def mark_rollup_day(sender, instance, **kwargs):
+    mark_deleted_order(instance)
+
+
+# A deleted group's members lose its permissions - read them before the membership rows go
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group(sender, instance, **kwargs):
+    invalidate_group(instance)
@@ -0,0 +1,157 @@
+# Stock level changes driven by order status transitions, and the StockMovement ledger behind them
+# Every function that writes must run inside transaction.atomic() - rows are locked until commit
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+from .availability import invalidate_availability
+from .cache import CATALOGUE, invalidate
+from .models import ProductVariation, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem, StockMovement, StockSnapshot
+from .reservations import convert_reservations, lock_reservations, rebalance
+
+LEDGER_BATCH_SIZE = 1000  # Rows per StockMovement INSERT
+
+
+# Lock variations in primary key order so concurrent transactions queue up instead of deadlocking
+def lock_stock(variation_ids):
+    rows = (
+        ProductVariation.objects.select_for_update()
+        .filter(id__in=variation_ids)
+        .order_by('id')
+        .values_list('id', 'sku_code', 'stock_level')
+    )
+    return {variation_id: (sku_code, stock_level) for variation_id, sku_code, stock_level in rows}
+
+
+# Apply {variation_id: delta} to stock_level with a single UPDATE, then re-allot the reservation shards
+def apply_stock_deltas(deltas):
+    deltas = {variation_id: delta for variation_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ProductVariation.objects.filter(id__in=deltas).update(
+        stock_level=F('stock_level') + Case(
+            *[When(id=variation_id, then=Value(delta)) for variation_id, delta in deltas.items()],
+            default=Value(0),
+        ),
+        updated_at=timezone.now(),  # Queryset updates skip auto_now
+    )
+    invalidate(CATALOGUE)  # Queryset updates skip post_save - cached stock levels would go stale
+    invalidate_availability(deltas)
+    rebalance(deltas)
+
+
+# Append ledger rows in batches - zero-quantity movements are dropped
+def record_movements(movements):
+    StockMovement.objects.bulk_create(
+        [movement for movement in movements if movement.quantity], batch_size=LEDGER_BATCH_SIZE
+    )
+
+
+# Fulfill pending sales orders - returns (fulfilled order ids, {order id: error message})
+# An order is fulfilled whole or not at all; orders are served in id order against the locked stock.
+# Lines the order holds a reservation for only need the stock; the rest (reservation expired, or an order placed
+# before reservations) must fit in what other orders' reservations leave
+def fulfill_sales_orders(order_ids):
+    # Lock the orders first so the same order can't be fulfilled twice concurrently
+    found = dict(
+        SalesOrder.objects.select_for_update()
+        .filter(id__in=order_ids)
+        .order_by('id')
+        .values_list('id', 'status')
+    )
+    pending = [order_id for order_id, status in found.items() if status == 'Pending']
+    errors = {
+        order_id: 'Order is not pending.' if order_id in found else 'Order does not exist.'
+        for order_id in set(order_ids) - set(pending)
+    }
+
+    # Quantity per (order, variation) in one query
+    demand = {}
+    for order_id, variation_id, quantity in (
+        SalesOrderItem.objects.filter(sales_order_id__in=pending)
+        .values('sales_order_id', 'product_variation_id')
+        .annotate(quantity=Sum('quantity_sold'))
+        .values_list('sales_order_id', 'product_variation_id', 'quantity')
+    ):
+        demand.setdefault(order_id, {})[variation_id] = quantity
+
+    stock = lock_stock({variation_id for lines in demand.values() for variation_id in lines})
+    available = {variation_id: stock_level for variation_id, (_, stock_level) in stock.items()}
+    own, held = lock_reservations(pending, stock)
+
+    # Allocate in memory, then write every decrement and its ledger rows at once
+    fulfilled, deltas, movements = [], {}, []
+    for order_id in pending:
+        lines, covered = demand.get(order_id, {}), own.get(order_id, {})
+        short = [
+            stock[variation_id][0] for variation_id, quantity in lines.items()
+            if available[variation_id] < quantity
+            or available[variation_id] - held.get(variation_id, 0) < quantity - min(covered.get(variation_id, 0), quantity)
+        ]
+        if short:
+            errors[order_id] = f"Insufficient stock for {', '.join(short)}"
+            continue
+        for variation_id, quantity in lines.items():
+            available[variation_id] -= quantity
+            held[variation_id] = held.get(variation_id, 0) - covered.get(variation_id, 0)
+            deltas[variation_id] = deltas.get(variation_id, 0) - quantity
+            movements.append(StockMovement(
+                product_variation_id=variation_id, quantity=-quantity, reason='Fulfillment', sales_order_id=order_id,
+            ))
+        fulfilled.append(order_id)
+
+    convert_reservations(fulfilled)
+    apply_stock_deltas(deltas)
+    record_movements(movements)
+    SalesOrder.objects.filter(id__in=fulfilled).update(status='Fulfilled', updated_at=timezone.now())
+    return fulfilled, errors
+
+
+# Receive purchase orders - returns (received order ids, {order id: error message})
+# Quantities are summed per variation across all orders and added with one UPDATE
+def receive_purchase_orders(order_ids):
+    # Lock the orders first so the same order can't be received twice concurrently
+    found = dict(
+        PurchaseOrder.objects.select_for_update()
+        .filter(id__in=order_ids)
+        .order_by('id')
+        .values_list('id', 'status')
+    )
+    receivable = [order_id for order_id, status in found.items() if status != 'Received']
+    errors = {
+        order_id: 'Order is already received.' if order_id in found else 'Order does not exist.'
+        for order_id in set(order_ids) - set(receivable)
+    }
+
+    # Quantity per (order, variation) in one query - summed per variation for the stock UPDATE
+    deltas, movements = {}, []
+    for order_id, variation_id, quantity in (
+        PurchaseOrderItem.objects.filter(purchase_order_id__in=receivable)
+        .values('purchase_order_id', 'product_variation_id')
+        .annotate(quantity=Sum('quantity_ordered'))
+        .values_list('purchase_order_id', 'product_variation_id', 'quantity')
+    ):
+        deltas[variation_id] = deltas.get(variation_id, 0) + quantity
+        movements.append(StockMovement(
+            product_variation_id=variation_id, quantity=quantity, reason='Receipt', purchase_order_id=order_id,
+        ))
+    lock_stock(deltas)  # Same lock order as fulfillment
+    apply_stock_deltas(deltas)
+    record_movements(movements)
+    PurchaseOrder.objects.filter(id__in=receivable).update(status='Received', updated_at=timezone.now())
+    return receivable, errors
+
+
+# Stock level of one SKU as of `at` - the latest snapshot at or before `at` plus the movements after it,
+# so the scan is bounded by one snapshot interval rather than the SKU's whole history
+def stock_at(variation_id, at):
+    snapshot = (
+        StockSnapshot.objects.filter(product_variation_id=variation_id, taken_at__lte=at)
+        .order_by('-taken_at')
+        .values_list('taken_at', 'stock_level')
+        .first()
+    )
+    movements = StockMovement.objects.filter(product_variation_id=variation_id, created_at__lte=at)
+    base = 0
+    if snapshot:
+        taken_at, base = snapshot
+        movements = movements.filter(created_at__gt=taken_at)
+    return base + (movements.aggregate(total=Sum('quantity'))['total'] or 0)
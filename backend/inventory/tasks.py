@@ -1,37 +1,149 @@
 # Celery tasks for background processing
+from datetime import timedelta
 from celery import shared_task
-from django.db.models import F
-from django.core.mail import send_mail
-from django.contrib.auth.models import Group
-from .models import ProductVariation
+from django.core.cache import cache
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.core.mail import EmailMessage, get_connection
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from .analytics import refresh_rollups
+from .cache import CATALOGUE, invalidate
+from .forecast import refresh_reorder_levels
+from .fulfillment import drain_fulfillments
+from .importer import import_catalogue
+from .models import ProductVariation, StockMovement, StockSnapshot
+from .reservations import release_expired
+
+ALERT_CHUNK_SIZE = 2000  # Low stock rows fetched / flagged per query
+SNAPSHOT_LAG = timedelta(minutes=5)  # Snapshot up to now - lag so in-flight transactions have committed their movements
+SNAPSHOT_CHUNK_SIZE = 2000  # SKUs per snapshot batch
+DRAIN_QUEUED_KEY = 'inventory:fulfillment:drain-queued'  # Set while a drain_fulfillment_queue task waits for a worker
+DRAIN_QUEUED_TIMEOUT = 60  # Seconds - a lost task stops holding back new ones after this
 
 # Scheduled task to check for low stock items and alert warehouse managers
+# Each manager gets one digest of the SKUs that dropped to their reorder level since the last run,
+# and all digests go out over a single mail connection
 @shared_task  # Makes this function a Celery task
 def check_low_stock():
-    # Find items where stock_level <= reorder_level
-    low_stock_items = ProductVariation.objects.filter(stock_level__lte=F('reorder_level'))
-    
-    if low_stock_items.exists():
-        # Get Warehouse Manager group
-        warehouse_group = Group.objects.filter(name='Warehouse Manager').first()
-        if warehouse_group:
-            # Get all managers with valid email addresses
-            managers = warehouse_group.user_set.filter(email__isnull=False).exclude(email='')
-            
-            # Send alert for each low stock item
-            for item in low_stock_items:
-                message = f"LOW STOCK ALERT: '{item.sku_code}' is at {item.stock_level} units (Reorder level is {item.reorder_level})."
-                
-                # Email each warehouse manager
-                for manager in managers:
-                    send_mail(
-                        subject=f'Low Stock Alert: {item.sku_code}',
-                        message=message,
-                        from_email='noreply@inventory.com',
-                        recipient_list=[manager.email],
-                        fail_silently=True,  # Don't raise exceptions on email errors
+    # Re-arm SKUs that have been restocked so a future drop alerts again
+    if ProductVariation.objects.filter(low_stock_alerted=True, stock_level__gt=F('reorder_level')).update(
+        low_stock_alerted=False, updated_at=timezone.now()
+    ):
+        invalidate(CATALOGUE)
+
+    # Stream the newly low SKUs - stock_level <= reorder_level and not alerted yet
+    newly_low = ProductVariation.objects.filter(stock_level__lte=F('reorder_level'), low_stock_alerted=False).order_by('id')
+    lines, alerted_ids = [], []
+    for variation_id, sku_code, stock_level, reorder_level in newly_low.values_list(
+        'id', 'sku_code', 'stock_level', 'reorder_level'
+    ).iterator(chunk_size=ALERT_CHUNK_SIZE):
+        lines.append(f"'{sku_code}' is at {stock_level} units (Reorder level is {reorder_level}).")
+        alerted_ids.append(variation_id)
+
+    if lines:
+        # Warehouse managers with valid email addresses
+        recipients = list(
+            User.objects.filter(groups__name='Warehouse Manager').exclude(email='').values_list('email', flat=True).distinct()
+        )
+        if recipients:
+            message = "LOW STOCK ALERT:\n" + "\n".join(lines)
+            digests = [
+                EmailMessage(
+                    subject=f'Low Stock Alert: {len(lines)} SKUs',
+                    body=message,
+                    from_email='noreply@inventory.com',
+                    to=[email],
+                )
+                for email in recipients
+            ]
+            with get_connection(fail_silently=True) as connection:  # Don't raise exceptions on email errors
+                sent = connection.send_messages(digests)
+            if sent:
+                # Remember what was alerted so the next run only reports new crossings
+                for start in range(0, len(alerted_ids), ALERT_CHUNK_SIZE):
+                    ProductVariation.objects.filter(id__in=alerted_ids[start:start + ALERT_CHUNK_SIZE]).update(
+                        low_stock_alerted=True, updated_at=timezone.now()
                     )
-                
-                print(f"Alert sent: {message}")
-    
-    return f"Checked {ProductVariation.objects.count()} items, {low_stock_items.count()} low stock"
+                invalidate(CATALOGUE)
+            print(f"Alert digest sent to {sent} of {len(recipients)} managers: {len(lines)} SKUs")
+
+    counts = ProductVariation.objects.aggregate(
+        total=Count('id'), low=Count('id', filter=Q(stock_level__lte=F('reorder_level')))
+    )
+    return f"Checked {counts['total']} items, {counts['low']} low stock"
+
+
+# Periodic task to snapshot stock per SKU from the ledger
+# Each snapshot is the SKU's previous snapshot plus its movements since, so only SKUs that moved get a row
+@shared_task
+def snapshot_stock():
+    taken_at = timezone.now() - SNAPSHOT_LAG
+    last_taken_at = StockSnapshot.objects.aggregate(last=Max('taken_at'))['last']
+    movements = StockMovement.objects.filter(created_at__lte=taken_at)
+    if last_taken_at:
+        movements = movements.filter(created_at__gt=last_taken_at)
+    deltas = dict(
+        movements.values('product_variation_id')
+        .annotate(quantity=Sum('quantity'))
+        .values_list('product_variation_id', 'quantity')
+    )
+
+    # Previous level per SKU via the (product_variation, taken_at) index, a chunk of SKUs at a time
+    latest = StockSnapshot.objects.filter(product_variation=OuterRef('pk')).order_by('-taken_at').values('stock_level')[:1]
+    variation_ids = sorted(deltas)
+    for start in range(0, len(variation_ids), SNAPSHOT_CHUNK_SIZE):
+        chunk = variation_ids[start:start + SNAPSHOT_CHUNK_SIZE]
+        previous = ProductVariation.objects.filter(id__in=chunk).annotate(level=Subquery(latest)).values_list('id', 'level')
+        StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_variation_id=variation_id, stock_level=(level or 0) + deltas[variation_id], taken_at=taken_at)
+            for variation_id, level in previous
+        ])
+
+    return f"Snapshotted {len(variation_ids)} SKUs as of {taken_at.isoformat()}"
+
+
+# Periodic task to keep the analytics rollups current - only days with changed orders are rebuilt
+@shared_task
+def rollup_analytics(full=False):
+    days = refresh_rollups(full=full)
+    return f"Rebuilt analytics rollups for {days} days"
+
+
+# Periodic task to free the stock of pending orders whose reservation expired - the orders stay pending
+@shared_task
+def release_expired_reservations():
+    return f"Released {release_expired()} expired reservations"
+
+
+# Nightly task to set reorder levels from each SKU's demand and supplier lead times, ahead of check_low_stock
+@shared_task
+def forecast_reorder_levels():
+    report = refresh_reorder_levels()
+    return f"Forecast {report['skus']} SKUs, {report['updated']} reorder levels changed in {report['seconds']}s"
+
+
+# Fulfill the orders queued by asynchronous PATCHes, a batch per transaction - also scheduled every minute
+# so jobs whose drain was lost or skipped their order are picked up
+@shared_task
+def drain_fulfillment_queue():
+    cache.delete(DRAIN_QUEUED_KEY)  # Jobs queued from here on schedule another drain
+    report = drain_fulfillments()
+    return f"Drained {report['batches']} fulfillment batches: {report['fulfilled']} fulfilled, {report['failed']} failed"
+
+
+# Queue a drain_fulfillment_queue task unless one is already waiting - it will see every job queued before it starts
+def schedule_fulfillment_drain():
+    if cache.add(DRAIN_QUEUED_KEY, 1, timeout=DRAIN_QUEUED_TIMEOUT):
+        drain_fulfillment_queue.delay()
+
+
+# Import an uploaded catalogue feed from default storage - progress is published as task state
+# so /api/products/import/{task_id}/ can report it, and the upload is deleted afterwards
+@shared_task(bind=True)
+def import_catalogue_file(self, name, fmt):
+    try:
+        with default_storage.open(name, 'rb') as stream:
+            return import_catalogue(stream, fmt, progress=lambda report: self.update_state(state='PROGRESS', meta=report))
+    finally:
+        default_storage.delete(name)
@@ -0,0 +1,1263 @@
+# Tests for the inventory API - run with python manage.py test --settings=backend.settings_test
+import csv
+import gzip
+import importlib
+import io
+import json
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+from unittest import mock
+from django.apps import apps
+from django.contrib.auth.models import Group, Permission, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import numpy as np
+from celery.contrib.testing.worker import start_worker
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from backend.celery import app
+from . import availability as availability_module
+from .analytics import refresh_rollups
+from .availability import availability
+from .cache import CATALOGUE, cache_stats, namespace_version
+from .forecast import refresh_reorder_levels, reorder_levels
+from .fulfillment import drain_fulfillments, queue_fulfillment
+from .importer import import_catalogue
+from .instrumentation import measure
+from .models import DailyRollup, FulfillmentJob, RollupDirtyDay, Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, ReservationShard, SalesOrder, SalesOrderItem, SearchEntry, SearchTermVariant, StockMovement, StockReservation, StockSnapshot, VariationAttribute
+from .reservations import rebalance, release_expired, reserve_orders
+from .principal import load_principal
+from .routers import replica_reads
+from .search import rebuild_index, search
+from .serializers import PurchaseOrderSerializer
+from .stock import stock_at
+from .tasks import DRAIN_QUEUED_KEY, SNAPSHOT_LAG, check_low_stock, drain_fulfillment_queue, import_catalogue_file, snapshot_stock
+
+
+# Shared fixtures - an authenticated admin client and a small catalogue
+class InventoryTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        product = Product.objects.create(name='T-Shirt', category='Apparel', description='Cotton tee', price=20)
+        cls.variations = [
+            ProductVariation.objects.create(product=product, sku_code=f'TSHIRT-{size}', attributes={'size': size}, stock_level=100)
+            for size in ('S', 'M', 'L')
+        ]
+        cls.supplier = Supplier.objects.create(name='Acme', email='acme@example.com', phone='555-0100')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    # Orders with a line for each variation - (purchase orders, sales orders)
+    def create_orders(self, count):
+        purchase_orders, sales_orders = [], []
+        for _ in range(count):
+            purchase_order = PurchaseOrder.objects.create(supplier=self.supplier)
+            sales_order = SalesOrder.objects.create(customer_email='customer@example.com')
+            for variation in self.variations:
+                PurchaseOrderItem.objects.create(purchase_order=purchase_order, product_variation=variation, quantity_ordered=5, cost_per_unit=8)
+                SalesOrderItem.objects.create(sales_order=sales_order, product_variation=variation, quantity_sold=1, sale_price_per_unit=20)
+            purchase_orders.append(purchase_order)
+            sales_orders.append(sales_order)
+        return purchase_orders, sales_orders
+
+    # Queries a GET runs - the response must succeed
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+# Order endpoints load their nested supplier, items and variations in a fixed number of queries
+class OrderQueryCountTests(InventoryTestCase):
+    URLS = ['/api/purchase-orders/', '/api/sales-orders/']
+
+    # The query count for 5N orders must equal the one for N - a per-row query would grow with the page
+    def assert_flat(self, url):
+        self.create_orders(4)
+        expected = self.count_queries(url)
+        self.create_orders(16)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        results = response.json()['results']
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(results[0]['items']), len(self.variations))
+        return results
+
+    def test_lists_are_flat(self):
+        for url in self.URLS:
+            with self.subTest(url=url):
+                self.assert_flat(url)
+                PurchaseOrder.objects.all().delete()
+                SalesOrder.objects.all().delete()
+
+    # The serializer path (non-JSON renderers, or FAST_LIST_RESPONSES off) is flat as well
+    @override_settings(FAST_LIST_RESPONSES=False)
+    def test_serializer_lists_are_flat(self):
+        self.test_lists_are_flat()
+
+    def test_nested_details_are_rendered(self):
+        results = self.assert_flat('/api/purchase-orders/')
+        self.assertEqual(results[0]['supplier_details']['name'], 'Acme')
+        self.assertIn(results[0]['items'][0]['product_variation_details']['sku_code'], {'TSHIRT-S', 'TSHIRT-M', 'TSHIRT-L'})
+
+
+# POST /api/sales-orders/fulfill/ - per-order outcomes of a batch
+class FulfillTests(InventoryTestCase):
+    def test_fulfills_and_reports_each_order(self):
+        _, (pending, fulfilled) = self.create_orders(2)
+        SalesOrder.objects.filter(pk=fulfilled.pk).update(status='Fulfilled')
+        missing = fulfilled.pk + 1000
+        response = self.client.post('/api/sales-orders/fulfill/', {'ids': [pending.pk, fulfilled.pk, missing]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'fulfilled': [pending.pk],
+            'errors': [
+                {'id': fulfilled.pk, 'error': 'Order is not pending.'},
+                {'id': missing, 'error': 'Order does not exist.'},
+            ],
+        })
+        self.assertEqual(list(ProductVariation.objects.order_by('id').values_list('stock_level', flat=True)), [99, 99, 99])
+
+
+# POST /api/purchase-orders/receive/ - per-order outcomes of a batch
+class ReceiveTests(InventoryTestCase):
+    def test_receives_and_reports_each_order(self):
+        (pending, received), _ = self.create_orders(2)
+        PurchaseOrder.objects.filter(pk=received.pk).update(status='Received')
+        missing = received.pk + 1000
+        response = self.client.post('/api/purchase-orders/receive/', {'ids': [pending.pk, received.pk, missing]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'received': [pending.pk],
+            'errors': [
+                {'id': received.pk, 'error': 'Order is already received.'},
+                {'id': missing, 'error': 'Order does not exist.'},
+            ],
+        })
+        self.assertEqual(list(ProductVariation.objects.order_by('id').values_list('stock_level', flat=True)), [105, 105, 105])
+
+
+# The hot filters resolve to their indexes (migration 0007) - checked with EXPLAIN QUERY PLAN on SQLite
+class IndexUsageTests(InventoryTestCase):
+    # Plan lines of a statement
+    def plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    # Every query a GET runs against table that filters on column must use index
+    def assert_endpoint_uses(self, url, table, column, index):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        filtered = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql'] and f'"{table}"."{column}" =' in query['sql']
+        ]
+        self.assertTrue(filtered, f'{url} ran no query filtering {table}.{column}')
+        for sql in filtered:
+            self.assertIn(f'USING INDEX {index}', self.plan(sql), sql)
+
+    def test_low_stock_scan(self):
+        newly_low = ProductVariation.objects.filter(stock_level__lte=F('reorder_level'), low_stock_alerted=False).order_by('id')
+        self.assertIn('USING INDEX variation_low_stock_idx', self.plan(*newly_low.query.sql_with_params()))
+        alerted = ProductVariation.objects.filter(low_stock_alerted=True, stock_level__gt=F('reorder_level'))
+        self.assertIn('USING INDEX variation_alerted_idx', self.plan(*alerted.query.sql_with_params()))
+
+    def test_status_filtered_lists(self):
+        self.create_orders(3)
+        after = 'created_after=2024-01-01T00:00:00Z'
+        self.assert_endpoint_uses(f'/api/sales-orders/?status=Pending&{after}', 'inventory_salesorder', 'status', 'so_status_created_idx')
+        self.assert_endpoint_uses(f'/api/purchase-orders/?status=Pending&{after}', 'inventory_purchaseorder', 'status', 'po_status_created_idx')
+
+    def test_customer_email_list(self):
+        self.create_orders(3)
+        self.assert_endpoint_uses(
+            '/api/sales-orders/?customer_email=customer@example.com', 'inventory_salesorder', 'customer_email', 'so_email_created_idx',
+        )
+
+
+# Incremental analytics rollups
+class RollupTests(InventoryTestCase):
+    # An order stamped just before a run but committed after it is picked up by the next run
+    def test_late_commit_is_rolled_up(self):
+        _, (first, late) = self.create_orders(2)
+        SalesOrder.objects.filter(pk=first.pk).update(status='Fulfilled')
+        refresh_rollups()
+        day = DailyRollup.objects.get()
+        self.assertEqual(day.sales_orders, 1)
+
+        SalesOrder.objects.filter(pk=late.pk).update(status='Fulfilled', updated_at=day.refreshed_at - timedelta(seconds=30))
+        refresh_rollups()
+        day = DailyRollup.objects.get()  # Rebuilt days are replaced
+        self.assertEqual((day.sales_orders, day.units_sold), (2, 6))
+
+    # Deleting a rolled-up order leaves no timestamp behind - its day is marked and rebuilt by the next run
+    def test_deleted_orders_are_rolled_back(self):
+        purchase_orders, sales_orders = self.create_orders(2)
+        SalesOrder.objects.update(status='Fulfilled')
+        PurchaseOrder.objects.update(status='Received')
+        refresh_rollups()
+        day = DailyRollup.objects.get()
+        self.assertEqual((day.sales_orders, day.purchase_orders), (2, 2))
+
+        sales_orders[0].delete()
+        purchase_orders[0].delete()
+        refresh_rollups()
+        day = DailyRollup.objects.get()
+        self.assertEqual((day.sales_orders, day.units_sold, day.revenue), (1, 3, 60))
+        self.assertEqual((day.purchase_orders, day.units_purchased, day.purchase_spend), (1, 15, 120))
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+
+# Conditional GET on detail endpoints
+class ConditionalDetailTests(InventoryTestCase):
+    # A malformed id is a 404, as without the validator lookup
+    def test_malformed_id_is_not_found(self):
+        for url in ['/api/products/abc/', '/api/variations/abc/', '/api/suppliers/abc/', '/api/purchase-orders/abc/',
+                    '/api/sales-orders/abc/', '/api/stock-movements/abc/']:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unchanged_detail_is_not_modified(self):
+        url = f'/api/variations/{self.variations[0].pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    # Deleting an embedded variation that is not the newest leaves max(updated_at) alone - the count must move
+    def test_deleting_nested_variation_changes_validators(self):
+        self.create_orders(2)
+        urls = ['/api/products/', f'/api/products/{self.variations[0].product_id}/', '/api/purchase-orders/',
+                '/api/sales-orders/']
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        self.variations[0].delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+
+
+# Serialization timing comes from the project's serializer bases, not from patching DRF
+class SerializationTimingTests(InventoryTestCase):
+    def test_drf_is_not_patched(self):
+        self.assertEqual(serializers.BaseSerializer.data.fget.__module__, 'rest_framework.serializers')
+
+    def test_nested_output_is_timed_once(self):
+        purchase_orders, _ = self.create_orders(3)
+        with measure() as stats:
+            data = PurchaseOrderSerializer(purchase_orders, many=True).data
+        self.assertEqual(len(data), 3)
+        self.assertGreater(stats.serialize_seconds, 0)
+        self.assertFalse(stats.serializing)
+
+    def test_request_reports_serialize_time(self):
+        timing = self.client.get(f'/api/suppliers/{self.supplier.pk}/')['Server-Timing']
+        self.assertRegex(timing, r'serialize;dur=\d+\.\d')
+
+
+# Read-replica routing - 'replica' mirrors the default test database, so both aliases see the same rows and the
+# tests check which connection each query went to. Transactions are committed so the second connection sees them
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.supplier = Supplier.objects.create(name='Acme', email='acme@example.com', phone='555-0100')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    # Run fn and return ({alias: number of queries}, its result)
+    def queries_per_alias(self, fn):
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica']) as replica:
+            result = fn()
+        return {'default': len(primary), 'replica': len(replica)}, result
+
+    def test_safe_request_reads_from_replica(self):
+        counts, response = self.queries_per_alias(lambda: self.client.get('/api/suppliers/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['name'], 'Acme')
+        self.assertEqual(counts['default'], 0)
+        self.assertGreater(counts['replica'], 0)
+
+    def test_unsafe_request_uses_primary(self):
+        counts, response = self.queries_per_alias(
+            lambda: self.client.patch(f'/api/suppliers/{self.supplier.pk}/', {'name': 'Acme Ltd'}, format='json')
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(counts['replica'], 0)
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        def request():
+            with replica_reads():
+                before = Supplier.objects.get(pk=self.supplier.pk).name
+                Supplier.objects.filter(pk=self.supplier.pk).update(name='Acme Ltd')
+                return before, self.queries_per_alias(lambda: Supplier.objects.get(pk=self.supplier.pk).name)
+
+        counts, (before, (after_counts, after)) = self.queries_per_alias(request)
+        self.assertEqual((before, after), ('Acme', 'Acme Ltd'))
+        self.assertEqual(counts['replica'], 1)  # Only the read before the write
+        self.assertEqual(after_counts, {'default': 1, 'replica': 0})
+
+    def test_reads_in_a_transaction_use_primary(self):
+        def request():
+            with replica_reads(), transaction.atomic():
+                return Supplier.objects.count()
+        counts, total = self.queries_per_alias(request)
+        self.assertEqual(total, 1)
+        self.assertEqual(counts['replica'], 0)
+
+    def test_reads_outside_requests_use_primary(self):
+        counts, total = self.queries_per_alias(Supplier.objects.count)
+        self.assertEqual((total, counts), (1, {'default': 1, 'replica': 0}))
+
+
+# The async read endpoints are served by the ASGI service's URLconf only
+class AsyncRoutesTests(InventoryTestCase):
+    def get_stock(self):
+        token = AccessToken.for_user(self.admin)
+        return Client().get('/api/async/stock/TSHIRT-S/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_not_mounted_under_wsgi(self):
+        self.assertEqual(self.get_stock().status_code, 404)
+
+    @override_settings(ROOT_URLCONF='backend.urls_asgi')
+    def test_served_by_asgi_urlconf(self):
+        response = self.get_stock()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stock_level'], 100)
+
+
+# Asynchronous fulfillment - PATCH with Prefer: respond-async, drained by Celery (CELERY_TASK_ALWAYS_EAGER in settings_test)
+class AsyncFulfillmentTests(InventoryTestCase):
+    def patch_fulfilled(self, order, **headers):
+        return self.client.patch(f'/api/sales-orders/{order.pk}/', {'status': 'Fulfilled'}, format='json', **headers)
+
+    def test_patch_queues_and_answers_accepted(self):
+        _, (order,) = self.create_orders(1)
+        response = self.patch_fulfilled(order, HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Preference-Applied'], 'respond-async')
+        job = response.json()
+        self.assertEqual((job['sales_order'], job['status']), (order.pk, 'Queued'))
+        self.assertTrue(response['Location'].endswith(f'/api/sales-orders/fulfillment-jobs/{job["id"]}/'))
+
+        status = self.client.get(response['Location']).json()  # The eager drain ran before the response
+        self.assertEqual((status['status'], status['error']), ('Fulfilled', ''))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Fulfilled')
+
+    def test_drain_fulfills_and_writes_ledger(self):
+        _, orders = self.create_orders(3)
+        jobs = [queue_fulfillment(order.pk) for order in orders]
+        self.assertEqual(drain_fulfillments(batch_size=2), {'batches': 2, 'fulfilled': 3, 'failed': 0})
+        self.assertEqual(set(FulfillmentJob.objects.filter(pk__in=[job.pk for job in jobs]).values_list('status', flat=True)), {'Fulfilled'})
+        self.assertEqual(set(SalesOrder.objects.values_list('status', flat=True)), {'Fulfilled'})
+        self.assertEqual(list(ProductVariation.objects.order_by('id').values_list('stock_level', flat=True)), [97, 97, 97])
+        movements = StockMovement.objects.filter(reason='Fulfillment')
+        self.assertEqual(movements.count(), 9)
+        self.assertEqual(set(movements.values_list('sales_order_id', flat=True)), {order.pk for order in orders})
+
+    def test_short_stock_fails_with_synchronous_error(self):
+        _, (sync_order, async_order) = self.create_orders(2)
+        SalesOrderItem.objects.filter(product_variation=self.variations[0]).update(quantity_sold=500)
+        expected = self.patch_fulfilled(sync_order).json()
+        self.assertEqual(expected, ['Insufficient stock for TSHIRT-S'])
+
+        job = self.client.get(self.patch_fulfilled(async_order, HTTP_PREFER='respond-async')['Location']).json()
+        self.assertEqual((job['status'], job['error']), ('Failed', expected[0]))
+        self.assertIsNotNone(job['finished_at'])
+        self.assertEqual(SalesOrder.objects.get(pk=async_order.pk).status, 'Pending')
+        self.assertEqual(list(ProductVariation.objects.order_by('id').values_list('stock_level', flat=True)), [100, 100, 100])
+
+    # A drain already waiting holds back the eager one, so the first job is still queued when the order is PATCHed again
+    def test_requeue_returns_queued_job(self):
+        _, (order,) = self.create_orders(1)
+        cache.set(DRAIN_QUEUED_KEY, 1)
+        self.addCleanup(cache.delete, DRAIN_QUEUED_KEY)
+        first = self.patch_fulfilled(order, HTTP_PREFER='respond-async').json()
+        again = self.patch_fulfilled(order, HTTP_PREFER='respond-async').json()
+        self.assertEqual((again['id'], again['status']), (first['id'], 'Queued'))
+        self.assertEqual(queue_fulfillment(order.pk).pk, first['id'])
+        self.assertEqual(FulfillmentJob.objects.filter(sales_order=order).count(), 1)
+
+    def test_without_preference_fulfills_in_request(self):
+        _, (order,) = self.create_orders(1)
+        response = self.patch_fulfilled(order)
+        self.assertEqual((response.status_code, response.json()['status']), (200, 'Fulfilled'))
+        self.assertFalse(FulfillmentJob.objects.exists())
+
+    def test_unknown_job_is_not_found(self):
+        self.assertEqual(self.client.get('/api/sales-orders/fulfillment-jobs/999/').status_code, 404)
+
+
+# The same path through a real broker and worker - Celery's in-memory transport stands in for Redis, and a worker
+# thread runs the drains. Rows are committed so the worker's connection sees them
+class BrokerFulfillmentTests(TransactionTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        product = Product.objects.create(name='T-Shirt', category='Apparel', description='Cotton tee', price=20)
+        self.variation = ProductVariation.objects.create(product=product, sku_code='TSHIRT-M', attributes={'size': 'M'}, stock_level=100)
+        self.orders = [SalesOrder.objects.create(customer_email='customer@example.com') for _ in range(5)]
+        for order in self.orders:
+            SalesOrderItem.objects.create(sales_order=order, product_variation=self.variation, quantity_sold=2, sale_price_per_unit=20)
+
+    def test_worker_drains_queued_orders(self):
+        self.addCleanup(setattr, app.conf, 'task_always_eager', app.conf.task_always_eager)
+        app.conf.task_always_eager = False  # Through the broker configured in settings_test (memory://)
+        with start_worker(app, pool='solo', perform_ping_check=False):
+            locations = []
+            for order in self.orders:
+                response = self.client.patch(f'/api/sales-orders/{order.pk}/', {'status': 'Fulfilled'}, format='json', HTTP_PREFER='respond-async')
+                self.assertEqual(response.status_code, 202)
+                locations.append(response['Location'])
+            drain_fulfillment_queue.delay().get(timeout=10)  # The solo worker runs tasks in order - earlier drains are done
+        self.assertEqual({self.client.get(location).json()['status'] for location in locations}, {'Fulfilled'})
+        self.variation.refresh_from_db()
+        self.assertEqual(self.variation.stock_level, 90)
+
+
+# Stock reservations - a pending order holds its stock from creation until fulfilled, deleted or expired
+class ReservationTests(InventoryTestCase):
+    # POST payload for a pending order of `quantity` units of each variation
+    def order_payload(self, quantity, variations=None):
+        return {
+            'customer_email': 'customer@example.com',
+            'items_data': [
+                {'product_variation': variation.pk, 'quantity_sold': quantity, 'sale_price_per_unit': '20.00'}
+                for variation in variations or self.variations
+            ],
+        }
+
+    def held(self, variation):
+        return sum(StockReservation.objects.filter(product_variation=variation, status='Held').values_list('quantity', flat=True))
+
+    # Sum of the variation's shards - (allotted, reserved)
+    def shard_totals(self, variation):
+        rows = ReservationShard.objects.filter(product_variation=variation)
+        return sum(row.allotted for row in rows), sum(row.reserved for row in rows)
+
+    def test_create_reserves_and_refuses_short_orders(self):
+        response = self.client.post('/api/sales-orders/', self.order_payload(60), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([self.held(variation) for variation in self.variations], [60, 60, 60])
+
+        response = self.client.post('/api/sales-orders/', self.order_payload(50, self.variations[:1]), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), ['Insufficient stock for TSHIRT-S'])
+        self.assertEqual(SalesOrder.objects.count(), 1)  # The short order isn't created
+        self.assertEqual(self.held(self.variations[0]), 60)
+
+    def test_fulfillment_converts_reservation(self):
+        order_id = self.client.post('/api/sales-orders/', self.order_payload(60), format='json').json()['id']
+        response = self.client.patch(f'/api/sales-orders/{order_id}/', {'status': 'Fulfilled'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(StockReservation.objects.values_list('status', flat=True)), {'Converted'})
+        for variation in self.variations:
+            variation.refresh_from_db()
+            self.assertEqual(variation.stock_level, 40)
+            self.assertEqual(self.shard_totals(variation), (40, 0))
+
+    def test_delete_releases_reservation(self):
+        order_id = self.client.post('/api/sales-orders/', self.order_payload(60), format='json').json()['id']
+        self.assertEqual(self.client.delete(f'/api/sales-orders/{order_id}/').status_code, 204)
+        self.assertEqual(self.held(self.variations[0]), 0)
+        self.assertEqual(self.shard_totals(self.variations[0]), (100, 0))
+        response = self.client.post('/api/sales-orders/', self.order_payload(100), format='json')
+        self.assertEqual(response.status_code, 201)  # The released stock can be reserved again
+
+    def test_release_expired(self):
+        first = self.client.post('/api/sales-orders/', self.order_payload(30), format='json').json()['id']
+        self.client.post('/api/sales-orders/', self.order_payload(20), format='json')
+        StockReservation.objects.filter(sales_order_id=first).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired(), 3)
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(SalesOrder.objects.get(pk=first).status, 'Pending')  # The order outlives its hold
+        self.assertEqual([self.held(variation) for variation in self.variations], [20, 20, 20])
+        self.assertEqual(self.shard_totals(self.variations[0]), (100, 20))
+
+    # However reservations spread over shards, the shards add up to the stock and their reserved units to the held ones
+    def test_rebalance_keeps_shard_sums(self):
+        variation = self.variations[0]
+        ProductVariation.objects.filter(pk=variation.pk).update(reservation_shards=4)
+        sales_orders = [SalesOrder.objects.create(customer_email='customer@example.com') for _ in range(12)]
+        with transaction.atomic():
+            self.assertEqual(reserve_orders({order.pk: {variation.pk: 8} for order in sales_orders}), {})  # 96 of 100
+        self.assertEqual(self.shard_totals(variation), (100, 96))
+
+        ProductVariation.objects.filter(pk=variation.pk).update(stock_level=150, reservation_shards=3)
+        with transaction.atomic():
+            rebalance([variation.pk])
+        self.assertEqual(self.shard_totals(variation), (150, 96))
+        held = {
+            shard: sum(StockReservation.objects.filter(product_variation=variation, shard=shard).values_list('quantity', flat=True))
+            for shard in range(4)
+        }
+        for row in ReservationShard.objects.filter(product_variation=variation):
+            self.assertEqual(row.reserved, held[row.shard])
+            self.assertGreaterEqual(row.allotted, row.reserved)
+        self.assertEqual(ReservationShard.objects.get(product_variation=variation, shard=3).allotted, held[3])  # Draining
+
+    # Orders refused for stock are reported at their own payload index, next to the invalid ones
+    def test_bulk_reports_short_orders_at_their_index(self):
+        payload = [
+            {'customer_email': 'not-an-email', 'items_data': []},
+            {'customer_email': 'customer@example.com', 'status': 'Unknown'},
+            self.order_payload(10),
+            self.order_payload(200),
+            self.order_payload(80, self.variations[:1]),
+            self.order_payload(20, self.variations[:1]),
+        ]
+        response = self.client.post('/api/sales-orders/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual([error['index'] for error in body['errors']], [0, 1, 3, 5])
+        self.assertEqual(body['errors'][2]['errors'], {'items_data': ['Insufficient stock for TSHIRT-S']})
+        self.assertEqual(body['errors'][3]['errors'], {'items_data': ['Insufficient stock for TSHIRT-S']})
+        self.assertEqual(len(body['created']), 2)
+        self.assertEqual(set(SalesOrder.objects.values_list('id', flat=True)), set(body['created']))
+        self.assertEqual([self.held(variation) for variation in self.variations], [90, 10, 10])
+
+
+# Product / SKU search on the SearchPosting tables (the SQLite test database) - matching, ranking and the backfill
+class SearchTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Product.objects.create(name='Wireless Mouse', category='Electronics', description='Ergonomic optical mouse', price=25)
+        Product.objects.create(name='Mouse Pad', category='Accessories', description='Cloth pad for any mouse', price=5)
+        Product.objects.create(name='Keyboard', category='Electronics', description='Wireless mechanical keyboard', price=60)
+
+    def labels(self, query, kind=None):
+        return [result['label'] for result in search(query, kind)]
+
+    def test_label_outranks_category_and_description(self):
+        self.assertEqual(self.labels('wireless'), ['Wireless Mouse', 'Keyboard'])
+        self.assertEqual(self.labels('electronics'), ['Wireless Mouse', 'Keyboard'])  # Equal scores rank by entry id
+        self.assertEqual(self.labels('mouse'), ['Wireless Mouse', 'Mouse Pad'])  # Keyboard doesn't mention it
+
+    # An entry matching more of the query words ranks first, however the others score
+    def test_more_words_matched_ranks_first(self):
+        self.assertEqual(self.labels('wireless mouse')[0], 'Wireless Mouse')
+        self.assertEqual(self.labels('tshirt m')[0], 'TSHIRT-M')
+
+    def test_prefix_and_typo_matches(self):
+        self.assertEqual(self.labels('keyb'), ['Keyboard'])  # Prefix
+        self.assertEqual(self.labels('keybaord'), ['Keyboard'])  # Transposition
+        self.assertEqual(self.labels('wireles mous')[0], 'Wireless Mouse')  # Deletion + prefix
+        self.assertEqual(self.labels('zzzz'), [])
+
+    def test_kind_and_endpoint(self):
+        self.assertEqual(self.labels('tshirt', kind='variation'), ['TSHIRT-S', 'TSHIRT-M', 'TSHIRT-L'])
+        self.assertEqual(self.labels('tshirt', kind='product'), ['T-Shirt'])
+        response = self.client.get('/api/search/', {'q': 'wireles', 'type': 'product', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(result['type'], result['label']) for result in response.json()['results']], [('product', 'Wireless Mouse')])
+
+    # The 0011 backfill builds the same index the signals do
+    def test_migration_backfill_matches_live_index(self):
+        expected = {query: search(query) for query in ('wireless mouse', 'keybaord', 'tshirt m', 'cotton')}
+        SearchEntry.objects.all().delete()
+        SearchTermVariant.objects.all().delete()
+        self.assertEqual(search('wireless'), [])
+        migration = importlib.import_module('inventory.migrations.0011_search_index')
+        migration.backfill_search_index(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(
+            [(result['type'], result['label'], result['score']) for result in search('wireless mouse')],
+            [(result['type'], result['label'], result['score']) for result in expected['wireless mouse']],
+        )
+        for query, results in expected.items():
+            with self.subTest(query=query):
+                self.assertEqual([result['label'] for result in search(query)], [result['label'] for result in results])
+
+    # Latency on a few thousand entries - common words are capped at MAX_POSTINGS_PER_TERM postings
+    def test_latency_on_a_larger_catalogue(self):
+        words = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel']
+        Product.objects.bulk_create([
+            Product(name=f'{words[index % 8]} {words[index // 8 % 8]} gadget {index}', category=words[index % 5],
+                    description=f'{words[index // 64 % 8]} widget', price=1)
+            for index in range(3000)
+        ])
+        rebuild_index()
+        for query in ('gadget', 'alpha bravo gadget', 'charlei widget', 'foxt'):
+            started = time.perf_counter()
+            results = search(query)
+            elapsed = time.perf_counter() - started
+            with self.subTest(query=query):
+                self.assertEqual(len(results), 20)
+                self.assertLess(elapsed, 0.5)
+
+
+# Cached principals - fixed query counts for the admin lists and token-authenticated requests, and invalidation on
+# every change to a user's groups and permissions
+class PrincipalTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user('clerk', 'clerk@example.com', 'clerk')
+        cls.group = Group.objects.create(name='Viewers')
+        cls.view_product = Permission.objects.get(codename='view_product')
+
+    # Users and groups with a few permissions each - the lists must not grow a query per row
+    def add_accounts(self, count):
+        permissions = list(Permission.objects.order_by('id')[:4])
+        for index in range(count):
+            group = Group.objects.create(name=f'group-{Group.objects.count()}')
+            group.permissions.set(permissions)
+            User.objects.create_user(f'user-{User.objects.count()}').groups.set([group, self.group])
+
+    def test_user_and_group_lists_run_fixed_queries(self):
+        for accounts in (2, 10):
+            self.add_accounts(accounts)
+            with self.subTest(accounts=accounts):
+                with self.assertNumQueries(3):  # Users, their groups, the groups' permissions
+                    self.assertEqual(self.client.get('/api/users/').status_code, 200)
+                with self.assertNumQueries(2):  # Groups, their permissions
+                    self.assertEqual(self.client.get('/api/groups/').status_code, 200)
+
+    # A token-authenticated request costs no queries for the caller once the principal is cached
+    def test_authenticated_request_runs_fixed_queries(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        url = f'/api/suppliers/{self.supplier.pk}/'
+        client.get(url)  # Fills the principal cache
+        with self.assertNumQueries(2):  # The validator lookup and the supplier - nothing for authentication
+            self.assertEqual(client.get(url).status_code, 200)
+
+    def assert_can_view_product(self, expected, change):
+        self.assertEqual(load_principal(self.user.pk).has_perm('inventory.view_product'), not expected)  # Cached
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(load_principal(self.user.pk).has_perm('inventory.view_product'), expected)
+
+    def test_user_permission_changes_invalidate(self):
+        self.assert_can_view_product(True, lambda: self.user.user_permissions.add(self.view_product))
+        self.assert_can_view_product(False, lambda: self.view_product.user_set.remove(self.user))
+        self.assert_can_view_product(True, lambda: self.view_product.user_set.add(self.user))
+        self.assert_can_view_product(False, lambda: self.view_product.user_set.clear())
+
+    def test_group_membership_changes_invalidate(self):
+        self.group.permissions.add(self.view_product)
+        self.assert_can_view_product(True, lambda: self.user.groups.add(self.group))
+        self.assert_can_view_product(False, lambda: self.user.groups.clear())
+        self.assert_can_view_product(True, lambda: self.group.user_set.add(self.user))
+        self.assert_can_view_product(False, lambda: self.group.user_set.clear())
+
+    def test_group_permission_changes_invalidate(self):
+        self.user.groups.add(self.group)
+        self.assert_can_view_product(True, lambda: self.group.permissions.add(self.view_product))
+        self.assert_can_view_product(False, lambda: self.view_product.group_set.remove(self.group))
+        self.assert_can_view_product(True, lambda: self.view_product.group_set.add(self.group))
+        self.assert_can_view_product(False, lambda: self.view_product.group_set.clear())
+        self.assert_can_view_product(True, lambda: self.group.permissions.set([self.view_product]))
+        self.assert_can_view_product(False, lambda: self.group.delete())
+
+
+# Low stock alerts - one digest per warehouse manager, each crossing alerted once until the SKU is restocked
+class LowStockAlertTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        managers = Group.objects.create(name='Warehouse Manager')
+        for username, email in (('north', 'north@example.com'), ('south', 'south@example.com'), ('noemail', '')):
+            User.objects.create_user(username, email).groups.add(managers)
+        User.objects.create_user('clerk', 'clerk@example.com')  # Not a manager
+
+    def set_stock(self, variation, stock_level):
+        ProductVariation.objects.filter(pk=variation.pk).update(stock_level=stock_level)
+
+    def alerted(self):
+        return set(ProductVariation.objects.filter(low_stock_alerted=True).values_list('sku_code', flat=True))
+
+    def run_check(self):
+        with redirect_stdout(io.StringIO()):
+            return check_low_stock()
+
+    def test_one_digest_per_manager(self):
+        self.set_stock(self.variations[0], 5)
+        self.set_stock(self.variations[1], 10)
+        self.run_check()
+        self.assertEqual(sorted(message.to for message in mail.outbox), [['north@example.com'], ['south@example.com']])
+        for message in mail.outbox:
+            self.assertEqual(message.subject, 'Low Stock Alert: 2 SKUs')
+            self.assertIn("'TSHIRT-S' is at 5 units (Reorder level is 10).", message.body)
+            self.assertIn("'TSHIRT-M' is at 10 units", message.body)
+            self.assertNotIn('TSHIRT-L', message.body)
+        self.assertEqual(self.alerted(), {'TSHIRT-S', 'TSHIRT-M'})
+
+    def test_next_run_does_not_alert_again(self):
+        self.set_stock(self.variations[0], 5)
+        self.run_check()
+        self.run_check()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_restock_then_drop_alerts_again(self):
+        self.set_stock(self.variations[0], 5)
+        self.run_check()
+        self.set_stock(self.variations[0], 50)
+        self.run_check()
+        self.assertEqual(len(mail.outbox), 2)  # Restocking sends nothing
+        self.assertEqual(self.alerted(), set())  # but re-arms the SKU
+
+        self.set_stock(self.variations[0], 3)
+        self.run_check()
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertIn("'TSHIRT-S' is at 3 units", mail.outbox[-1].body)
+        self.assertEqual(self.alerted(), {'TSHIRT-S'})
+
+    # The flag records an alert that went out - without one the next run must try again
+    def test_flag_not_set_when_no_mail_was_sent(self):
+        self.set_stock(self.variations[0], 5)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', return_value=0):
+            self.run_check()
+        self.assertEqual(self.alerted(), set())
+
+        Group.objects.get(name='Warehouse Manager').delete()
+        self.run_check()
+        self.assertEqual((len(mail.outbox), self.alerted()), (0, set()))
+
+
+# Reorder level forecast against answers worked by hand - z(0.95) = 1.6449
+#   TSHIRT-S: 5 units on 4 of 10 days -> rate 2, var (100 - 20 * 2) / 9 = 6.667; leads 3 and 5 days -> 4, var 2
+#             8 + 1.6449 * sqrt(4 * 6.667 + 4 * 2) = 8 + 9.685 -> 18
+#   TSHIRT-M: 3 units each of 10 days -> rate 3, var 0; never received, so the lead of all receipts (4, var 2)
+#             12 + 1.6449 * sqrt(9 * 2) = 12 + 6.979 -> 19
+#   TSHIRT-L: no sales -> 0
+class ForecastTests(InventoryTestCase):
+    def test_reorder_levels_known_answer(self):
+        levels = reorder_levels(
+            history_days=np.array([10.0, 10.0, 10.0]), demand_total=np.array([20.0, 30.0, 0.0]),
+            demand_squares=np.array([100.0, 90.0, 0.0]), lead_count=np.array([2.0, 0.0, 0.0]),
+            lead_total=np.array([8.0, 0.0, 0.0]), lead_squares=np.array([34.0, 0.0, 0.0]),
+            service_level=0.95, default_lead_days=7,
+        )
+        self.assertEqual(levels.tolist(), [18, 19, 0])
+
+    # Before any receipt every SKU uses the default lead time with no lead variance: 2 units a day * 7 days
+    def test_default_lead_time(self):
+        levels = reorder_levels(
+            np.array([10.0]), np.array([20.0]), np.array([40.0]), np.zeros(1), np.zeros(1), np.zeros(1), 0.95, 7,
+        )
+        self.assertEqual(levels.tolist(), [14])
+
+    # The same answer from order history - sales per day, and lead times from the ledger's receipt entries
+    @override_settings(FORECAST_MIN_HISTORY_DAYS=1)
+    def test_refresh_from_history(self):
+        now = timezone.now()
+        small, medium, large = self.variations
+        ProductVariation.objects.update(created_at=now - timedelta(days=10))
+
+        def sell(variation, quantity, days_ago):
+            order = SalesOrder.objects.create(customer_email='customer@example.com')
+            SalesOrderItem.objects.create(sales_order=order, product_variation=variation, quantity_sold=quantity, sale_price_per_unit=20)
+            SalesOrder.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=days_ago, hours=1))
+
+        for days_ago in (1, 3, 5, 7):
+            sell(small, 5, days_ago)
+        for days_ago in range(10):
+            sell(medium, 3, days_ago)
+        for created_days_ago, lead_days in ((9, 3), (8, 5)):
+            order = PurchaseOrder.objects.create(supplier=self.supplier, status='Received')
+            PurchaseOrderItem.objects.create(purchase_order=order, product_variation=small, quantity_ordered=10, cost_per_unit=8)
+            PurchaseOrder.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=created_days_ago))
+            movement = StockMovement.objects.create(product_variation=small, quantity=10, reason='Receipt', purchase_order=order)
+            StockMovement.objects.filter(pk=movement.pk).update(created_at=now - timedelta(days=created_days_ago - lead_days))
+
+        report = refresh_reorder_levels(now)
+        self.assertEqual((report['skus'], report['updated']), (3, 3))
+        self.assertEqual(
+            list(ProductVariation.objects.order_by('id').values_list('reorder_level', flat=True)), [18, 19, 0],
+        )
+
+
+# Versioned catalogue cache - every kind of catalogue write moves the CATALOGUE version once it commits, so a
+# cached response is never served after it
+class CatalogueCacheTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    # Cache a response for url, make a change, then read url again - returns (body before, body after)
+    def read_around(self, url, change):
+        before = self.client.get(url).json()
+        self.assertEqual(self.client.get(url).json(), before)
+        self.assertEqual(cache_stats(CATALOGUE)['hits'], 1)  # The second read came from the cache
+        version = namespace_version(CATALOGUE)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertGreater(namespace_version(CATALOGUE), version)
+        return before, self.client.get(url).json()
+
+    def test_product_save_invalidates(self):
+        product = self.variations[0].product
+
+        def rename():
+            product.name = 'Tee'
+            product.save()
+        before, after = self.read_around('/api/products/', rename)
+        self.assertEqual((before['results'][0]['name'], after['results'][0]['name']), ('T-Shirt', 'Tee'))
+
+    def test_variation_delete_invalidates(self):
+        before, after = self.read_around(f'/api/products/{self.variations[0].product_id}/', self.variations[2].delete)
+        self.assertEqual((len(before['variations']), len(after['variations'])), (3, 2))
+
+    # Stock changes are queryset updates that bypass post_save - receipt must invalidate by itself
+    def test_receipt_invalidates(self):
+        purchase_order = self.create_orders(1)[0][0]
+        url = f'/api/variations/{self.variations[0].pk}/'
+        before, after = self.read_around(url, lambda: self.client.patch(
+            f'/api/purchase-orders/{purchase_order.pk}/', {'status': 'Received'}, format='json',
+        ))
+        self.assertEqual((before['stock_level'], after['stock_level']), (100, 105))
+
+    def test_unrelated_write_keeps_version(self):
+        version = namespace_version(CATALOGUE)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/suppliers/{self.supplier.pk}/', {'phone': '555-0199'}, format='json')
+        self.assertEqual(namespace_version(CATALOGUE), version)
+
+
+# Catalogue import from the feeds in testdata/ - parsing, row errors, upserts on sku_code and progress reports
+class ImportTests(InventoryTestCase):
+    CSV = Path(__file__).parent / 'testdata' / 'catalogue.csv'
+    NDJSON = Path(__file__).parent / 'testdata' / 'catalogue.ndjson'
+
+    def import_file(self, path, fmt, **kwargs):
+        with path.open('rb') as stream:
+            return import_catalogue(stream, fmt, **kwargs)
+
+    def variation(self, sku_code):
+        return ProductVariation.objects.select_related('product').get(sku_code=sku_code)
+
+    def test_csv_upserts_and_reports_row_errors(self):
+        report = self.import_file(self.CSV, 'csv')
+        self.assertEqual(
+            {field: report[field] for field in ('rows', 'products_created', 'variations_created', 'variations_updated', 'error_count')},
+            {'rows': 6, 'products_created': 2, 'variations_created': 3, 'variations_updated': 1, 'error_count': 2},
+        )
+        self.assertEqual([(error['line'], list(error['errors'])) for error in report['errors']], [(5, ['price']), (6, ['attributes'])])
+        self.assertEqual(report['errors'][1]['errors']['attributes'], ['Must be a JSON object.'])
+
+        existing = self.variation('TSHIRT-S')  # Upserted on sku_code - stock replaced, omitted reorder level kept
+        self.assertEqual((existing.pk, existing.stock_level, existing.reorder_level), (self.variations[0].pk, 120, 10))
+        self.assertEqual(existing.product.price, 22)
+        self.assertEqual(
+            list(StockMovement.objects.filter(product_variation=existing).values_list('quantity', 'reason')), [(20, 'Adjustment')],
+        )
+        hoodie = self.variation('HOODIE-M')
+        self.assertEqual(
+            (hoodie.product.name, hoodie.attributes, hoodie.stock_level, hoodie.reorder_level),
+            ('Hoodie', {'size': 'M', 'color': 'grey'}, 30, 8),
+        )
+        self.assertEqual(self.variation('SOCKS-2').product.description, 'Wool socks')
+        self.assertFalse(ProductVariation.objects.filter(sku_code__in=['HOODIE-L', 'SOCKS-1']).exists())
+
+        again = self.import_file(self.CSV, 'csv')  # The same feed again changes nothing
+        self.assertEqual((again['variations_created'], again['variations_updated'], again['variations_unchanged']), (0, 0, 4))
+
+    def test_ndjson_parsing_and_errors(self):
+        report = self.import_file(self.NDJSON, 'ndjson')
+        self.assertEqual(
+            (report['rows'], report['variations_created'], report['variations_unchanged'], report['error_count']), (5, 1, 1, 3),
+        )
+        self.assertEqual(
+            [(error['line'], error['errors']) for error in report['errors'][:2]],
+            [(3, {'row': ['Not a JSON object.']}), (4, {'row': ['Not a JSON object.']})],
+        )
+        self.assertEqual((report['errors'][2]['line'], list(report['errors'][2]['errors'])), (6, ['stock_level']))
+        cap = self.variation('CAP-1')
+        self.assertEqual((cap.product.category, cap.stock_level, cap.attributes), ('General', 15, {'color': 'red'}))
+
+    # Progress after every chunk and once at the end - 4 valid rows in chunks of 2
+    def test_progress_after_each_chunk(self):
+        reports = []
+        self.import_file(self.CSV, 'csv', chunk_size=2, progress=lambda report: reports.append(dict(report)))
+        self.assertEqual([(report['rows'], report['variations_created'] + report['variations_updated']) for report in reports],
+                         [(2, 2), (6, 4), (6, 4)])
+
+    def test_task_publishes_progress_and_deletes_upload(self):
+        with TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            name = default_storage.save('imports/catalogue.csv', ContentFile(self.CSV.read_bytes()))
+            states = []
+            with mock.patch.object(import_catalogue_file, 'update_state', side_effect=lambda **kwargs: states.append(
+                (kwargs['state'], kwargs['meta']['rows'])
+            )):
+                report = import_catalogue_file.apply(args=(name, 'csv')).get()
+            self.assertFalse(default_storage.exists(name))
+        self.assertEqual(states, [('PROGRESS', 6)])
+        self.assertEqual((report['variations_created'], report['error_count']), (3, 2))
+
+    def test_upload_is_imported(self):
+        with TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with self.NDJSON.open('rb') as feed:
+                response = self.client.post('/api/products/import/', {'file': feed}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('task_id', response.json())
+        self.assertTrue(ProductVariation.objects.filter(sku_code='CAP-1').exists())  # The eager task ran
+
+    def test_command_prints_progress_and_errors(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_catalogue', str(self.CSV), '--chunk-size', '2', stdout=stdout, stderr=stderr)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[:3], ['2 rows: 1 created, 1 updated, 0 errors', '6 rows: 3 created, 1 updated, 2 errors',
+                                     '6 rows: 3 created, 1 updated, 2 errors'])
+        self.assertIn('Imported 6 rows (2 new products, 3 new and 1 updated variations, 2 errors)', lines[-1])
+        self.assertEqual([line.split(':')[0] for line in stderr.getvalue().splitlines()], ['line 5', 'line 6'])
+
+    def test_command_rejects_unknown_format(self):
+        with self.assertRaises(CommandError):
+            call_command('import_catalogue', str(self.CSV.with_suffix('.xml')))
+
+
+# Streaming exports - the body read from streaming_content (gunzipped when asked) must hold exactly the queryset's rows
+class ExportTests(InventoryTestCase):
+    # (chunks, body) of an export - the body decompressed when gzip is in the query
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        chunks = list(response.streaming_content)
+        body = b''.join(chunks)
+        if 'gzip=true' in url:
+            self.assertEqual(response['Content-Type'], 'application/gzip')
+            self.assertRegex(response['Content-Disposition'], r'\.gz"$')
+            body = gzip.decompress(body)
+        return chunks, body.decode()
+
+    def test_variations_csv(self):
+        _, body = self.export('/api/variations/export/?format=csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        expected = ProductVariation.objects.order_by('created_at', 'id').values_list('id', 'product__name', 'sku_code', 'attributes', 'stock_level')
+        self.assertEqual(
+            [(int(row['id']), row['product_name'], row['sku_code'], json.loads(row['attributes']), int(row['stock_level'])) for row in rows],
+            list(expected),
+        )
+
+    # One line per order line, decimals as strings - fed to the compressor two rows at a time
+    def test_sales_orders_gzip_ndjson(self):
+        self.create_orders(3)
+        with mock.patch('inventory.export.EXPORT_CHUNK_SIZE', 2):
+            _, body = self.export('/api/sales-orders/export/?format=ndjson&gzip=true')
+        rows = [json.loads(line) for line in body.splitlines()]
+        expected = SalesOrderItem.objects.order_by('sales_order__created_at', 'sales_order_id', 'id').values_list(
+            'sales_order_id', 'product_variation__sku_code', 'quantity_sold', 'sale_price_per_unit',
+        )
+        self.assertEqual(
+            [(row['id'], row['sku_code'], row['quantity_sold'], row['sale_price_per_unit']) for row in rows],
+            [(order_id, sku_code, quantity, str(price)) for order_id, sku_code, quantity, price in expected],
+        )
+        self.assertEqual(len(rows), 9)
+
+    def test_purchase_orders_gzip_csv_filtered(self):
+        purchase_orders, _ = self.create_orders(2)
+        PurchaseOrder.objects.filter(pk=purchase_orders[1].pk).update(status='Received')
+        _, body = self.export('/api/purchase-orders/export/?format=csv&gzip=true&status=Received')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual({int(row['id']) for row in rows}, {purchase_orders[1].pk})
+        self.assertEqual([(row['sku_code'], row['cost_per_unit']) for row in rows], [(variation.sku_code, '8.00') for variation in self.variations])
+
+    # No matching rows - a CSV is just its header and an NDJSON file is empty, compressed or not
+    def test_empty_exports(self):
+        for url, expected in (
+            ('/api/sales-orders/export/?format=csv', 'id,customer_email,status,created_at,updated_at,product_variation,sku_code,quantity_sold,sale_price_per_unit\r\n'),
+            ('/api/sales-orders/export/?format=csv&gzip=true', 'id,customer_email,status,created_at,updated_at,product_variation,sku_code,quantity_sold,sale_price_per_unit\r\n'),
+            ('/api/sales-orders/export/?format=ndjson', ''),
+            ('/api/sales-orders/export/?format=ndjson&gzip=true', ''),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.export(url)[1], expected)
+
+
+# ?attr. filters on the VariationAttribute sidecar table (the SQLite test database) follow every write to a SKU
+class AttributeIndexTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def skus(self, query):
+        response = self.client.get(f'/api/variations/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(variation['sku_code'] for variation in response.json()['results'])
+
+    # Writes commit their catalogue invalidation, as outside a test transaction
+    def write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, data, format='json')
+
+    def test_create_update_delete_keep_filters_correct(self):
+        product_id = self.variations[0].product_id
+        response = self.write('post', f'/api/products/{product_id}/variations/', {
+            'sku_code': 'TSHIRT-XL', 'stock_level': 5, 'attributes': {'size': 'XL', 'color': ['red', 'blue'], 'dims': {'w': 10}},
+        })
+        self.assertEqual(response.status_code, 201)
+        variation_id = response.json()['id']
+        self.assertEqual(self.skus('attr.color=blue'), ['TSHIRT-XL'])
+        self.assertEqual(self.skus('attr.size=XL,S'), ['TSHIRT-S', 'TSHIRT-XL'])
+        self.assertEqual(self.skus('attr.dims.w=10&attr.color=red'), ['TSHIRT-XL'])
+
+        self.write('patch', f'/api/variations/{variation_id}/', {'attributes': {'size': 'XL', 'color': 'green'}})
+        self.assertEqual(self.skus('attr.color=blue'), [])
+        self.assertEqual(self.skus('attr.dims.w=10'), [])
+        self.assertEqual(self.skus('attr.color=green'), ['TSHIRT-XL'])
+
+        self.write('patch', f'/api/variations/{variation_id}/', {'stock_level': 50})  # Attributes untouched
+        self.assertEqual(self.skus('attr.color=green'), ['TSHIRT-XL'])
+
+        self.assertEqual(self.write('delete', f'/api/variations/{variation_id}/').status_code, 204)
+        self.assertEqual(self.skus('attr.color=green'), [])
+        self.assertEqual(self.skus('attr.size=XL,S'), ['TSHIRT-S'])
+        self.assertFalse(VariationAttribute.objects.filter(product_variation_id=variation_id).exists())
+
+
+# Bulk order creation - valid orders are created, invalid ones reported at their payload index, and each batch's
+# orders and lines are written in one transaction
+class BulkOrderTests(InventoryTestCase):
+    def purchase_order(self, supplier=None, variation=None, quantity=5):
+        return {
+            'supplier': supplier or self.supplier.pk,
+            'items_data': [{'product_variation': variation or self.variations[0].pk, 'quantity_ordered': quantity, 'cost_per_unit': '8.00'}],
+        }
+
+    def test_mixed_payload_reports_each_error_at_its_index(self):
+        payload = [
+            self.purchase_order(quantity=1),
+            self.purchase_order(supplier=999999),
+            self.purchase_order(variation=999999),
+            self.purchase_order(quantity='many'),
+            self.purchase_order(quantity=2),
+        ]
+        response = self.client.post('/api/purchase-orders/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual([(error['index'], list(error['errors'])) for error in body['errors']],
+                         [(1, ['supplier']), (2, ['items_data']), (3, ['items_data'])])
+        self.assertEqual(body['errors'][0]['errors']['supplier'], ['Invalid pk "999999" - object does not exist.'])
+        self.assertEqual(body['errors'][1]['errors']['items_data'], [{'product_variation': ['Invalid pk "999999" - object does not exist.']}])
+        self.assertIn('quantity_ordered', body['errors'][2]['errors']['items_data'][0])
+
+        # The created orders carry their own lines, in payload order
+        self.assertEqual(
+            [list(PurchaseOrderItem.objects.filter(purchase_order_id=order_id).values_list('quantity_ordered', flat=True))
+             for order_id in body['created']],
+            [[1], [2]],
+        )
+        self.assertEqual(PurchaseOrder.objects.count(), 2)
+
+    def test_statuses(self):
+        for payload, expected_status, created in (
+            ([self.purchase_order(), self.purchase_order()], 201, 2),
+            ([self.purchase_order(supplier=999999)], 400, 0),
+            ({'supplier': self.supplier.pk}, 400, 0),  # Not a list
+        ):
+            with self.subTest(payload=payload):
+                PurchaseOrder.objects.all().delete()
+                response = self.client.post('/api/purchase-orders/bulk/', payload, format='json')
+                self.assertEqual(response.status_code, expected_status)
+                self.assertEqual(PurchaseOrder.objects.count(), created)
+
+    def test_payload_size_is_capped(self):
+        with mock.patch('inventory.bulk.MAX_BULK_ORDERS', 2):
+            response = self.client.post('/api/purchase-orders/bulk/', [self.purchase_order()] * 3, format='json')
+        self.assertEqual((response.status_code, response.json()), (400, ['At most 2 orders per request.']))
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+    # A failure writing the lines takes the orders of the batch with it
+    def test_orders_and_lines_commit_together(self):
+        with mock.patch.object(PurchaseOrderItem.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/api/purchase-orders/bulk/', [self.purchase_order(), self.purchase_order()], format='json')
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+    def test_sales_orders_mixed_payload(self):
+        payload = [
+            {'customer_email': 'a@example.com', 'items_data': [{'product_variation': self.variations[1].pk, 'quantity_sold': 2, 'sale_price_per_unit': '20.00'}]},
+            {'customer_email': 'a@example.com', 'items_data': [{'product_variation': 999999, 'quantity_sold': 1, 'sale_price_per_unit': '20.00'}]},
+        ]
+        response = self.client.post('/api/sales-orders/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1])
+        self.assertEqual(SalesOrderItem.objects.get().quantity_sold, 2)
+
+
+# Point-in-time stock - snapshot plus the movements after it must agree with the full ledger on either side of a
+# snapshot, and with stock_level now
+class StockAtTests(InventoryTestCase):
+    def test_stock_at_across_snapshots(self):
+        now = timezone.now()
+        hours_ago = lambda hours: now - timedelta(hours=hours)
+        variation = self.variations[0]
+        (first_po, second_po), (sales_order, _) = self.create_orders(2)
+        opening = StockMovement.objects.create(product_variation=variation, quantity=100, reason='Adjustment')
+        self.client.patch(f'/api/purchase-orders/{first_po.pk}/', {'status': 'Received'}, format='json')
+        self.client.patch(f'/api/sales-orders/{sales_order.pk}/', {'status': 'Fulfilled'}, format='json')
+        self.client.patch(f'/api/purchase-orders/{second_po.pk}/', {'status': 'Received'}, format='json')
+        # Spread the ledger over the past 10 hours: +100, +5 | snapshot | -1, +5 | snapshot
+        StockMovement.objects.filter(pk=opening.pk).update(created_at=hours_ago(10))
+        StockMovement.objects.filter(purchase_order=first_po).update(created_at=hours_ago(8))
+        StockMovement.objects.filter(sales_order=sales_order).update(created_at=hours_ago(4))
+        StockMovement.objects.filter(purchase_order=second_po).update(created_at=hours_ago(2))
+        for hours in (6, 1):
+            with mock.patch('inventory.tasks.timezone.now', return_value=hours_ago(hours) + SNAPSHOT_LAG):
+                snapshot_stock()
+        self.assertEqual(
+            list(StockSnapshot.objects.filter(product_variation=variation).order_by('taken_at').values_list('stock_level', flat=True)),
+            [105, 109],
+        )
+
+        ledger = StockMovement.objects.filter(product_variation=variation)
+        for hours, expected in ((9, 100), (7, 105), (6, 105), (5, 105), (3, 104), (1.5, 109), (1, 109), (0.5, 109)):
+            at = hours_ago(hours)
+            with self.subTest(hours_ago=hours):
+                self.assertEqual(stock_at(variation.pk, at), expected)
+                self.assertEqual(ledger.filter(created_at__lte=at).aggregate(total=Sum('quantity'))['total'], expected)
+        variation.refresh_from_db()
+        self.assertEqual(stock_at(variation.pk, now), variation.stock_level)
+        response = self.client.get(f'/api/variations/{variation.pk}/stock-at/', {'at': now.isoformat()})
+        self.assertEqual(response.json()['stock_level'], 109)
+
+        # Past a snapshot the ledger before it isn't read - the snapshot alone answers
+        ledger.filter(created_at__lte=hours_ago(6)).delete()
+        self.assertEqual(stock_at(variation.pk, hours_ago(5)), 105)
+        self.assertEqual(stock_at(variation.pk, hours_ago(3)), 104)
+
+
+# Availability cache - a read after a committed fulfillment must not see the value cached before it
+class AvailabilityTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        availability_module._cache.entries.clear()  # Per-process LRU outlives the test's transaction
+
+    def read(self):
+        response = self.client.post('/api/stock/availability/', {'sku_codes': ['TSHIRT-S', 'NOPE']}, format='json')
+        self.assertEqual(response.json()['missing'], ['NOPE'])
+        row = response.json()['results'][0]
+        return row['stock_level'], row['available_to_promise']
+
+    def write(self, method, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300)
+        return response
+
+    def test_read_fulfill_read(self):
+        order = self.write('post', '/api/sales-orders/', {'customer_email': 'customer@example.com', 'items_data': [
+            {'product_variation': self.variations[0].pk, 'quantity_sold': 10, 'sale_price_per_unit': '20.00'},
+        ]}).json()
+        self.assertEqual(self.read(), (100, 90))
+        with self.assertNumQueries(0):  # Served from the process cache
+            self.assertEqual(availability(['TSHIRT-S'])[0][0]['available_to_promise'], 90)
+        self.write('patch', f"/api/sales-orders/{order['id']}/", {'status': 'Fulfilled'})
+        self.assertEqual(self.read(), (90, 90))  # Stock left with the order, the reservation with it
+
+    def test_read_delete_read(self):
+        order = self.write('post', '/api/sales-orders/', {'customer_email': 'customer@example.com', 'items_data': [
+            {'product_variation': self.variations[0].pk, 'quantity_sold': 30, 'sale_price_per_unit': '20.00'},
+        ]}).json()
+        self.assertEqual(self.read(), (100, 70))
+        self.write('delete', f"/api/sales-orders/{order['id']}/")
+        self.assertEqual(self.read(), (100, 100))
+
+
+# Nested variations on the product list (?variations_limit=) and the paginated /api/products/{id}/variations/ action
+class ProductVariationsTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    # Products with 5 variations each, on top of the T-Shirt's 3
+    def create_products(self, count):
+        start = Product.objects.count()  # Keeps names and SKU codes unique across calls
+        for index in range(start, start + count):
+            product = Product.objects.create(name=f'Mug {index}', category='Kitchen', price=8)
+            for size in range(5):
+                ProductVariation.objects.create(product=product, sku_code=f'MUG-{index}-{size}', attributes={'size': size}, stock_level=10)
+
+    def test_variations_limit_keeps_first_variations(self):
+        self.create_products(2)
+        results = self.client.get('/api/products/', {'variations_limit': 2}).json()['results']
+        self.assertEqual([len(product['variations']) for product in results], [2, 2, 2])
+        tshirt = next(product for product in results if product['name'] == 'T-Shirt')
+        self.assertEqual([variation['sku_code'] for variation in tshirt['variations']], ['TSHIRT-S', 'TSHIRT-M'])
+        self.assertEqual(self.client.get('/api/products/', {'variations_limit': 0}).json()['results'][0]['variations'], [])
+
+    def test_variations_limit_is_flat(self):
+        self.create_products(2)
+        expected = self.count_queries('/api/products/?variations_limit=1')
+        self.create_products(10)
+        cache.clear()  # Writes in a TestCase never commit, so the cached page is still served otherwise
+        self.assertEqual(self.count_queries('/api/products/?variations_limit=1'), expected)
+
+    def test_invalid_variations_limit(self):
+        for limit in ('-1', 'two'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/products/', {'variations_limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('variations_limit', response.json())
+
+    def test_variations_action_is_paginated(self):
+        url = f'/api/products/{self.variations[0].product_id}/variations/?page_size=2'
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 2)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        skus = [variation['sku_code'] for variation in first['results'] + second['results']]
+        self.assertEqual(sorted(skus), ['TSHIRT-L', 'TSHIRT-M', 'TSHIRT-S'])
+
+
+# /metrics - a scrape token or an admin, and open to anyone only in DEBUG with no token configured
+class MetricsEndpointTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()  # A plain Django view - no force_authenticate
+        self.clerk = User.objects.create_user('clerk', 'clerk@example.com', 'clerk')
+
+    def scrape(self, authorization=None):
+        headers = {} if authorization is None else {'HTTP_AUTHORIZATION': authorization}
+        return self.client.get('/metrics', **headers).status_code
+
+    def jwt(self, user):
+        return f'Bearer {AccessToken.for_user(user)}'
+
+    def test_closed_without_token_outside_debug(self):
+        self.assertEqual(self.scrape(), 403)
+        self.assertEqual(self.scrape(self.jwt(self.clerk)), 403)
+        self.assertEqual(self.scrape('Bearer garbage'), 403)
+
+    def test_admins_are_served(self):
+        self.assertEqual(self.scrape(self.jwt(self.admin)), 200)
+        self.client.force_login(self.admin)
+        self.assertEqual(self.scrape(), 200)
+
+    @override_settings(DEBUG=True)
+    def test_open_in_debug_without_token(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='s3cret', DEBUG=True)
+    def test_token_is_required_once_set(self):
+        with self.assertLogs('django.request', 'WARNING'):  # Django logs every 401
+            self.assertEqual(self.scrape(), 401)
+            self.assertEqual(self.scrape('Bearer wrong'), 401)
+            self.assertEqual(self.scrape(self.jwt(self.clerk)), 401)
+        self.assertEqual(self.scrape('Bearer s3cret'), 200)
+        self.assertEqual(self.scrape(self.jwt(self.admin)), 200)
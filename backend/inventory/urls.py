@@ -1,7 +1,8 @@
 # URL routing for inventory API endpoints
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, ProductVariationViewSet, SupplierViewSet, PurchaseOrderViewSet, SalesOrderViewSet, GroupViewSet, PermissionViewSet, UserViewSet, current_user
+from . import asyncviews
+from .views import ProductViewSet, ProductVariationViewSet, SupplierViewSet, PurchaseOrderViewSet, SalesOrderViewSet, StockMovementViewSet, AnalyticsViewSet, GroupViewSet, PermissionViewSet, UserViewSet, current_user, response_cache_stats, search_catalogue, stock_availability
 
 # Router automatically generates URL patterns for ViewSets
 router = DefaultRouter()
@@ -10,11 +11,24 @@ router.register(r'variations', ProductVariationViewSet)  # /api/variations/
 router.register(r'suppliers', SupplierViewSet)  # /api/suppliers/
 router.register(r'purchase-orders', PurchaseOrderViewSet)  # /api/purchase-orders/
 router.register(r'sales-orders', SalesOrderViewSet)  # /api/sales-orders/
+router.register(r'stock-movements', StockMovementViewSet)  # /api/stock-movements/
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')  # /api/analytics/
 router.register(r'groups', GroupViewSet)  # /api/groups/
 router.register(r'permissions', PermissionViewSet)  # /api/permissions/
 router.register(r'users', UserViewSet)  # /api/users/
 
+# Async read endpoints - mounted only by the ASGI service (backend.urls_asgi). Their per-event-loop concurrency
+# limit means nothing under WSGI, where each request runs on an event loop of its own
+async_urlpatterns = [
+    path('async/variations/<int:pk>/', asyncviews.variation_detail, name='async_variation_detail'),  # Variation detail
+    path('async/products/<int:pk>/', asyncviews.product_detail, name='async_product_detail'),  # Product detail with variations
+    path('async/stock/<str:sku_code>/', asyncviews.stock_by_sku, name='async_stock_by_sku'),  # Stock level of one SKU
+]
+
 urlpatterns = [
     path('users/me/', current_user, name='current_user'),  # Get current authenticated user
+    path('search/', search_catalogue, name='search'),  # Ranked product / SKU search
+    path('stock/availability/', stock_availability, name='stock_availability'),  # Stock and ATP of many SKUs
+    path('cache-stats/', response_cache_stats, name='response_cache_stats'),  # Response cache hit/miss counters
     path('', include(router.urls)),  # Include all router-generated URLs
 ]
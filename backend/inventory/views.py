@@ -1,27 +1,120 @@
 # API views for inventory management
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from .models import Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem
-from .serializers import ProductSerializer, ProductVariationSerializer, SupplierSerializer, PurchaseOrderSerializer, SalesOrderSerializer, GroupSerializer, PermissionSerializer, UserSerializer
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import AuthenticationFailed
+from celery.result import AsyncResult
+import hmac
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Product, ProductVariation, Supplier, PurchaseOrder, PurchaseOrderItem, SalesOrder, SalesOrderItem, StockMovement, FulfillmentJob
+from .serializers import ProductSerializer, ProductVariationSerializer, SupplierSerializer, PurchaseOrderSerializer, SalesOrderSerializer, GroupSerializer, PermissionSerializer, UserSerializer, BulkPurchaseOrderSerializer, BulkSalesOrderSerializer, OrderIdsSerializer, StockMovementSerializer, DailyTotalsSerializer, ProductTotalsSerializer, CategoryTotalsSerializer, SkuTotalsSerializer, SearchQuerySerializer, SearchResultSerializer, AvailabilityQuerySerializer, FulfillmentJobSerializer
+from .analytics import daily_totals, grouped_totals
+from .availability import availability
+from .bulk import ingest_orders, bulk_status
+from .cache import CATALOGUE, CachedResponseMixin, cache_stats
+from .conditional import ConditionalGetMixin
+from .export import ExportMixin
+from .fastpath import FastListMixin
+from .filters import QueryParamFilterBackend, LowStockFilterBackend, AttributeFilterBackend
+from .fulfillment import queue_fulfillment
+from .importer import FORMATS
+from . import metrics
+from .principal import CachedJWTAuthentication, groups_prefetch
+from .search import search
+from .tasks import import_catalogue_file, schedule_fulfillment_drain
+from .reservations import release_orders, reserve_orders
+from .stock import fulfill_sales_orders, receive_purchase_orders, stock_at
 from django.contrib.auth.models import Group, Permission, User
 
 # ProductViewSet - provides CRUD operations for products
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, FastListMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()  # All products
     serializer_class = ProductSerializer
+    cache_namespace = CATALOGUE  # list/retrieve/variations served from the response cache
+    validator_dependencies = [(ProductVariation, 'updated_at')]  # Nested variations
+    filter_params = {
+        'category': 'category',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+        'updated_after': 'updated_at__gte',
+    }
+    export_columns = {
+        'id': 'id', 'name': 'name', 'category': 'category', 'description': 'description', 'price': 'price',
+        'quantity': 'quantity', 'created_at': 'created_at', 'updated_at': 'updated_at',
+    }
+
+    # On list, ?include_variations=false drops the nested variations and ?variations_limit=N caps them per product
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            if not self._include_variations():
+                return queryset  # Nothing nested, nothing to prefetch
+            limit = self._variations_limit()
+            if limit is not None:
+                # Number variations per product and keep the first N - still one query per page
+                variations = ProductVariation.objects.annotate(
+                    position=Window(RowNumber(), partition_by=F('product_id'), order_by=F('id').asc())
+                ).filter(position__lte=limit).order_by('id')
+                return queryset.prefetch_related(Prefetch('variations', queryset=variations))
+        return queryset.prefetch_related('variations')
+
+    # Custom action: POST /api/products/import/ - upload a CSV/NDJSON feed, imported by a Celery task (admin only)
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def import_feed(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise serializers.ValidationError({'file': 'Attach the feed as multipart field "file".'})
+        fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise serializers.ValidationError({'format': f"Must be one of {', '.join(FORMATS)}."})
+        name = default_storage.save(f'imports/{upload.name}', upload)
+        task = import_catalogue_file.delay(name, fmt)
+        return Response({'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
+
+    # Custom action: GET /api/products/import/{task_id}/ - progress and report of an import (admin only)
+    @action(detail=False, methods=['get'], url_path=r'import/(?P<task_id>[^/.]+)', permission_classes=[IsAdminUser])
+    def import_status(self, request, task_id=None):
+        result = AsyncResult(task_id)
+        report = result.result if result.state in ('PROGRESS', 'SUCCESS') else None
+        if result.state == 'FAILURE':
+            report = {'error': str(result.result)}
+        return Response({'task_id': task_id, 'state': result.state, 'report': report})
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['include_variations'] = self.action != 'list' or self._include_variations()
+        return context
+
+    def _include_variations(self):
+        return self.request.query_params.get('include_variations', 'true').lower() not in ('false', '0', 'no')
+
+    def _variations_limit(self):
+        limit = self.request.query_params.get('variations_limit')
+        if limit is None:
+            return None
+        if not limit.isdigit():
+            raise serializers.ValidationError({'variations_limit': 'Must be a non-negative integer.'})
+        return int(limit)
 
     # Custom action: /api/products/{id}/variations/
     @action(detail=True, methods=['get', 'post'], url_path='variations')
     def variations(self, request, pk=None):
-        product = self.get_object()
         if request.method == 'GET':
-            # List all variations for this product
-            variations = product.variations.all()
-            serializer = ProductVariationSerializer(variations, many=True)
-            return Response(serializer.data)
+            # List this product's variations, cursor-paginated like every other list
+            return self.cached_response(request, self._variations_page)
         elif request.method == 'POST':
+            product = self.get_object()
             # Create new variation for this product
             serializer = ProductVariationSerializer(data=request.data)
             if serializer.is_valid():
@@ -29,47 +122,340 @@ class ProductViewSet(viewsets.ModelViewSet):
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _variations_page(self):
+        page = self.paginate_queryset(self.get_object().variations.all())
+        return self.get_paginated_response(ProductVariationSerializer(page, many=True).data)
+
 # ProductVariationViewSet - CRUD for product variations/SKUs
-class ProductVariationViewSet(viewsets.ModelViewSet):
+class ProductVariationViewSet(ConditionalGetMixin, CachedResponseMixin, FastListMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = ProductVariation.objects.all()
     serializer_class = ProductVariationSerializer
+    cache_namespace = CATALOGUE  # list/retrieve served from the response cache
+    filter_backends = [QueryParamFilterBackend, LowStockFilterBackend, AttributeFilterBackend]  # Adds ?low_stock=true and ?attr.<key>=
+    filter_params = {
+        'product': 'product_id',
+        'sku_code': 'sku_code',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+        'updated_after': 'updated_at__gte',
+    }
+    export_columns = {
+        'id': 'id', 'product': 'product_id', 'product_name': 'product__name', 'sku_code': 'sku_code',
+        'attributes': 'attributes', 'stock_level': 'stock_level', 'reorder_level': 'reorder_level',
+        'created_at': 'created_at', 'updated_at': 'updated_at',
+    }
+
+    # Custom action: /api/variations/{id}/stock-at/?at=<ISO datetime> - stock level at a point in time
+    @action(detail=True, methods=['get'], url_path='stock-at')
+    def stock_at(self, request, pk=None):
+        at = parse_datetime(request.query_params.get('at', ''))
+        if at is None:
+            raise serializers.ValidationError({'at': 'Required ISO 8601 datetime.'})
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+        variation_id = self.get_object().id
+        return Response({'product_variation': variation_id, 'at': at, 'stock_level': stock_at(variation_id, at)})
+
+# StockMovementViewSet - read-only stock ledger, filterable by SKU, reason and date range
+class StockMovementViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = StockMovement.objects.all()
+    serializer_class = StockMovementSerializer
+    last_modified_field = 'created_at'  # Append-only
+    filter_params = {
+        'product_variation': 'product_variation_id',
+        'reason': 'reason',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+    }
 
 # SupplierViewSet - CRUD for suppliers
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
 
+# Orders answer updates by re-reading through the prefetching queryset - DRF would otherwise
+# drop the prefetch cache and lazily load every line's variation while building the response
+class RefetchOnUpdateMixin:
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(self.get_serializer(self.get_object()).data)
+
 # PurchaseOrderViewSet - CRUD for purchase orders
-class PurchaseOrderViewSet(viewsets.ModelViewSet):
-    queryset = PurchaseOrder.objects.all()
+class PurchaseOrderViewSet(ConditionalGetMixin, RefetchOnUpdateMixin, FastListMixin, ExportMixin, viewsets.ModelViewSet):
+    # Load supplier, items and their variations up front so listing costs a fixed number of queries
+    queryset = PurchaseOrder.objects.select_related('supplier').prefetch_related(
+        Prefetch('items', queryset=PurchaseOrderItem.objects.select_related('product_variation'))
+    )
     serializer_class = PurchaseOrderSerializer
+    validator_dependencies = [(Supplier, 'updated_at'), (ProductVariation, 'updated_at')]  # Nested supplier and variations
+    filter_params = {
+        'status': 'status',
+        'supplier': 'supplier_id',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+        'updated_after': 'updated_at__gte',
+    }
+    # Exports are one row per order line - order columns repeat, orders without lines get empty line columns
+    export_columns = {
+        'id': 'id', 'supplier': 'supplier_id', 'supplier_name': 'supplier__name', 'status': 'status',
+        'created_at': 'created_at', 'updated_at': 'updated_at', 'product_variation': 'items__product_variation_id',
+        'sku_code': 'items__product_variation__sku_code', 'quantity_ordered': 'items__quantity_ordered',
+        'cost_per_unit': 'items__cost_per_unit',
+    }
+    export_ordering = ('created_at', 'id', 'items__id')
+
+    # Custom action: POST /api/purchase-orders/bulk/ - create a list of orders in one request
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        created, errors = ingest_orders(
+            request.data, BulkPurchaseOrderSerializer, PurchaseOrderItem, 'purchase_order', {'supplier': Supplier}
+        )
+        return Response({'created': created, 'errors': errors}, status=bulk_status(created, errors))
+
+    # Custom action: POST /api/purchase-orders/receive/ - receive a list of orders, one stock UPDATE for all of them
+    @action(detail=False, methods=['post'], url_path='receive')
+    def receive(self, request):
+        serializer = OrderIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            received, errors = receive_purchase_orders(serializer.validated_data['ids'])
+        return Response({
+            'received': received,
+            'errors': [{'id': order_id, 'error': message} for order_id, message in sorted(errors.items())],
+        })
 
 # SalesOrderViewSet - CRUD for sales orders
-class SalesOrderViewSet(viewsets.ModelViewSet):
-    queryset = SalesOrder.objects.all()
+class SalesOrderViewSet(ConditionalGetMixin, RefetchOnUpdateMixin, FastListMixin, ExportMixin, viewsets.ModelViewSet):
+    # Load items and their variations up front so listing costs a fixed number of queries
+    queryset = SalesOrder.objects.prefetch_related(
+        Prefetch('items', queryset=SalesOrderItem.objects.select_related('product_variation'))
+    )
     serializer_class = SalesOrderSerializer
+    validator_dependencies = [(ProductVariation, 'updated_at')]  # Nested variations
+    filter_params = {
+        'status': 'status',
+        'customer_email': 'customer_email',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+        'updated_after': 'updated_at__gte',
+    }
+    # Exports are one row per order line - order columns repeat, orders without lines get empty line columns
+    export_columns = {
+        'id': 'id', 'customer_email': 'customer_email', 'status': 'status', 'created_at': 'created_at',
+        'updated_at': 'updated_at', 'product_variation': 'items__product_variation_id',
+        'sku_code': 'items__product_variation__sku_code', 'quantity_sold': 'items__quantity_sold',
+        'sale_price_per_unit': 'items__sale_price_per_unit',
+    }
+    export_ordering = ('created_at', 'id', 'items__id')
+
+    # PATCH/PUT with Prefer: respond-async - a change to Fulfilled is queued and answered 202 Accepted with the job,
+    # whose status is at Location. Without the header, or for any other change, the order is updated in the request
+    def update(self, request, *args, **kwargs):
+        if 'respond-async' not in request.headers.get('Prefer', ''):
+            return super().update(request, *args, **kwargs)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=kwargs.get('partial', False))
+        serializer.is_valid(raise_exception=True)
+        if instance.status == 'Fulfilled' or serializer.validated_data.get('status') != 'Fulfilled':
+            return super().update(request, *args, **kwargs)
+        job = queue_fulfillment(instance.pk)
+        schedule_fulfillment_drain()
+        location = self.reverse_action('fulfillment-job', kwargs={'job_id': job.pk})
+        return Response(
+            FulfillmentJobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': location, 'Preference-Applied': 'respond-async'},
+        )
+
+    # Custom action: GET /api/sales-orders/fulfillment-jobs/{job_id}/ - status and outcome of a queued fulfillment
+    @action(detail=False, methods=['get'], url_path=r'fulfillment-jobs/(?P<job_id>[0-9]+)')
+    def fulfillment_job(self, request, job_id=None):
+        return Response(FulfillmentJobSerializer(get_object_or_404(FulfillmentJob, pk=job_id)).data)
+
+    # A deleted order releases the stock it held - the order row is locked first, as fulfillment locks it
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            list(SalesOrder.objects.select_for_update().filter(pk=instance.pk).values_list('id', flat=True))
+            release_orders([instance.pk])
+            instance.delete()
+
+    # Custom action: POST /api/sales-orders/bulk/ - create a list of orders in one request
+    # Pending orders reserve their lines' stock; an order that can't is dropped and reported with the invalid ones
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        with transaction.atomic():
+            created, errors = ingest_orders(request.data, BulkSalesOrderSerializer, SalesOrderItem, 'sales_order')
+            created, errors = self._reserve(request.data, created, errors)
+        return Response({'created': created, 'errors': errors}, status=bulk_status(created, errors))
+
+    # Reserve the pending orders among those just created - returns (created ids, errors) without the ones that failed
+    def _reserve(self, payload, created, errors):
+        failed = {error['index'] for error in errors}
+        indexes = dict(zip(created, (index for index in range(len(payload)) if index not in failed)))  # Created in payload order
+        lines = {order_id: {} for order_id in SalesOrder.objects.filter(id__in=created, status='Pending').values_list('id', flat=True)}
+        for order_id, variation_id, quantity in SalesOrderItem.objects.filter(sales_order_id__in=lines).values_list(
+            'sales_order_id', 'product_variation_id', 'quantity_sold'
+        ):
+            lines[order_id][variation_id] = lines[order_id].get(variation_id, 0) + quantity
+        short = reserve_orders(lines)
+        if not short:
+            return created, errors
+        SalesOrder.objects.filter(id__in=short).delete()
+        errors = sorted(
+            errors + [{'index': indexes[order_id], 'errors': {'items_data': [message]}} for order_id, message in short.items()],
+            key=lambda error: error['index'],
+        )
+        return [order_id for order_id in created if order_id not in short], errors
+
+    # Custom action: POST /api/sales-orders/fulfill/ - fulfill a list of orders, one stock UPDATE for all of them
+    @action(detail=False, methods=['post'], url_path='fulfill')
+    def fulfill(self, request):
+        serializer = OrderIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            fulfilled, errors = fulfill_sales_orders(serializer.validated_data['ids'])
+        return Response({
+            'fulfilled': fulfilled,
+            'errors': [{'id': order_id, 'error': message} for order_id, message in sorted(errors.items())],
+        })
+
+# AnalyticsViewSet - sales and purchasing reports read from the daily rollup tables
+# Every report takes ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive, default the last 30 days)
+class AnalyticsViewSet(viewsets.ViewSet):
+    METRICS = ['revenue', 'units_sold', 'purchase_spend', 'units_purchased']  # Valid ?order_by values
+
+    # /api/analytics/daily/ - totals per day
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        first, last = self._date_range()
+        return Response(DailyTotalsSerializer(daily_totals(first, last), many=True).data)
+
+    # /api/analytics/products/ - totals per product
+    @action(detail=False, methods=['get'])
+    def products(self, request):
+        group_fields = {'product': 'product_variation__product_id', 'name': 'product_variation__product__name'}
+        return self._grouped(group_fields, ProductTotalsSerializer)
+
+    # /api/analytics/categories/ - totals per product category
+    @action(detail=False, methods=['get'])
+    def categories(self, request):
+        return self._grouped({'category': 'product_variation__product__category'}, CategoryTotalsSerializer)
+
+    # /api/analytics/top-skus/?order_by=units_sold&limit=10 - best SKUs by a metric
+    @action(detail=False, methods=['get'], url_path='top-skus')
+    def top_skus(self, request):
+        group_fields = {'variation': 'product_variation_id', 'sku_code': 'product_variation__sku_code'}
+        return self._grouped(group_fields, SkuTotalsSerializer, limit=self._limit())
+
+    def _grouped(self, group_fields, serializer_class, limit=None):
+        first, last = self._date_range()
+        order_by = self.request.query_params.get('order_by', 'revenue')
+        if order_by not in self.METRICS:
+            raise serializers.ValidationError({'order_by': f"Must be one of {', '.join(self.METRICS)}."})
+        rows = grouped_totals(first, last, group_fields, order_by=f'-{order_by}', limit=limit)
+        return Response(serializer_class(rows, many=True).data)
+
+    def _date_range(self):
+        last = self._date_param('end', timezone.now().date())
+        first = self._date_param('start', last - timedelta(days=29))
+        if first > last:
+            raise serializers.ValidationError({'start': 'Must not be after end.'})
+        return first, last
+
+    def _date_param(self, name, default):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise serializers.ValidationError({name: 'Expected a YYYY-MM-DD date.'})
+        return day
+
+    def _limit(self):
+        limit = self.request.query_params.get('limit', '10')
+        if not limit.isdigit() or not 1 <= int(limit) <= 1000:
+            raise serializers.ValidationError({'limit': 'Must be an integer between 1 and 1000.'})
+        return int(limit)
 
 # GroupViewSet - CRUD for user groups/roles (admin only)
 class GroupViewSet(viewsets.ModelViewSet):
-    queryset = Group.objects.all()
+    queryset = Group.objects.prefetch_related('permissions')  # Two queries for the whole list
     serializer_class = GroupSerializer
     permission_classes = [IsAdminUser]  # Only admins can manage groups
+    pagination_class = None  # Small table, returned whole
 
 # PermissionViewSet - read-only access to permissions (admin only)
 class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
     permission_classes = [IsAdminUser]  # Only admins can view permissions
+    pagination_class = None  # Small table, returned whole
 
 # UserViewSet - CRUD for users (admin only)
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.prefetch_related(groups_prefetch())  # Three queries for the whole list
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]  # Only admins can manage users
+    pagination_class = None  # Small table, returned whole
 
 # Function view to get current authenticated user's details
 @api_view(['GET'])  # Only accepts GET requests
 @permission_classes([IsAuthenticated])  # Requires authentication
 def current_user(request):
+    prefetch_related_objects([request.user], groups_prefetch())  # Groups and permissions in two queries
     serializer = UserSerializer(request.user)  # Serialize the logged-in user
     return Response(serializer.data)
+
+# Function view for ranked, typo-tolerant product and SKU search - ?q=<text>[&type=product|variation][&limit=20]
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_catalogue(request):
+    params = SearchQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    results = search(params.validated_data['q'], params.validated_data.get('type'), params.validated_data['limit'])
+    return Response({'query': params.validated_data['q'], 'results': SearchResultSerializer(results, many=True).data})
+
+# Function view for stock of many SKUs at once - {"sku_codes": [...]} (up to 5000) in, per SKU out:
+# {id, sku_code, stock_level, reorder_level, available_to_promise}, plus the codes that matched no SKU
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def stock_availability(request):
+    query = AvailabilityQuerySerializer(data=request.data)
+    query.is_valid(raise_exception=True)
+    results, missing = availability(query.validated_data['sku_codes'])
+    return Response({'results': results, 'missing': missing})
+
+# Function view with response cache hit/miss counters per namespace (admin only)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    return Response({CATALOGUE: cache_stats(CATALOGUE)})
+
+# Prometheus scrape endpoint - a plain Django view, since Prometheus can't get a JWT
+# Served to "Authorization: Bearer <METRICS_TOKEN>" and to admins (JWT or admin site session). Without a
+# METRICS_TOKEN everyone else is served only while DEBUG is on, so a production deployment fails closed
+def prometheus_metrics(request):
+    if not _metrics_allowed(request):
+        return HttpResponse(status=401 if settings.METRICS_TOKEN else 403)
+    metrics.flush(force=True)  # This process's latest observations
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _metrics_allowed(request):
+    if settings.METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return True
+    session_user = getattr(request, 'user', None)  # Unset where AuthenticationMiddleware doesn't run (the ASGI service)
+    if session_user is not None and session_user.is_staff:
+        return True
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        authenticated = None  # Not a valid JWT - e.g. a wrong scrape token
+    if authenticated is not None and authenticated[0].is_staff:
+        return True
+    return settings.DEBUG and not settings.METRICS_TOKEN
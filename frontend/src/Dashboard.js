@@ -3,35 +3,61 @@ import React, { useState, useEffect } from 'react';
 import { Container, AppBar, Toolbar, Typography, Button, Dialog, DialogTitle, DialogContent, DialogActions, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton } from '@mui/material';
 import { Add, Edit, Delete, Logout, Group, LocalShipping, Visibility } from '@mui/icons-material';
 import axios from 'axios';
+import { fetchPage } from './fetchAllPages';
 import UsersRoles from './UsersRoles';
 import Suppliers from './Suppliers';
 import ProductDetail from './ProductDetail';
 
 const API_URL = 'http://localhost:8000/api/products/';
+const SEARCH_URL = 'http://localhost:8000/api/search/';
 
 function Dashboard({ onLogout }) {
   const [products, setProducts] = useState([]);  // List of all products
+  const [nextPage, setNextPage] = useState(null);  // Cursor URL of the next page, null once every row is loaded
   const [open, setOpen] = useState(false);  // Dialog open/close state
   const [editMode, setEditMode] = useState(false);  // Create vs Edit mode
   const [currentProduct, setCurrentProduct] = useState({ id: null, name: '', category: '', description: '', quantity: 0, price: 0 });
   const [showUsersRoles, setShowUsersRoles] = useState(false);  // Toggle Users & Roles view
   const [showSuppliers, setShowSuppliers] = useState(false);  // Toggle Suppliers view
   const [selectedProductId, setSelectedProductId] = useState(null);  // Product detail view
+  const [searchQuery, setSearchQuery] = useState('');  // Search box text
+  const [searchResults, setSearchResults] = useState(null);  // Ranked hits, null when not searching
 
   // Fetch products on component mount
   useEffect(() => {
     fetchProducts();
   }, []);
 
+  // Search products and SKUs as the user types (debounced)
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSearchResults(null);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      const response = await axios.get(SEARCH_URL, { ...getAuthHeader(), params: { q: searchQuery } });
+      setSearchResults(response.data.results);
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
   // Helper to add JWT token to API requests
   const getAuthHeader = () => ({
     headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
   });
 
-  // Fetch all products from API
+  // Fetch the first page of products
   const fetchProducts = async () => {
-    const response = await axios.get(API_URL, getAuthHeader());
-    setProducts(response.data);
+    const page = await fetchPage(`${API_URL}?include_variations=false`, getAuthHeader());  // Table doesn't show variations
+    setProducts(page.results);
+    setNextPage(page.next);
+  };
+
+  // Append the next page of products
+  const loadMoreProducts = async () => {
+    const page = await fetchPage(nextPage, getAuthHeader());
+    setProducts((current) => current.concat(page.results));
+    setNextPage(page.next);
   };
 
   // Open dialog for creating or editing a product
@@ -124,6 +150,34 @@ function Dashboard({ onLogout }) {
         </Toolbar>
       </AppBar>
       <Container sx={{ mt: 4 }}>
+        <TextField fullWidth margin="dense" label="Search products and SKUs" value={searchQuery} onChange={(e) => setSearchQuery(e.target.value)} sx={{ mb: 2 }} />
+        {searchResults ? (
+          <TableContainer component={Paper}>
+            <Table>
+              <TableHead>
+                <TableRow>
+                  <TableCell>Name / SKU</TableCell>
+                  <TableCell>Type</TableCell>
+                  <TableCell>Category</TableCell>
+                  <TableCell>Actions</TableCell>
+                </TableRow>
+              </TableHead>
+              <TableBody>
+                {searchResults.map((result) => (
+                  <TableRow key={`${result.type}-${result.id}`}>
+                    <TableCell>{result.label}</TableCell>
+                    <TableCell>{result.type === 'variation' ? 'SKU' : 'Product'}</TableCell>
+                    <TableCell>{result.category}</TableCell>
+                    <TableCell>
+                      <IconButton onClick={() => setSelectedProductId(result.product)}><Visibility /></IconButton>
+                    </TableCell>
+                  </TableRow>
+                ))}
+              </TableBody>
+            </Table>
+          </TableContainer>
+        ) : (
+        <>
         <TableContainer component={Paper}>
           <Table>
             <TableHead>
@@ -154,6 +208,9 @@ function Dashboard({ onLogout }) {
             </TableBody>
           </Table>
         </TableContainer>
+        {nextPage && <Button onClick={loadMoreProducts} sx={{ mt: 2 }}>Load more</Button>}
+        </>
+        )}
       </Container>
       <Dialog open={open} onClose={handleClose}>
         <DialogTitle>{editMode ? 'Edit Product' : 'Add Product'}</DialogTitle>
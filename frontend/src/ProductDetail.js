@@ -3,10 +3,12 @@ import React, { useState, useEffect } from 'react';
 import { Container, Typography, Button, Dialog, DialogTitle, DialogContent, DialogActions, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton, Box } from '@mui/material';
 import { Add, Edit, Delete, ArrowBack } from '@mui/icons-material';
 import axios from 'axios';
+import { fetchPage } from './fetchAllPages';
 
 function ProductDetail({ productId, onBack }) {
   const [product, setProduct] = useState(null);  // Product details
   const [variations, setVariations] = useState([]);  // List of product variations/SKUs
+  const [nextPage, setNextPage] = useState(null);  // Cursor URL of the next page, null once every row is loaded
   const [open, setOpen] = useState(false);  // Dialog state
   const [currentVariation, setCurrentVariation] = useState({ sku_code: '', attributes: '{}', stock_level: 0, reorder_level: 10 });
 
@@ -27,10 +29,18 @@ function ProductDetail({ productId, onBack }) {
     setProduct(response.data);
   };
 
-  // Fetch all variations for this product
+  // Fetch the first page of this product's variations
   const fetchVariations = async () => {
-    const response = await axios.get(`http://localhost:8000/api/products/${productId}/variations/`, getAuthHeader());
-    setVariations(response.data);
+    const page = await fetchPage(`http://localhost:8000/api/products/${productId}/variations/`, getAuthHeader());
+    setVariations(page.results);
+    setNextPage(page.next);
+  };
+
+  // Append the next page of variations
+  const loadMoreVariations = async () => {
+    const page = await fetchPage(nextPage, getAuthHeader());
+    setVariations((current) => current.concat(page.results));
+    setNextPage(page.next);
   };
 
   // Open dialog to add new variation
@@ -105,6 +115,7 @@ function ProductDetail({ productId, onBack }) {
             </TableBody>
           </Table>
         </TableContainer>
+        {nextPage && <Button onClick={loadMoreVariations} sx={{ mt: 2 }}>Load more</Button>}
       </Box>
       <Dialog open={open} onClose={handleClose}>
         <DialogTitle>Add Variation/SKU</DialogTitle>
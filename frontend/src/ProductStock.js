@@ -1,10 +1,11 @@
 // ProductStock component - displays stock levels for all products and variations
 import React, { useState, useEffect } from 'react';
 import { Container, Typography, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, Box } from '@mui/material';
-import axios from 'axios';
+import { fetchPage } from './fetchAllPages';
 
 function ProductStock() {
   const [products, setProducts] = useState([]);  // All products with variations
+  const [nextPage, setNextPage] = useState(null);  // Cursor URL of the next page, null once every row is loaded
   const [searchTerm, setSearchTerm] = useState('');  // Search filter
 
   // Fetch products on component mount
@@ -17,10 +18,18 @@ function ProductStock() {
     headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
   });
 
-  // Fetch all products with nested variations
+  // Fetch the first page of products with nested variations
   const fetchProducts = async () => {
-    const response = await axios.get('http://localhost:8000/api/products/', getAuthHeader());
-    setProducts(response.data);
+    const page = await fetchPage('http://localhost:8000/api/products/', getAuthHeader());
+    setProducts(page.results);
+    setNextPage(page.next);
+  };
+
+  // Append the next page of products
+  const loadMoreProducts = async () => {
+    const page = await fetchPage(nextPage, getAuthHeader());
+    setProducts((current) => current.concat(page.results));
+    setNextPage(page.next);
   };
 
   // Filter products by name or category based on search term
@@ -68,6 +77,7 @@ function ProductStock() {
           </TableContainer>
         </Box>
       ))}
+      {nextPage && <Button onClick={loadMoreProducts} sx={{ mt: 2 }}>Load more</Button>}
     </Container>
   );
 }
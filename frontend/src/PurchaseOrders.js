@@ -3,9 +3,11 @@ import React, { useState, useEffect } from 'react';
 import { Container, Button, Dialog, DialogTitle, DialogContent, DialogActions, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton, Select, MenuItem, FormControl, InputLabel, Box, Typography, Autocomplete } from '@mui/material';
 import { Add, Delete } from '@mui/icons-material';
 import axios from 'axios';
+import { fetchAllPages, fetchPage } from './fetchAllPages';
 
 function PurchaseOrders() {
   const [purchaseOrders, setPurchaseOrders] = useState([]);  // List of all purchase orders
+  const [nextPage, setNextPage] = useState(null);  // Cursor URL of the next page, null once every row is loaded
   const [suppliers, setSuppliers] = useState([]);  // Available suppliers
   const [variations, setVariations] = useState([]);  // Available product variations/SKUs
   const [open, setOpen] = useState(false);  // Dialog state
@@ -24,22 +26,30 @@ function PurchaseOrders() {
     headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
   });
 
-  // Fetch all purchase orders
+  // Fetch the first page of purchase orders
   const fetchPurchaseOrders = async () => {
-    const response = await axios.get('http://localhost:8000/api/purchase-orders/', getAuthHeader());
-    setPurchaseOrders(response.data);
+    const page = await fetchPage('http://localhost:8000/api/purchase-orders/', getAuthHeader());
+    setPurchaseOrders(page.results);
+    setNextPage(page.next);
   };
 
-  // Fetch all suppliers
+  // Append the next page of purchase orders
+  const loadMorePurchaseOrders = async () => {
+    const page = await fetchPage(nextPage, getAuthHeader());
+    setPurchaseOrders((current) => current.concat(page.results));
+    setNextPage(page.next);
+  };
+
+  // Fetch suppliers for the dropdown - fetchAllPages stops at its 1000-row cap
   const fetchSuppliers = async () => {
-    const response = await axios.get('http://localhost:8000/api/suppliers/', getAuthHeader());
-    setSuppliers(response.data);
+    const suppliers = await fetchAllPages('http://localhost:8000/api/suppliers/', getAuthHeader());
+    setSuppliers(suppliers);
   };
 
-  // Fetch all product variations for order items
+  // Fetch product variations for order items - capped like the suppliers
   const fetchVariations = async () => {
-    const response = await axios.get('http://localhost:8000/api/variations/', getAuthHeader());
-    setVariations(response.data);
+    const variations = await fetchAllPages('http://localhost:8000/api/variations/', getAuthHeader());
+    setVariations(variations);
   };
 
   // Open dialog to create new PO
@@ -165,6 +175,7 @@ function PurchaseOrders() {
           </TableBody>
         </Table>
       </TableContainer>
+      {nextPage && <Button onClick={loadMorePurchaseOrders} sx={{ mt: 2 }}>Load more</Button>}
       <Dialog open={open} onClose={handleClose} maxWidth="md" fullWidth>
         <DialogTitle>Create New Purchase Order</DialogTitle>
         <DialogContent>
@@ -3,10 +3,13 @@ import React, { useState, useEffect } from 'react';
 import { Container, Button, Dialog, DialogTitle, DialogContent, DialogActions, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton, Box, Typography, Autocomplete } from '@mui/material';
 import { Add, Delete } from '@mui/icons-material';
 import axios from 'axios';
+import { fetchPage } from './fetchAllPages';
 
 function SalesOrders() {
   const [salesOrders, setSalesOrders] = useState([]);  // List of all sales orders
-  const [variations, setVariations] = useState([]);  // Available product variations/SKUs
+  const [nextPage, setNextPage] = useState(null);  // Cursor URL of the next page, null once every row is loaded
+  const [skuOptions, setSkuOptions] = useState([]);  // SKUs matching the text typed into a line's SKU box
+  const [availability, setAvailability] = useState({});  // sku_code -> stock level, reorder level and available-to-promise
   const [open, setOpen] = useState(false);  // Dialog state
   const [selectedSO, setSelectedSO] = useState(null);  // Selected SO for detail view
   const [error, setError] = useState('');  // Error message (e.g., insufficient stock)
@@ -15,7 +18,6 @@ function SalesOrders() {
   // Fetch data on component mount
   useEffect(() => {
     fetchSalesOrders();
-    fetchVariations();
   }, []);
 
   // Helper to add JWT token to requests
@@ -23,16 +25,34 @@ function SalesOrders() {
     headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
   });
 
-  // Fetch all sales orders
+  // Fetch the first page of sales orders
   const fetchSalesOrders = async () => {
-    const response = await axios.get('http://localhost:8000/api/sales-orders/', getAuthHeader());
-    setSalesOrders(response.data);
+    const page = await fetchPage('http://localhost:8000/api/sales-orders/', getAuthHeader());
+    setSalesOrders(page.results);
+    setNextPage(page.next);
   };
 
-  // Fetch all product variations for order items
-  const fetchVariations = async () => {
-    const response = await axios.get('http://localhost:8000/api/variations/', getAuthHeader());
-    setVariations(response.data);
+  // Append the next page of sales orders
+  const loadMoreSalesOrders = async () => {
+    const page = await fetchPage(nextPage, getAuthHeader());
+    setSalesOrders((current) => current.concat(page.results));
+    setNextPage(page.next);
+  };
+
+  // Search SKUs as the user types instead of loading the whole catalogue
+  const searchSkus = async (text) => {
+    if (!text) {
+      setSkuOptions([]);
+      return;
+    }
+    const response = await axios.get('http://localhost:8000/api/search/', { ...getAuthHeader(), params: { q: text, type: 'variation' } });
+    setSkuOptions(response.data.results.map(hit => ({ id: hit.id, sku_code: hit.label })));
+  };
+
+  // Fetch stock and available-to-promise for the given SKUs in one request
+  const fetchAvailability = async (skuCodes) => {
+    const response = await axios.post('http://localhost:8000/api/stock/availability/', { sku_codes: skuCodes }, getAuthHeader());
+    setAvailability(current => ({ ...current, ...Object.fromEntries(response.data.results.map(row => [row.sku_code, row])) }));
   };
 
   // Open dialog to create new SO
@@ -48,7 +68,7 @@ function SalesOrders() {
 
   // Add new line item to SO
   const handleAddItem = () => {
-    setCurrentSO({ ...currentSO, items: [...currentSO.items, { product_variation: '', quantity_sold: 0, sale_price_per_unit: 0 }] });
+    setCurrentSO({ ...currentSO, items: [...currentSO.items, { product_variation: '', sku_code: '', quantity_sold: 0, sale_price_per_unit: 0 }] });
   };
 
   // Remove line item from SO
@@ -64,12 +84,30 @@ function SalesOrders() {
     setCurrentSO({ ...currentSO, items: newItems });
   };
 
-  // Save new sales order
+  // Pick a line's SKU and show its current availability
+  const handleSkuChange = (index, variation) => {
+    const newItems = [...currentSO.items];
+    newItems[index].product_variation = variation?.id || '';
+    newItems[index].sku_code = variation?.sku_code || '';
+    setCurrentSO({ ...currentSO, items: newItems });
+    if (variation) {
+      fetchAvailability([variation.sku_code]);
+    }
+  };
+
+  // Save new sales order - a pending order reserves its stock, and is refused when there isn't enough
   const handleSave = async () => {
-    const payload = { ...currentSO, items_data: currentSO.items };  // items_data for creating nested items
-    await axios.post('http://localhost:8000/api/sales-orders/', payload, getAuthHeader());
-    fetchSalesOrders();  // Refresh list
-    handleClose();
+    const items_data = currentSO.items.map(({ sku_code, ...item }) => item);  // sku_code is only for display
+    const payload = { ...currentSO, items_data };  // items_data for creating nested items
+    try {
+      setError('');
+      await axios.post('http://localhost:8000/api/sales-orders/', payload, getAuthHeader());
+      fetchSalesOrders();  // Refresh list
+      handleClose();
+    } catch (err) {
+      setError(err.response?.data?.[0] || 'Error creating order');  // Show insufficient stock error
+      fetchAvailability(currentSO.items.map(item => item.sku_code).filter(Boolean));  // Refresh what is left
+    }
   };
 
   // Update SO status (Pending -> Fulfilled)
@@ -161,6 +199,7 @@ function SalesOrders() {
           </TableBody>
         </Table>
       </TableContainer>
+      {nextPage && <Button onClick={loadMoreSalesOrders} sx={{ mt: 2 }}>Load more</Button>}
       <Dialog open={open} onClose={handleClose} maxWidth="md" fullWidth>
         <DialogTitle>Create New Sales Order</DialogTitle>
         <DialogContent>
@@ -169,16 +208,25 @@ function SalesOrders() {
             <Typography variant="h6">Items</Typography>
             <Button startIcon={<Add />} onClick={handleAddItem} sx={{ mb: 2 }}>Add Item</Button>
             {currentSO.items.map((item, index) => {
-              const selectedVariation = variations.find(v => v.id === item.product_variation);
+              const stock = availability[item.sku_code];
               return (
                 <Box key={index} sx={{ mb: 2, p: 2, border: '1px solid #ccc', borderRadius: 1 }}>
+                  {/* Options come ranked from the search endpoint - shown as they are */}
                   <Autocomplete
-                    options={variations}
-                    getOptionLabel={(option) => `${option.sku_code} (Stock: ${option.stock_level})`}
-                    value={selectedVariation || null}
-                    onChange={(e, newValue) => handleItemChange(index, 'product_variation', newValue?.id || '')}
+                    options={skuOptions}
+                    filterOptions={(options) => options}
+                    getOptionLabel={(option) => option.sku_code}
+                    isOptionEqualToValue={(option, value) => option.id === value.id}
+                    value={item.product_variation ? { id: item.product_variation, sku_code: item.sku_code } : null}
+                    onInputChange={(e, text) => searchSkus(text)}
+                    onChange={(e, newValue) => handleSkuChange(index, newValue)}
                     renderInput={(params) => <TextField {...params} label="SKU" margin="dense" />}
                   />
+                  {stock && (
+                    <Typography variant="body2" color={stock.available_to_promise < item.quantity_sold ? 'error' : 'text.secondary'}>
+                      Available: {stock.available_to_promise} (Stock: {stock.stock_level}, Reorder level: {stock.reorder_level})
+                    </Typography>
+                  )}
                   <TextField fullWidth margin="dense" label="Quantity Sold" type="number" value={item.quantity_sold} onChange={(e) => handleItemChange(index, 'quantity_sold', parseInt(e.target.value))} />
                   <TextField fullWidth margin="dense" label="Sale Price Per Unit" type="number" value={item.sale_price_per_unit} onChange={(e) => handleItemChange(index, 'sale_price_per_unit', parseFloat(e.target.value))} />
                   <IconButton onClick={() => handleRemoveItem(index)}><Delete /></IconButton>
@@ -186,6 +234,7 @@ function SalesOrders() {
               );
             })}
           </Box>
+          {error && <Typography color="error" sx={{ mt: 2 }}>{error}</Typography>}
         </DialogContent>
         <DialogActions>
           <Button onClick={handleClose}>Cancel</Button>
@@ -3,11 +3,13 @@ import React, { useState, useEffect } from 'react';
 import { Container, Button, Dialog, DialogTitle, DialogContent, DialogActions, TextField, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Paper, IconButton } from '@mui/material';
 import { Add, Edit, Delete } from '@mui/icons-material';
 import axios from 'axios';
+import { fetchPage } from './fetchAllPages';
 
 const API_URL = 'http://localhost:8000/api/suppliers/';
 
 function Suppliers() {
   const [suppliers, setSuppliers] = useState([]);  // List of all suppliers
+  const [nextPage, setNextPage] = useState(null);  // Cursor URL of the next page, null once every row is loaded
   const [open, setOpen] = useState(false);  // Dialog state
   const [editMode, setEditMode] = useState(false);  // Create vs Edit mode
   const [currentSupplier, setCurrentSupplier] = useState({ id: null, name: '', email: '', phone: '' });
@@ -22,10 +24,18 @@ function Suppliers() {
     headers: { Authorization: `Bearer ${localStorage.getItem('access_token')}` }
   });
 
-  // Fetch all suppliers from API
+  // Fetch the first page of suppliers
   const fetchSuppliers = async () => {
-    const response = await axios.get(API_URL, getAuthHeader());
-    setSuppliers(response.data);
+    const page = await fetchPage(API_URL, getAuthHeader());
+    setSuppliers(page.results);
+    setNextPage(page.next);
+  };
+
+  // Append the next page of suppliers
+  const loadMoreSuppliers = async () => {
+    const page = await fetchPage(nextPage, getAuthHeader());
+    setSuppliers((current) => current.concat(page.results));
+    setNextPage(page.next);
   };
 
   // Open dialog for creating or editing a supplier
@@ -91,6 +101,7 @@ function Suppliers() {
           </TableBody>
         </Table>
       </TableContainer>
+      {nextPage && <Button onClick={loadMoreSuppliers} sx={{ mt: 2 }}>Load more</Button>}
       <Dialog open={open} onClose={handleClose}>
         <DialogTitle>{editMode ? 'Edit Supplier' : 'Add New Supplier'}</DialogTitle>
         <DialogContent>
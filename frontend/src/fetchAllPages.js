@@ -0,0 +1,20 @@
+// Helpers for cursor-paginated list endpoints
+import axios from 'axios';
+
+// Fetch one page - returns its rows and the cursor URL of the next page (null on the last page)
+export async function fetchPage(url, config) {
+  const response = await axios.get(url, config);
+  return { results: response.data.results, next: response.data.next };
+}
+
+// Follow the `next` links and return the rows as one array, stopping once maxRows are loaded (for dropdowns)
+export async function fetchAllPages(url, config, maxRows = 1000) {
+  let results = [];
+  let nextUrl = url;
+  while (nextUrl && results.length < maxRows) {
+    const page = await fetchPage(nextUrl, config);
+    results = results.concat(page.results);  // Rows on this page
+    nextUrl = page.next;  // null on the last page
+  }
+  return results.slice(0, maxRows);
+}